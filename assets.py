@@ -0,0 +1,66 @@
+import pygame
+from tiles import TILE_REGISTRY
+
+# Block type -> texture path
+BLOCK_TEXTURES = {tile_type.name: tile_type.texture for tile_type in TILE_REGISTRY if tile_type.texture is not None}
+
+
+class TextureAtlas:
+    def __init__(self, surface, rects):
+        """
+        Several textures packed into one surface, drawn with the area argument of blit.
+        :param surface: The packed textures.
+        :param rects: Texture name -> area of the surface holding it.
+        """
+        self.surface = surface
+        self.rects = rects
+
+
+class AssetManager:
+    def __init__(self):
+        """
+        Loads every image once, on first use, and keeps display-format copies at each size asked for.
+        Converted surfaces blit several times faster than the ones pygame.image.load returns.
+        """
+        self.images = {}  # (path, size) -> surface, size is None for the original size
+
+    def convert(self, image):
+        """Convert an image to the display's pixel format, if there is a display yet."""
+        if pygame.display.get_surface() is None:
+            return image
+        if image.get_flags() & pygame.SRCALPHA:
+            return image.convert_alpha()
+        return image.convert()
+
+    def image(self, path, size=None):
+        """
+        Get an image, loading it the first time.
+        :param path: Image path, relative to the repository.
+        :param size: (width, height) to scale the image to, or None for its own size.
+        """
+        key = (path, size)
+        image = self.images.get(key)
+        if image is None:
+            if size is None:
+                image = self.convert(pygame.image.load(path))
+            else:
+                image = self.convert(pygame.transform.scale(self.image(path), size))
+            self.images[key] = image
+        return image
+
+    def atlas(self, textures, tile_size):
+        """
+        Pack square textures side by side into one surface. The atlas isn't cached, the caller keeps it.
+        :param textures: Texture name -> image path.
+        :param tile_size: Size to scale each texture to.
+        """
+        surface = pygame.Surface((tile_size * len(textures), tile_size), pygame.SRCALPHA)
+        rects = {}
+        for i, (name, path) in enumerate(textures.items()):
+            rects[name] = pygame.Rect(i * tile_size, 0, tile_size, tile_size)
+            image = pygame.transform.scale(self.image(path), (tile_size, tile_size))
+            surface.blit(image, rects[name], special_flags=pygame.BLEND_RGBA_MAX)  # Copy, don't blend onto the empty atlas
+        return TextureAtlas(self.convert(surface), rects)
+
+
+asset_manager = AssetManager()  # Shared by the game, the start screen, the menus and the mobs
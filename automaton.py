@@ -0,0 +1,206 @@
+import numpy as np
+from world import CHUNK_SIZE, AIR
+from tiles import TILE_REGISTRY
+
+LIQUID = 1  # Density of liquids, only air is lighter
+STATIC = 255  # Density of tiles that never move, nothing moves into them either
+
+# A moving tile swaps places with a lighter tile below or beside it: air, then liquids, then falling solids
+TILE_DENSITY = np.array([0 if tile_type.tile_id == AIR else LIQUID if tile_type.flows else 2 if tile_type.falls else STATIC
+                         for tile_type in TILE_REGISTRY], dtype=np.uint8)
+FALLS = np.array([tile_type.falls for tile_type in TILE_REGISTRY])
+FLOWS = np.array([tile_type.flows for tile_type in TILE_REGISTRY])
+
+
+def runs(values):
+    """Split sorted integers into the (first, last) of each run of consecutive ones."""
+    ranges = []
+    for value in values:
+        if ranges and ranges[-1][1] == value - 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ranges
+
+
+def drop_distances(open_cells, drops):
+    """
+    How far each cell of a row is from the nearest drop on either side, with only open cells in between.
+    :param open_cells: Bool row of the cells a liquid can flow into, with a border cell at each end.
+    :param drops: Bool row of the open cells with room below them.
+    :return: (left, right) distances of the cells inside the border, larger than the row where there is no drop.
+    """
+    size = open_cells.size
+    positions = np.arange(size)
+    far = 2 * size
+    # Nearest drop and nearest blocked cell at or beyond each position, on each side
+    right_drop = np.minimum.accumulate(np.where(drops, positions, far)[::-1])[::-1]
+    right_block = np.minimum.accumulate(np.where(open_cells, far, positions)[::-1])[::-1]
+    left_drop = np.maximum.accumulate(np.where(drops, positions, -far))
+    left_block = np.maximum.accumulate(np.where(open_cells, -far, positions))
+    inner = positions[1:-1]
+    right = np.where(right_drop[2:] < right_block[2:], right_drop[2:] - inner, far)
+    left = np.where(left_drop[:-2] > left_block[:-2], inner - left_drop[:-2], far)
+    return left, right
+
+
+def grow(mask):
+    """Get a mask with every cell next to a set cell set too, diagonals included."""
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    rows = grown.copy()
+    grown[:, 1:] |= rows[:, :-1]
+    grown[:, :-1] |= rows[:, 1:]
+    return grown
+
+
+class TileAutomaton:
+    def __init__(self, world, bottom):
+        """
+        Lets the tiles that fall and flow (sand, gravel, water, see TileType) move, a tick at a time.
+        Only active cells are updated: the ones that changed or are next to a change. A cell that can't move falls
+        asleep until something next to it changes, so settled sand and still water cost nothing. Each tick the
+        active chunks of a chunk row are stepped together as one array, a row of tiles at a time from the bottom
+        up, so a falling column moves as a whole.
+        :param world: The world to simulate. The automaton registers itself as one of its observers, edits wake the
+                      cells around them.
+        :param bottom: Tile row below the last one tiles can fall into.
+        """
+        self.world = world
+        self.bottom = bottom
+        self.active = {}  # (cx, cy) -> bool array indexed [local_y, local_x] of the cells to update next tick
+        self.ticks = 0  # Sides are tried in turns, so liquids don't drift one way
+        self.stepping = False  # The edits of step wake the cells they reach themselves
+        world.observers.append(self)
+
+    def wake(self, first_tx, first_ty, last_tx, last_ty, mask=None):
+        """
+        Make the moving tiles in a rect (last coordinates exclusive) active. Chunks not in memory stay asleep.
+        :param mask: Bool array indexed [ty - first_ty, tx - first_tx] of the cells to wake, all of them if None.
+        """
+        for cx, cy, chunk_area, rect_area in self.world.region_chunks(first_tx, first_ty, last_tx, last_ty):
+            chunk = self.world.chunks.get((cx, cy))
+            if chunk is None:
+                continue
+            moving = FALLS[chunk.tiles[chunk_area]]
+            if mask is not None:
+                moving &= mask[rect_area]
+            if moving.any():
+                active = self.active.get((cx, cy))
+                if active is None:
+                    active = self.active[(cx, cy)] = np.zeros((CHUNK_SIZE, CHUNK_SIZE), dtype=bool)
+                active[chunk_area] |= moving
+
+    def active_count(self):
+        return sum(int(active.sum()) for active in self.active.values())
+
+    def step(self):
+        """Move every active cell once. Cells that move, and the ones next to them, are active on the next tick."""
+        self.ticks += 1
+        active, self.active = self.active, {}
+        rows = {}
+        for cx, cy in active:
+            if (cx, cy) in self.world.chunks:  # Unloaded chunks go to sleep
+                rows.setdefault(cy, []).append(cx)
+        self.stepping = True
+        try:
+            # Bottom row first, so a tile falling into the row below isn't moved again there
+            for cy in sorted(rows, reverse=True):
+                for first_cx, last_cx in runs(sorted(rows[cy])):
+                    self.step_area(first_cx, last_cx, cy, active)
+        finally:
+            self.stepping = False
+
+    def step_area(self, first_cx, last_cx, cy, active):
+        """
+        Move the active cells of a run of chunks in one chunk row.
+        The area is copied with a border of one tile, so tiles can move into the chunks around it.
+        """
+        first_tx, last_tx = first_cx * CHUNK_SIZE, (last_cx + 1) * CHUNK_SIZE
+        first_ty, last_ty = cy * CHUNK_SIZE, min((cy + 1) * CHUNK_SIZE, self.bottom)
+        if last_ty <= first_ty:
+            return  # Under the world, nothing moves there
+        tiles = self.world.copy_region(first_tx - 1, first_ty - 1, last_tx + 1, last_ty + 1)
+        density = TILE_DENSITY[tiles]
+        if last_ty == self.bottom:
+            density[-1] = STATIC  # Nothing falls out of the world
+        awake = np.zeros(tiles.shape, dtype=bool)  # Cells that can still move this tick
+        for cx in range(first_cx, last_cx + 1):
+            mask = active.get((cx, cy))
+            if mask is not None:
+                x = 1 + (cx - first_cx) * CHUNK_SIZE
+                awake[1:-1, x:x + CHUNK_SIZE] = mask[:last_ty - first_ty]
+        changed = np.zeros(tiles.shape, dtype=bool)
+        width = tiles.shape[1] - 2
+        sides = (-1, 1) if self.ticks % 2 else (1, -1)
+
+        def move(row, moving, dy, dx):
+            # Swap the moving cells of a row with the cells at an offset, which nothing else moves into
+            xs = np.nonzero(moving)[0] + 1
+            if xs.size == 0:
+                return
+            tiles[row, xs], tiles[row + dy, xs + dx] = tiles[row + dy, xs + dx], tiles[row, xs]
+            density[row, xs], density[row + dy, xs + dx] = density[row + dy, xs + dx], density[row, xs]
+            awake[row, xs] = False
+            changed[row, xs] = True
+            changed[row + dy, xs + dx] = True
+
+        for row in range(tiles.shape[0] - 2, 0, -1):
+            if not awake[row].any():
+                continue
+            here = density[row, 1:-1]
+            # Straight down, into anything lighter
+            move(row, awake[row, 1:-1] & FALLS[tiles[row, 1:-1]] & (density[row + 1, 1:-1] < here), 1, 0)
+            # Down a slope, if the tile beside it is lighter too so nothing slips through corners
+            falling = awake[row, 1:-1] & FALLS[tiles[row, 1:-1]]
+            if falling.any():
+                for dx in sides:
+                    here = density[row, 1:-1]
+                    side = density[row, 1 + dx:width + 1 + dx]
+                    below = density[row + 1, 1 + dx:width + 1 + dx]
+                    move(row, falling & awake[row, 1:-1] & (below < here) & (side < here), 1, dx)
+            # Liquids flow towards the nearest drop along the row, or either way if there is weight on them.
+            # A level surface has no drop, so puddles settle.
+            flowing = awake[row, 1:-1] & FLOWS[tiles[row, 1:-1]]
+            if flowing.any():
+                above = density[row - 1, 1:-1]
+                pressed = (above >= LIQUID) & (above != STATIC)
+                open_cells = density[row] < LIQUID
+                left, right = drop_distances(open_cells, open_cells & (density[row + 1] < LIQUID))
+                level = left == right  # Equally far, or no drop at all
+                downhill = {-1: left < right, 1: right < left}
+                downhill[sides[0]] = downhill[sides[0]] | (level & (left < width + 2))
+                for dx in sides:
+                    side = density[row, 1 + dx:width + 1 + dx]
+                    wants = downhill[dx] | (level & pressed)
+                    move(row, flowing & awake[row, 1:-1] & wants & (side < LIQUID), 0, dx)
+
+        if not changed.any():
+            return
+        rows, columns = np.nonzero(changed)
+        top, left = int(rows.min()), int(columns.min())
+        bottom, right = int(rows.max()) + 1, int(columns.max()) + 1
+        self.world.paste_region(first_tx - 1 + left, first_ty - 1 + top, tiles[top:bottom, left:right],
+                                changed[top:bottom, left:right])
+        # Liquids look along their whole row for a drop, so a change wakes the liquid in the rows around it too
+        near = grow(changed)
+        near |= grow(changed.any(axis=1, keepdims=True))[:, :1] & FLOWS[tiles]
+        self.wake(first_tx - 1, first_ty - 1, last_tx + 1, last_ty + 1, near)
+
+    def tile_changed(self, tx, ty, tile_id):
+        self.wake(tx - 1, ty - 1, tx + 2, ty + 2)
+
+    def region_changed(self, first_tx, first_ty, last_tx, last_ty):
+        if not self.stepping:
+            self.wake(first_tx - 1, first_ty - 1, last_tx + 1, last_ty + 1)
+
+    def chunk_replaced(self, cx, cy):
+        self.wake(cx * CHUNK_SIZE - 1, cy * CHUNK_SIZE - 1, (cx + 1) * CHUNK_SIZE + 1, (cy + 1) * CHUNK_SIZE + 1)
+
+    def world_cleared(self):
+        self.active = {}
+
+    def chunks_unloaded(self, keys):
+        for key in keys:
+            self.active.pop(key, None)  # Chunks not in memory stay asleep, see wake
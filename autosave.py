@@ -0,0 +1,125 @@
+import os
+import struct
+import threading
+import numpy as np
+from region import sync_directory, write_level
+from profiler import profiled
+
+JOURNAL_FILE = "journal.bin"
+JOURNAL_RECORD = struct.Struct("<QiiB")  # edit number, tile x, tile y, tile ID
+JOURNAL_DTYPE = np.dtype([("seq", "<u8"), ("tile_x", "<i4"), ("tile_y", "<i4"), ("tile_id", "u1")])  # Same layout
+
+
+class EditJournal:
+    def __init__(self, path, saved_seq=0):
+        """
+        Append-only log of tile edits made since the last full save.
+        :param path: Journal file path.
+        :param saved_seq: Number of the last edit included in the saved world.
+        """
+        self.path = path
+        self.seq = max(saved_seq, max((record[0] for record in self.read()), default=0))
+        self.file = open(path, "ab")
+
+    def read(self):
+        """Get every complete (seq, tile_x, tile_y, tile_id) record in the journal."""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "rb") as file:
+            data = file.read()
+        end = len(data) - len(data) % JOURNAL_RECORD.size  # Ignore a record cut off by a crash
+        return list(JOURNAL_RECORD.iter_unpack(data[:end]))
+
+    def record(self, tile_x, tile_y, tile_id):
+        """Append one edit. It is flushed right away so a crash can't lose it."""
+        self.seq += 1
+        self.file.write(JOURNAL_RECORD.pack(self.seq, tile_x, tile_y, tile_id))
+        self.file.flush()
+
+    def record_many(self, tile_xs, tile_ys, tile_ids):
+        """Append the edits of a bulk operation with one write, see World.paste_region."""
+        records = np.zeros(len(tile_ids), dtype=JOURNAL_DTYPE)
+        records["seq"] = np.arange(self.seq + 1, self.seq + 1 + len(tile_ids))
+        records["tile_x"] = tile_xs
+        records["tile_y"] = tile_ys
+        records["tile_id"] = tile_ids
+        self.seq += len(tile_ids)
+        self.file.write(records.tobytes())
+        self.file.flush()
+
+    def replay(self, world, saved_seq):
+        """
+        Apply the edits the saved world doesn't have yet.
+        :param world: World to apply the edits to.
+        :param saved_seq: Number of the last edit included in the saved world.
+        """
+        for seq, tile_x, tile_y, tile_id in self.read():
+            if seq > saved_seq:
+                world.set_tile(tile_x, tile_y, tile_id)
+
+    def discard_through(self, saved_seq):
+        """
+        Drop the edits that made it into a full save.
+        The rest are written to a new file that replaces the journal, so a crash midway leaves the old one whole.
+        """
+        records = [record for record in self.read() if record[0] > saved_seq]
+        self.file.close()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(b"".join(JOURNAL_RECORD.pack(*record) for record in records))
+            file.flush()
+            os.fsync(file.fileno())  # On disk before the rename, or a crash could lose the unsaved edits
+        os.replace(temp_path, self.path)
+        sync_directory(os.path.dirname(self.path))
+        self.file = open(self.path, "ab")
+
+    def close(self):
+        self.file.close()
+
+
+class AutoSaver:
+    def __init__(self):
+        """Writes world snapshots on a background thread so saving never stalls a frame."""
+        self.thread = None
+        self.job = None
+        self.error = None
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, store, snapshot, level_data):
+        """
+        Start writing a snapshot.
+        :param store: RegionStore to write the chunks to.
+        :param snapshot: Dict of (cx, cy) -> chunk tiles from World.snapshot.
+        :param level_data: Player and world settings for the level file, None to only write the chunks.
+        """
+        self.job = (store, snapshot, level_data)
+        self.error = None
+        self.thread = threading.Thread(target=self.write, args=self.job, daemon=True)
+        self.thread.start()
+
+    @profiled("autosave_write")
+    def write(self, store, snapshot, level_data):
+        try:
+            store.write_chunks(snapshot)
+            if level_data is not None:
+                write_level(store.directory, level_data)  # Written last, it marks the save as complete
+        except Exception as error:
+            self.error = error
+
+    def poll(self):
+        """
+        Get the job that just finished writing, or None while a write is running or nothing was started.
+        :return: (store, snapshot, level_data, error) of the finished job.
+        """
+        if self.job is None or self.busy():
+            return None
+        store, snapshot, level_data = self.job
+        self.job = None
+        return store, snapshot, level_data, self.error
+
+    def wait(self):
+        """Block until the running write is done."""
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"  # Its banner would go to stdout, in front of the JSON
+import pygame
+from headless import init_headless
+from controls import ScriptedInput
+from profiler import percentile
+from world import CHUNK_SIZE
+
+PHASES = ["handle_events", "update_player", "update_tiles", "update_slimes", "update_attack", "draw_game"]
+
+
+def summarize(samples):
+    """Summarize a list of timings in seconds as milliseconds."""
+    return {
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(samples, 0.5) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "max_ms": max(samples) * 1000
+    }
+
+
+def walk_script(frame, input):
+    """Walk right and left in turns, jumping now and then."""
+    if frame % 120 == 0:
+        input.release(pygame.K_a)
+        input.press(pygame.K_d)
+    elif frame % 120 == 60:
+        input.release(pygame.K_d)
+        input.press(pygame.K_a)
+    if frame % 45 == 0:
+        input.press(pygame.K_SPACE)
+    elif frame % 45 == 1:
+        input.release(pygame.K_SPACE)
+
+
+def setup_game(screen, world_width, mobs, zoom):
+    """Build a game on a pregenerated world of the given width with the player in the middle."""
+    from game import Game
+    import worldgen
+
+    game = Game(screen, ScriptedInput())
+    game.seed = 1
+    game.generate_world()
+    game.world.generator = None  # Fixed-size world, everything stays in memory
+    game.streamer.max_loaded_chunks = sys.maxsize
+    ground_level = (game.screen_height - game.block_size) // game.block_size
+    worldgen.generate_world(game.world, game.seed, world_width, game.scale, ground_level, workers=1)
+
+    # Stand the player on the surface in the middle of the world
+    tile_x = world_width // 2
+    surface_y = game.heightmap.surface_y(tile_x)
+    game.player_x = tile_x * game.block_size
+    game.player_y = surface_y * game.block_size - 46
+    game.health = game.max_health = 10 ** 9  # Slimes shouldn't kill the player mid-benchmark
+    game.camera_zoom = zoom
+    game.slime_spawn_interval = sys.maxsize  # Keep the mob count fixed
+
+    top_up_slimes(game, mobs)
+    return game
+
+
+def top_up_slimes(game, mobs):
+    """Spawn slimes around the player until there are `mobs` of them, replacing the ones that walked off-screen."""
+    from mobs import SLIME
+
+    for i in range(game.mobs.count, mobs):
+        x = game.player_x + (i * 37) % 700 - 350
+        game.mobs.spawn(SLIME, x, game.player_y - 60)
+
+
+def run_case(screen, world_width, mobs, zoom, frames, warmup):
+    game = setup_game(screen, world_width, mobs, zoom)
+    samples = {phase: [] for phase in PHASES}
+    samples["frame"] = []
+    for frame in range(warmup + frames):
+        walk_script(frame, game.input)
+        events = game.input.pop_events()
+        frame_start = time.perf_counter()
+        for phase in PHASES:
+            start = time.perf_counter()
+            if phase == "handle_events":
+                game.handle_events(events)
+            else:
+                getattr(game, phase)()
+            if frame >= warmup:
+                samples[phase].append(time.perf_counter() - start)
+        if frame >= warmup:
+            samples["frame"].append(time.perf_counter() - frame_start)
+        top_up_slimes(game, mobs)
+    return {
+        "world_width": world_width,
+        "mobs": mobs,
+        "zoom": zoom,
+        "loaded_chunks": len(game.world.chunks),
+        "phases": {phase: summarize(values) for phase, values in samples.items()}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each frame phase of the game without a display.")
+    parser.add_argument("--world-widths", default="256,2560,25600", help="Comma separated world widths in tiles")
+    parser.add_argument("--mobs", default="0,10,50,1000", help="Comma separated slime counts")
+    parser.add_argument("--zooms", default="0.5,1.0,2.0", help="Comma separated camera zooms")
+    parser.add_argument("--frames", type=int, default=120, help="Measured frames per case")
+    parser.add_argument("--warmup", type=int, default=30, help="Unmeasured frames before each case")
+    parser.add_argument("--out", default=None, help="JSON file to write, stdout if omitted")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # Assets are loaded relative to the repository
+    screen = init_headless()
+    results = []
+    for world_width in [int(value) for value in args.world_widths.split(",")]:
+        for mobs in [int(value) for value in args.mobs.split(",")]:
+            for zoom in [float(value) for value in args.zooms.split(",")]:
+                results.append(run_case(screen, world_width, mobs, zoom, args.frames, args.warmup))
+                print(f"world_width={world_width} mobs={mobs} zoom={zoom}: "
+                      f"{results[-1]['phases']['frame']['mean_ms']:.2f} ms/frame", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "frames": args.frames,
+            "chunk_size": CHUNK_SIZE
+        },
+        "results": results
+    }
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,42 @@
 import pygame
+from tiles import TILE_REGISTRY
+from world import TILE_IDS
+from assets import asset_manager
 
 class Block:
-    def __init__(self, x, y, block_type, block_size, block_images):
-        self.rect = pygame.Rect(x, y, block_size, block_size)
-        self.type = block_type
-        self.image = block_images[block_type]
+    __slots__ = ("x", "y", "tile_id")  # Everything else comes from the shared tile type
+    size = 15  # Width and height in pixels, the same for every block
+
+    def __init__(self, x, y, block_type):
+        """
+        A loose tile at a pixel position, for drawings outside the world like the start screen.
+        :param x: Left edge in pixels.
+        :param y: Top edge in pixels.
+        :param block_type: Tile type name.
+        """
         self.x = x
         self.y = y
-        self.block_type = block_type
-        self.size = block_size
-        self.blocks_player = block_type != "wood_wall"
+        self.tile_id = TILE_IDS[block_type]
+
+    @property
+    def tile_type(self):
+        return TILE_REGISTRY[self.tile_id]
+
+    @property
+    def block_type(self):
+        return self.tile_type.name
+
+    @property
+    def blocks_player(self):
+        return self.tile_type.solid
+
+    @property
+    def rect(self):
+        return pygame.Rect(self.x, self.y, self.size, self.size)
+
+    @property
+    def image(self):
+        return asset_manager.image(self.tile_type.texture, (self.size, self.size))  # Loaded once per type
 
     def draw(self, screen, camera_x, camera_y):
         """
@@ -18,4 +45,4 @@ class Block:
         :param camera_x: Camera x offset
         :param camera_y: Camera y offset
         """
-        screen.blit(self.image, (self.rect.x - camera_x, self.rect.y - camera_y))
\ No newline at end of file
+        screen.blit(self.image, (self.x - camera_x, self.y - camera_y))
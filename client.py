@@ -0,0 +1,93 @@
+import asyncio
+import queue
+import threading
+from protocol import (HEADER, PROTOCOL_VERSION, HELLO, INPUT, EDIT, WELCOME, HELLO_MESSAGE, WELCOME_MESSAGE,
+                      INPUT_MESSAGE, EDIT_MESSAGE, ProtocolError, encode, read_message)
+
+
+class NetworkClient:
+    def __init__(self, host, port, timeout=5.0):
+        """
+        Connection to a GameServer, run on an asyncio loop in a background thread so the game's frames never
+        wait on the network. Messages received are queued until the game polls them on its next tick.
+        :param host: Server address.
+        :param port: Server port.
+        :param timeout: Seconds to wait for the server to accept the connection.
+        """
+        self.messages = queue.Queue()  # (message type, payload), None once the connection is lost
+        self.connected = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.writer = None
+        self.receiving = None  # Task reading from the server
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(self.open(host, port), self.loop)
+        try:
+            self.player_id, self.tick_rate = future.result(timeout)
+        except BaseException:
+            self.close(timeout)
+            raise
+
+    async def open(self, host, port):
+        reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(encode(HELLO, HELLO_MESSAGE.pack(PROTOCOL_VERSION)))
+        message_type, payload = await read_message(reader)
+        if message_type != WELCOME:
+            raise ProtocolError(f"Expected a WELCOME, got message type {message_type}")
+        self.connected = True
+        self.receiving = self.loop.create_task(self.receive(reader))
+        return WELCOME_MESSAGE.unpack(payload)
+
+    async def receive(self, reader):
+        try:
+            while True:
+                message_type, payload = await read_message(reader)
+                self.bytes_received += HEADER.size + len(payload)
+                self.messages.put((message_type, payload))
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            pass
+        finally:
+            self.connected = False
+            self.messages.put(None)
+
+    def send(self, data):
+        """Queue framed data for the server. Safe to call from the game's thread."""
+        self.bytes_sent += len(data)
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+
+    def send_input(self, keys):
+        """:param keys: KEY_ bits held."""
+        self.send(encode(INPUT, INPUT_MESSAGE.pack(keys)))
+
+    def send_edit(self, tile_x, tile_y, tile_id):
+        self.send(encode(EDIT, EDIT_MESSAGE.pack(tile_x, tile_y, tile_id)))
+
+    def poll(self):
+        """Get the messages received since the last poll, ending with None if the connection was lost."""
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    async def shutdown(self):
+        if self.receiving is not None:
+            self.receiving.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def close(self, timeout=5.0):
+        """Close the connection and stop the background thread."""
+        try:
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(timeout)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
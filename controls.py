@@ -0,0 +1,51 @@
+import pygame
+
+
+class PygameInput:
+    """Reads the keyboard and mouse through pygame."""
+
+    def get_pressed(self):
+        return pygame.key.get_pressed()
+
+    def get_mouse_pos(self):
+        return pygame.mouse.get_pos()
+
+
+class KeyState:
+    def __init__(self, keys):
+        """Pressed key lookup like the one pygame.key.get_pressed returns."""
+        self.keys = keys
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class ScriptedInput:
+    def __init__(self):
+        """Input driven by code instead of a keyboard and mouse, for headless runs and benchmarks."""
+        self.keys = set()
+        self.mouse_pos = (0, 0)
+        self.events = []
+
+    def get_pressed(self):
+        return KeyState(self.keys)
+
+    def get_mouse_pos(self):
+        return self.mouse_pos
+
+    def press(self, key):
+        self.keys.add(key)
+
+    def release(self, key):
+        self.keys.discard(key)
+
+    def click(self, pos, button=1):
+        """Move the mouse and queue a click for the next frame."""
+        self.mouse_pos = pos
+        self.events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=button))
+
+    def pop_events(self):
+        """Get the events queued since the last frame."""
+        events = self.events
+        self.events = []
+        return events
@@ -1,15 +1,43 @@
 import pygame
 import sys
 import json
-from block import Block
 from global_settings import *
-from mobs import Slime
+from mobs import SLIME
+from mob_engine import MobEngine, MOB_TYPES
 import random
-from perlin_noise import *
+import numpy as np
+from world import World, CHUNK_SIZE, TILE_TYPES, TILE_IDS, AIR
+from renderer import TileRenderer, ZOOM_LEVELS
+from minimap import Minimap
+from assets import asset_manager
+from hud import HUD, text_cache
+from profiler import profiler, profiled, ProfilerOverlay
+import time
+import worldgen
+from streaming import ChunkStreamer
+from heightmap import Heightmap
+from lighting import LightMap
+from automaton import TileAutomaton
+from navigation import PathFinder
+from tiles import TILE_REGISTRY
+from controls import PygameInput
+from timestep import FixedTimestep, TICK_RATE
+from region import RegionStore, read_level
+from autosave import AutoSaver, EditJournal, JOURNAL_FILE
+from client import NetworkClient
+from protocol import (CHUNK, TILES, ENTITY_ADD, ENTITY_MOVE, ENTITY_REMOVE, KEY_LEFT, KEY_RIGHT, KEY_JUMP, PLAYER,
+                      TILE_RECORD, ENTITY_ADD_RECORD, ENTITY_MOVE_RECORD, ENTITY_REMOVE_RECORD, VIEW_RADIUS,
+                      decode_chunk, decode_records)
 import os
 
 class Game:
-    def __init__(self, screen):
+    def __init__(self, screen, input=None, rng_seed=None):
+        """
+        :param screen: Surface to draw on.
+        :param input: Where keyboard and mouse state come from, pygame's by default.
+        :param rng_seed: Seed of everything random in the game, a random one if None.
+        """
+        self.input = input or PygameInput()
         self.skin_left = self.get_skin('skin.tr',1)
         self.skin_right = self.get_skin('skin.tr',2)
         self.screen = screen
@@ -17,32 +45,21 @@ class Game:
         self.screen_height = 600
         self.block_size = 15
 
-        # World generation parameters
-        self.world_width = 256  # Number of blocks in the world width
-        self.world_height = 10  # Number of blocks in the world height
-        self.seed = random.randint(0, 1000)  # Random seed for world generation
+        # Everything random in the simulation comes from this seed, so a recorded session replays exactly
+        self.rng_seed = rng_seed if rng_seed is not None else random.randrange(1 << 32)
+        self.random = random.Random(self.rng_seed)
+
+        # World generation parameters, the world is endless and generated as the player gets near
+        self.seed = self.random.randint(0, 1000)  # Random seed for world generation
         self.scale = 24.0  # Scale of the noise
-        self.perlin = PerlinNoise1D(self.seed)  # Initialize Perlin noise generator
 
         # Load player textures
-        self.player_image_right = pygame.image.load(self.skin_right)
-        self.player_image_right = pygame.transform.scale(self.player_image_right, (30, 46))
-        self.player_image_left = pygame.image.load(self.skin_left)
-        self.player_image_left = pygame.transform.scale(self.player_image_left, (30, 46))
+        self.player_image_right = asset_manager.image(self.skin_right, (30, 46))
+        self.player_image_left = asset_manager.image(self.skin_left, (30, 46))
 
         # Set initial player image
         self.player_image = self.player_image_left
 
-        # Load block textures
-        self.block_images = {
-            "grass": pygame.image.load("images/blocks/grass.png"),
-            "dirt": pygame.image.load("images/blocks/dirt.png"),
-            "stone": pygame.image.load("images/blocks/stone.png"),
-            "wood_wall": pygame.image.load("images/blocks/wood_wall.png")
-        }
-        for key in self.block_images:
-            self.block_images[key] = pygame.transform.scale(self.block_images[key], (self.block_size, self.block_size))
-
         # Initialize player
         self.player_x = self.screen_width // 2 - 15  # Center horizontally
         self.player_y = self.screen_height - 43 - self.block_size  # Initial player position
@@ -54,15 +71,25 @@ class Game:
         self.player_jumping = 0
         self.fall_height = 0
 
-        # Initialize blocks
-        self.blocks = []
-        self.generate_world()
-
-        # Clock for controlling frame rate
-        self.clock = pygame.time.Clock()
+        # Initialize world, it gets generated or loaded by load_game
+        self.world = World(self.block_size)
+        self.streamer = ChunkStreamer(self.world, max_loaded_chunks)
+        ground_level = (self.screen_height - self.block_size) // self.block_size
+        # Surface row of every column, searched from well above the highest terrain to leave room for building
+        self.heightmap = Heightmap(self.world, ground_level - 2 * worldgen.MAX_TERRAIN_HEIGHT, ground_level)
+        self.light_map = LightMap(self.world, self.heightmap)  # Relit around every edit, after the heightmap
+        self.tile_renderer = TileRenderer(self.world, light_map=self.light_map)  # Block textures are loaded on the first draw
+        self.tile_automaton = TileAutomaton(self.world, ground_level)  # Sand, gravel and water around edits move
+
+        # Fixed-rate simulation, drawn with interpolation at whatever rate the frames come in
+        self.timestep = FixedTimestep(TICK_RATE)
+        self.ticks = 0  # Simulation ticks run so far
+        self.pending_events = []  # Events waiting for the next tick
+        self.previous_player_x = self.player_x  # Player position at the previous tick, for interpolation
+        self.previous_player_y = self.player_y
 
         # Current block type
-        self.block_types = ["grass", "dirt", "stone", "wood_wall"]
+        self.block_types = ["grass", "dirt", "stone", "wood_wall", "sand", "gravel", "water"]
         self.current_block_type_index = 0
         self.current_block_type = self.block_types[self.current_block_type_index]
 
@@ -71,30 +98,40 @@ class Game:
         self.camera_y = 0
         self.camera_zoom = 1.0
 
-        # Touch mode button
-        self.touch_button_image = pygame.image.load("images/gui/touch_button.png")
-        self.touch_button_image = pygame.transform.scale(self.touch_button_image, (60, 60))  # Adjust button size
-        self.touch_button_rect = self.touch_button_image.get_rect(topright=(self.screen_width - 10, 10))
-
-        # Touch UI images
-        self.touch_ui_images = {
-            "up": pygame.image.load("images/gui/touch_move_up.png"),
-            "down": pygame.image.load("images/gui/touch_move_down.png"),
-            "left": pygame.image.load("images/gui/touch_move_left.png"),
-            "right": pygame.image.load("images/gui/touch_move_right.png")
+        # Overlay drawn over the world, its elements are only rendered again when their values change
+        self.hud = HUD()
+        self.profiler_overlay = ProfilerOverlay()
+        self.show_profiler = False  # F3 toggles the profiler overlay, F4 exports a trace
+
+        # Map of the chunks around the player, M toggles it
+        self.minimap = Minimap(self.world)
+        self.show_minimap = True
+        self.minimap_rect = pygame.Rect((0, 0), (160, 96))
+        self.minimap_rect.topright = (self.screen_width - 10, 80)  # Under the touch button
+
+        # Touch mode button, its image is loaded on the first draw
+        self.touch_button_image_path = "images/gui/touch_button.png"
+        self.touch_button_size = (60, 60)  # Adjust button size
+        self.touch_button_rect = pygame.Rect((0, 0), self.touch_button_size)
+        self.touch_button_rect.topright = (self.screen_width - 10, 10)
+
+        # Touch UI images, only loaded once touch mode is turned on
+        self.touch_ui_image_paths = {
+            "up": "images/gui/touch_move_up.png",
+            "down": "images/gui/touch_move_down.png",
+            "left": "images/gui/touch_move_left.png",
+            "right": "images/gui/touch_move_right.png"
         }
 
         # Touch UI scale
-        for direction in self.touch_ui_images:
-            self.touch_ui_images[direction] = pygame.transform.scale(self.touch_ui_images[direction], (80, 80))
+        self.touch_ui_size = (80, 80)
 
         # Touch UI positions
-        self.touch_ui_rects = {
-            "up": self.touch_ui_images["up"].get_rect(bottomleft=(50, self.screen_height - 150)),
-            "down": self.touch_ui_images["down"].get_rect(topleft=(50, self.screen_height - 100)),
-            "left": self.touch_ui_images["left"].get_rect(topright=(250, self.screen_height - 100)),
-            "right": self.touch_ui_images["right"].get_rect(topleft=(300, self.screen_height - 100))
-        }
+        self.touch_ui_rects = {direction: pygame.Rect((0, 0), self.touch_ui_size) for direction in self.touch_ui_image_paths}
+        self.touch_ui_rects["up"].bottomleft = (50, self.screen_height - 150)
+        self.touch_ui_rects["down"].topleft = (50, self.screen_height - 100)
+        self.touch_ui_rects["left"].topright = (250, self.screen_height - 100)
+        self.touch_ui_rects["right"].topleft = (300, self.screen_height - 100)
 
         # Touch mode flag
         self.touch_mode = False
@@ -106,14 +143,18 @@ class Game:
         self.death_height = 25 * self.block_size  # Death height
         self.spawn_point = (self.player_x, self.player_y)  # Spawn point
         self.fall_height = 0
+        self.respawn_delay = 5 * TICK_RATE  # Ticks from death to respawn
+        self.respawn_ticks = 0  # Ticks left until the player respawns, 0 while alive
+        self.invulnerability = TICK_RATE // 2  # Ticks after a slime hit during which slimes can't hurt the player
+        self.invulnerable_ticks = 0
 
-        # Load slime texture path
-        self.slime_image_path = "images/mobs/slime.png"
-        self.slimes = []  # List to store active slimes
+        # Mobs, simulated together in arrays
+        self.mobs = MobEngine(self.world, rng=np.random.default_rng(self.rng_seed))
+        self.pathfinder = PathFinder(self.world)  # Slimes near the player follow paths to it
 
         # Slime spawn timer
         self.slime_spawn_timer = 0
-        self.slime_spawn_interval = 5000  # Spawn a slime every 5 seconds
+        self.slime_spawn_interval = 5 * TICK_RATE  # Spawn a slime every 5 seconds
 
         # Attack variables
         self.attack_cooldown = 0
@@ -121,41 +162,67 @@ class Game:
         self.attack_range = 50  # Range of the attack
         self.attack_damage = 1  # Damage per attack
 
-    def generate_world(self):
-        """Generate the world using 1D Perlin noise."""
-        for x in range(self.world_width):
-            # Generate Perlin noise value (range: -1 to 1)
-            noise_value = self.perlin.noise(x / self.scale)
-            
-            # Map noise value to terrain height (range: 10 to 30 blocks)
-            terrain_height = int((noise_value + 1) * 10 + 10)  # Adjust range as needed
-
-            # Calculate the ground level (bottom of the screen)
-            ground_level = self.screen_height - self.block_size
-
-            # Generate blocks from ground level upwards
-            for y in range(ground_level - terrain_height * self.block_size, ground_level, self.block_size):
-                if y == ground_level - self.block_size:
-                    block_type = "stone"  # Top layer is grass
-                elif y >= ground_level - 10 * self.block_size:
-                    block_type = "dirt"  # Next few layers are dirt
-                else:
-                    block_type = "grass"  # Everything below is stone
+        # Saving
+        self.save_path = "world"  # World directory to save to, None while recording a session (see replay.py)
+        self.autosaver = AutoSaver()
+        self.journal = None  # Edit journal of the world directory, once the world has been saved there
+        self.autosave_interval = 30000  # Autosave every 30 seconds
+        self.last_autosave = 0
+
+        # Multiplayer, see connect
+        self.client = None  # Connection to the server while playing on one
+        self.sent_keys = None  # Key bits last sent to the server
+        self.remote_players = {}  # Player ID -> [x, y, previous x, previous y] of the other players in view
+        self.player_synced = False  # Whether the server sent this player's position yet, see drop_far_chunks
 
-                # Add block to the world
-                self.blocks.append(Block(x * self.block_size, y, block_type, self.block_size, self.block_images))
+        self.recorder = None  # InputRecorder logging the input of every tick, see replay.py
+
+    def generate_world(self):
+        """Start a new endless world. Chunks are generated from the seed with 1D Perlin noise when first needed."""
+        if self.world.store is not None:
+            self.world.store.close()
+        ground_level = (self.screen_height - self.block_size) // self.block_size  # Bottom of the screen, in tiles
+        self.world.clear(generator=worldgen.ChunkGenerator(self.seed, self.scale, ground_level))
 
     def run(self, events):
+        """
+        Run the simulation ticks that are due, then draw a frame between the last two ticks.
+        Events are kept for the next tick if no tick is due this frame.
+        """
+        self.pending_events.extend(events)
+        for _ in range(self.timestep.advance()):
+            events, self.pending_events = self.pending_events, []
+            self.update(events)
+        self.draw_game(self.timestep.alpha())
+
+    @profiled("tick")
+    def update(self, events):
+        """Advance the simulation by one tick without drawing it."""
+        if self.recorder is not None:
+            self.recorder.record(events, self.input)
+        self.ticks += 1
+        self.previous_player_x = self.player_x
+        self.previous_player_y = self.player_y
         self.handle_events(events)
-        self.update_player()
-        # self.update_slimes()  # Update slimes
+        if self.client is not None:
+            self.update_network()  # The server moves everything
+        else:
+            last_player_x = self.player_x
+            if self.respawn_ticks > 0:
+                self.update_respawn()
+            else:
+                self.update_player()
+            self.update_tiles()
+            self.streamer.update(self.player_x, self.player_y, self.player_x - last_player_x, self.player_velocity_y)
+            self.update_slimes()  # The server moves them when connected
+            self.update_autosave()
         self.update_attack()  # Update attack cooldown
-        self.draw_game()
-        self.clock.tick(60)  # Increase frame rate to 60 FPS for smoother movement
 
+    @profiled("handle_events")
     def handle_events(self, events):
         for event in events:
             if event.type == pygame.QUIT:
+                self.finish_saving()
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -165,27 +232,31 @@ class Game:
                     self.touch_mode = not self.touch_mode  # Toggle touch mode
             if event.type == pygame.MOUSEWHEEL:  # Handle mouse wheel scroll
                 self.handle_mouse_wheel(event)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.show_profiler = not self.show_profiler
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                self.export_trace()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_m:
+                self.show_minimap = not self.show_minimap
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_EQUALS and self.input.get_pressed()[pygame.K_LCTRL]:
+                self.step_zoom(1)  # Ctrl+= to zoom in
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_MINUS and self.input.get_pressed()[pygame.K_LCTRL]:
+                self.step_zoom(-1)  # Ctrl+- to zoom out
 
         # Handle touch UI clicks
         if self.touch_mode:
-            mouse_pos = pygame.mouse.get_pos()
+            mouse_pos = self.input.get_mouse_pos()
             for direction, rect in self.touch_ui_rects.items():
                 if rect.collidepoint(mouse_pos):
                     self.handle_touch_ui_click(direction)
 
         # Handle key events
-        keys = pygame.key.get_pressed()
+        keys = self.input.get_pressed()
         if keys[pygame.K_g]:  # Press 'g' to switch to the previous block type
             self.switch_block_type(-1)
         if keys[pygame.K_h]:  # Press 'h' to switch to the next block type
             self.switch_block_type(1)
-        if keys[pygame.K_LCTRL] and keys[pygame.K_EQUALS]:  # Ctrl+= to zoom in
-            self.camera_zoom += 0.1
-        if keys[pygame.K_LCTRL] and keys[pygame.K_MINUS]:  # Ctrl+- to zoom out
-            self.camera_zoom -= 0.1
-            if self.camera_zoom < 0.5:
-                self.camera_zoom = 0.5
-        if keys[pygame.K_k]:  # Press 'k' to attack
+        if keys[pygame.K_k] and self.respawn_ticks == 0:  # Press 'k' to attack
             self.attack()
         if keys[pygame.K_l]:
             self.health += 10
@@ -193,25 +264,56 @@ class Game:
                 self.health = 100
 
     def handle_mouse_click(self, event):
-        mouse_x, mouse_y = pygame.mouse.get_pos()
+        mouse_x, mouse_y = self.input.get_mouse_pos()
 
         # Adjust mouse position based on zoom and camera offset
-        mouse_x = int((mouse_x - (self.screen_width - self.screen_width * self.camera_zoom) // 2) / self.camera_zoom) + self.camera_x
-        mouse_y = int((mouse_y - (self.screen_height - self.screen_height * self.camera_zoom) // 2) / self.camera_zoom) + self.camera_y
+        origin_x, origin_y, zoom = self.get_view()
+        mouse_x = int((mouse_x + origin_x) // zoom)
+        mouse_y = int((mouse_y + origin_y) // zoom)
 
         # Check if the mouse is within the 5-block range around the player
         if abs(mouse_x - self.player_x) > 10 * self.block_size or abs(mouse_y - self.player_y) > 10 * self.block_size:
             return  # Ignore clicks outside the range
 
+        tile_x = mouse_x // self.block_size
+        tile_y = mouse_y // self.block_size
         if event.button == 1:  # Left click: Place block
-            block_x = (mouse_x // self.block_size) * self.block_size
-            block_y = (mouse_y // self.block_size) * self.block_size
-            if not any(block.rect.collidepoint(block_x, block_y) for block in self.blocks):
-                self.blocks.append(Block(block_x, block_y, self.current_block_type, self.block_size, self.block_images))
+            tile_id = self.world.get_tile(tile_x, tile_y)
+            if tile_id == AIR or TILE_REGISTRY[tile_id].flows:  # Blocks can be placed in water
+                self.set_block(tile_x, tile_y, TILE_IDS[self.current_block_type])
         elif event.button == 3:  # Right click: Remove block
-            for block in self.blocks:
-                if block.rect.collidepoint(mouse_x, mouse_y):
-                    self.blocks.remove(block)
+            if self.world.get_tile(tile_x, tile_y) != AIR:
+                self.set_block(tile_x, tile_y, AIR)
+
+    def set_block(self, tile_x, tile_y, tile_id):
+        """Change a tile and log the edit to the journal, so it survives a crash before the next save."""
+        if self.client is not None:
+            self.client.send_edit(tile_x, tile_y, tile_id)  # Changed once the server sends it back
+            return
+        self.world.set_tile(tile_x, tile_y, tile_id)
+        if self.journal is not None:
+            self.journal.record(tile_x, tile_y, tile_id)
+
+    def edit_blocks(self, edit, *args):
+        """
+        Run a bulk edit and log the tiles it changed to the journal, like set_block does for one tile.
+        :param edit: World.fill_rect, World.replace_tiles or World.paste_region.
+        :param args: Arguments of the edit.
+        """
+        changes = edit(*args)
+        if self.journal is not None and len(changes[2]):
+            self.journal.record_many(*changes)
+        return changes
+
+    @profiled("update_tiles")
+    def update_tiles(self):
+        """Let sand and gravel fall and water flow. Their moves aren't journaled, edits wake them again on a reload."""
+        self.tile_automaton.step()
+
+    def step_zoom(self, direction):
+        """Move the camera zoom one level in or out (1 or -1), see ZOOM_LEVELS."""
+        index = min(range(len(ZOOM_LEVELS)), key=lambda i: abs(ZOOM_LEVELS[i] - self.camera_zoom))
+        self.camera_zoom = ZOOM_LEVELS[max(0, min(len(ZOOM_LEVELS) - 1, index + direction))]
 
     def handle_mouse_wheel(self, event):
         """Handle mouse wheel scroll to switch block types."""
@@ -242,52 +344,49 @@ class Game:
             self.player_x += self.player_speed
             self.player_image = self.player_image_right  # Set image to right when moving right
 
+    @profiled("update_slimes")
     def update_slimes(self):
         """
         Update all slimes in the game.
         """
-        # Update slime positions
-        for slime in self.slimes:
-            slime.update(self.blocks)
+        # Update slime positions, the ones near the player heading for it
+        self.pathfinder.steer(self.mobs, [self.player_x + 15], [self.player_y + 45])
+        self.pathfinder.update()
+        self.mobs.update()
 
         # Remove slimes that are off-screen
-        self.slimes = [slime for slime in self.slimes if slime.x > -100 and slime.x < self.screen_width + 100]
+        self.mobs.despawn_outside(self.camera_x - 100, self.camera_x + self.screen_width + 100)
 
         # Spawn new slimes
-        current_time = pygame.time.get_ticks()
-        if current_time - self.slime_spawn_timer > self.slime_spawn_interval:
+        if self.ticks - self.slime_spawn_timer > self.slime_spawn_interval:
             self.spawn_slime()
-            self.slime_spawn_timer = current_time
+            self.slime_spawn_timer = self.ticks
 
     def spawn_slime(self):
         """
         Spawn a slime at a random position near the player, ensuring it's on the ground.
         """
-        spawn_x = self.player_x + random.randint(-200, 200)
-        spawn_y = self.player_y  # Spawn at ground level
+        spawn_x = int(self.player_x) + self.random.randint(-200, 200)
 
-        # Adjust spawn_y to ensure the slime is on the ground
-        for block in self.blocks:
-            if block.rect.collidepoint(spawn_x, spawn_y):
-                spawn_y = self.player_y  # Place slime on top of the block
-                Slime(spawn_x,spawn_y,self.slime_image_path,15)
-                break
-
-        
+        # Place the slime on top of the topmost block of the column it spawns in
+        surface_y = self.heightmap.surface_y((spawn_x + SLIME.size // 2) // self.block_size)
+        if surface_y is None:
+            return  # No ground to stand on
+        spawn_y = surface_y * self.block_size - SLIME.size
 
         # Check if the spawn position overlaps with existing slimes
-        slime_rect = pygame.Rect(spawn_x, spawn_y, 25, 25)
-        for slime in self.slimes:
-            if slime_rect.colliderect(slime.rect):
-                return  # Skip spawning if overlapping
+        slime_rect = pygame.Rect(spawn_x, spawn_y, SLIME.size, SLIME.size)
+        if len(self.mobs.overlapping(slime_rect)):
+            return  # Skip spawning if overlapping
 
-        slime = Slime(spawn_x, spawn_y, self.slime_image_path, 25)
-        self.slimes.append(slime)
+        self.mobs.spawn(SLIME, spawn_x, spawn_y)
 
     def attack(self):
         """
         Handle player attacks.
         """
+        if self.client is not None:
+            return  # The server doesn't simulate combat yet
         if self.attack_cooldown <= 0:
             self.attack_cooldown = self.attack_duration
 
@@ -297,12 +396,10 @@ class Game:
             else:
                 attack_rect = pygame.Rect(self.player_x + 29, self.player_y, self.attack_range, 46)
 
-            # Check for collisions with slimes
-            for slime in self.slimes[:]:
-                if attack_rect.colliderect(slime.rect):
-                    if slime.take_damage(self.attack_damage):
-                        self.slimes.remove(slime)  # Remove slime if it dies
+            # Damage the slimes in the attack area, removing the ones that die
+            self.mobs.damage(self.mobs.overlapping(attack_rect), self.attack_damage)
 
+    @profiled("update_attack")
     def update_attack(self):
         """
         Update the attack cooldown.
@@ -310,8 +407,9 @@ class Game:
         if self.attack_cooldown > 0:
             self.attack_cooldown -= 1
 
+    @profiled("update_player")
     def update_player(self):
-        keys = pygame.key.get_pressed()
+        keys = self.input.get_pressed()
         if keys[pygame.K_a]:
             self.player_x -= self.player_speed
             self.player_image = self.player_image_left  # Set image to left when moving left
@@ -353,101 +451,406 @@ class Game:
 
     def handle_player_collisions(self):
         player_rect = pygame.Rect(self.player_x, self.player_y, 30, 46)
-        for block in self.blocks:
-            if block.blocks_player and player_rect.colliderect(block.rect):
+        for block_rect in self.world.solid_rects(player_rect):
+            if player_rect.colliderect(block_rect):
                 if self.player_velocity_y > 0:  # Colliding from above
-                    self.player_y = block.rect.top - 46
+                    self.player_y = block_rect.top - 46
                     self.player_velocity_y = 0
                 elif self.player_velocity_y < 0:  # Colliding from below
-                    self.player_y = block.rect.bottom
+                    self.player_y = block_rect.bottom
                     self.player_velocity_y = 0
 
-        # Check collisions with slimes
-        for slime in self.slimes:
-            if player_rect.colliderect(slime.rect):
-                self.health -= 6  # Reduce health by 6
-                if self.health <= 0:
-                    self.die()
+        # Check collisions with slimes, a hit makes the player invulnerable for a moment
+        if self.invulnerable_ticks > 0:
+            self.invulnerable_ticks -= 1
+            return
+        damages = self.mobs.contact_damages(player_rect)
+        if damages:
+            self.health -= max(damages)  # One hit at a time, however many slimes touch the player
+            self.invulnerable_ticks = self.invulnerability
+            if self.health <= 0:
+                self.die()
 
     def die(self):
+        """Start the respawn countdown. The player stays where it died until then, see update_respawn."""
+        self.health = 0
+        self.player_velocity_y = 0
+        self.respawn_ticks = self.respawn_delay
+
+    def update_respawn(self):
+        """Count down to the respawn and put the player back at the spawn point when it is over."""
+        self.respawn_ticks -= 1
+        if self.respawn_ticks > 0:
+            return
         self.player_x, self.player_y = self.spawn_point
+        # Stand on the ground at the spawn point, even if it was dug out or built over since
+        surface_y = self.heightmap.surface_y(int(self.player_x + 15) // self.block_size)
+        if surface_y is not None:
+            self.player_y = surface_y * self.block_size - 46
         self.player_velocity_y = 0
+        self.previous_player_x, self.previous_player_y = self.player_x, self.player_y  # Don't draw it sliding there
         self.health = self.max_health
         self.spawn_point = (self.player_x, self.player_y)  # Update spawn point
-        pygame.time.delay(5000)  # Respawn after 5 seconds
+        self.invulnerable_ticks = self.invulnerability
+        self.camera_x = self.player_x - self.screen_width // 2
+        self.camera_y = self.player_y - self.screen_height // 2
 
-    def draw_game(self):
-        # Create a temporary surface to draw the game elements
-        temp_surface = pygame.Surface((self.screen_width, self.screen_height))
-        temp_surface.fill((123, 104, 238))  # Fill with sky color
+    def get_view(self, camera_x=None, camera_y=None):
+        """
+        Get the view's top-left corner in zoomed world pixels and the zoom the world is drawn at.
+        The view stays centered on the camera center at any zoom.
+        :param camera_x: Camera x to use instead of the one from the last tick.
+        :param camera_y: Camera y to use instead of the one from the last tick.
+        """
+        if camera_x is None:
+            camera_x, camera_y = self.camera_x, self.camera_y
+        zoom = self.tile_renderer.effective_zoom(self.camera_zoom)
+        origin_x = round((camera_x + self.screen_width / 2) * zoom - self.screen_width / 2)
+        origin_y = round((camera_y + self.screen_height / 2) * zoom - self.screen_height / 2)
+        return origin_x, origin_y, zoom
+
+    @profiled("draw_game")
+    def draw_game(self, alpha=1.0):
+        """
+        Draw the game.
+        :param alpha: Where to draw moving things between the previous tick (0) and the last one (1).
+        """
+        # Interpolate the player and the camera following it
+        player_x = self.previous_player_x + (self.player_x - self.previous_player_x) * alpha
+        player_y = self.previous_player_y + (self.player_y - self.previous_player_y) * alpha
+        origin_x, origin_y, zoom = self.get_view(player_x - self.screen_width // 2,
+                                                 player_y - self.screen_height // 2)
+        self.screen.fill((123, 104, 238))  # Fill with sky color
 
-        # Draw blocks on the temporary surface
-        for block in self.blocks:
-            block.draw(temp_surface, self.camera_x, self.camera_y)
+        # Draw the chunks inside the view at the zoomed tile size
+        self.tile_renderer.draw(self.screen, origin_x, origin_y, zoom)
 
         # Draw Slime mobs
-        for slime in self.slimes:
-            slime.draw(temp_surface, self.camera_x, self.camera_y)
-
-        # Draw the player last to ensure it's on top
-        temp_surface.blit(self.player_image, (self.player_x - self.camera_x, self.player_y - self.camera_y))
-
-        # Scale the temporary surface to the desired zoom level
-        scaled_surface = pygame.transform.scale(temp_surface, 
-                                                (int(self.screen_width * self.camera_zoom), 
-                                                int(self.screen_height * self.camera_zoom)))
-
-        # Calculate the offset to keep the player centered
-        offset_x = (self.screen_width - scaled_surface.get_width()) // 2
-        offset_y = (self.screen_height - scaled_surface.get_height()) // 2
-
-        # Blit the scaled surface onto the main screen with the offset
-        self.screen.blit(scaled_surface, (offset_x, offset_y))
+        self.mobs.draw(self.tile_renderer, self.screen, origin_x, origin_y, zoom, alpha)
 
-        # Draw the current block type on the screen
-        font = pygame.font.Font(default_font, 20)
-        block_type_text = f"Current Block: {self.current_block_type.capitalize()}"
-        text_surface = font.render(block_type_text, True, (255, 255, 255))
-        self.screen.blit(text_surface, (10, self.screen_height - 30))
+        # Draw the other players on the server
+        for x, y, previous_x, previous_y in self.remote_players.values():
+            self.tile_renderer.draw_sprite(self.screen, self.player_image_right, previous_x + (x - previous_x) * alpha,
+                                           previous_y + (y - previous_y) * alpha, origin_x, origin_y, zoom)
 
-        # Draw health bar
+        # Draw the player last to ensure it's on top
+        self.tile_renderer.draw_sprite(self.screen, self.player_image, player_x, player_y,
+                                       origin_x, origin_y, zoom)
+
+        # Draw the current block type, the health bar and the touch buttons
+        self.update_hud()
+        self.hud.draw(self.screen)
+
+    def update_hud(self):
+        """Give the HUD the values to show this frame."""
+        self.hud.set("block_type", self.current_block_type, (10, self.screen_height - 30),
+                     lambda block_type: text_cache.render(f"Current Block: {block_type.capitalize()}", 20, (255, 255, 255)))
+        self.hud.set("health", (self.health, self.max_health), (10, 10), self.render_health_bar)
+        self.hud.set("touch_button", None, self.touch_button_rect.topleft,
+                     lambda value: asset_manager.image(self.touch_button_image_path, self.touch_button_size))
+
+        # Profiler overlay, its table is rendered again twice a second
+        if self.show_profiler:
+            self.hud.set("profiler", self.profiler_overlay.update(pygame.time.get_ticks()), (10, 80),
+                         self.profiler_overlay.render)
+        else:
+            self.hud.remove("profiler")
+
+        # Minimap, drawn again only when it scrolls or a chunk on it changes. The player's marker just moves.
+        if self.show_minimap:
+            tile_x = int(self.player_x) // self.block_size + 1  # Middle of the player
+            tile_y = int(self.player_y) // self.block_size + 1
+            view = self.minimap.view(tile_x, tile_y, self.minimap_rect.width, self.minimap_rect.height)
+            self.hud.set("minimap", view, self.minimap_rect.topleft, self.minimap.render_view)
+            marker_x = self.minimap_rect.x + tile_x // self.minimap.tiles_per_pixel - view[0] - 1
+            marker_y = self.minimap_rect.y + tile_y // self.minimap.tiles_per_pixel - view[1] - 1
+            self.hud.set("minimap_player", None, (marker_x, marker_y), self.render_minimap_marker)
+        else:
+            self.hud.remove("minimap")
+            self.hud.remove("minimap_player")
+
+        # Touch UI
+        for direction, rect in self.touch_ui_rects.items():
+            if self.touch_mode:
+                self.hud.set("touch_" + direction, None, rect.topleft,
+                             lambda value: asset_manager.image(self.touch_ui_image_paths[direction], self.touch_ui_size))
+            else:
+                self.hud.remove("touch_" + direction)
+
+    def export_trace(self, path=None):
+        """Write the profiler's recent timings as a Chrome trace / Perfetto JSON file."""
+        if path is None:
+            path = time.strftime("trace_%Y%m%d_%H%M%S.json")
+        profiler.export_chrome_trace(path)
+        print(f"Trace written to {path}")
+
+    def render_minimap_marker(self, value):
+        marker = pygame.Surface((3, 3))
+        marker.fill((255, 255, 255))
+        return marker
+
+    def render_health_bar(self, health):
+        health, max_health = health
         health_bar_width = 200
         health_bar_height = 20
-        health_bar_x = 10
-        health_bar_y = 10
-        pygame.draw.rect(self.screen, (255, 0, 0), (health_bar_x, health_bar_y, health_bar_width, health_bar_height))
-        pygame.draw.rect(self.screen, (0, 255, 0), (health_bar_x, health_bar_y, int(health_bar_width * (self.health / self.max_health)), health_bar_height))
+        surface = pygame.Surface((health_bar_width, health_bar_height))
+        surface.fill((255, 0, 0))
+        pygame.draw.rect(surface, (0, 255, 0), (0, 0, int(health_bar_width * (health / max_health)), health_bar_height))
+        return surface
 
-        # Draw touch mode button
-        self.screen.blit(self.touch_button_image, self.touch_button_rect)
-
-        # Draw touch UI
-        if self.touch_mode:
-            for direction, rect in self.touch_ui_rects.items():
-                self.screen.blit(self.touch_ui_images[direction], rect)
-
-    def save_game(self, filename="save.json"):
-        save_data = {
+    @profiled("save_game")
+    def save_game(self, path=None, background=False):
+        """
+        Save the world as region files plus a level file with the player state.
+        The changed chunks are snapshotted copy-on-write, so the write itself can run in the background.
+        :param path: World directory, defaults to the save path.
+        :param background: Return right away and let the autosaver write the snapshot.
+        """
+        if self.client is not None:
+            return  # The server owns the world
+        if path is None:
+            path = self.save_path
+            if path is None:
+                return  # Recording a session on a fresh world, nothing to save it over
+        self.finish_saving()  # One write at a time
+        store = self.world.store
+        if store is None or store.directory != path:
+            # Saving to a new directory, start its journal from scratch
+            store = RegionStore(path)
+            os.makedirs(path, exist_ok=True)
+            journal_path = os.path.join(path, JOURNAL_FILE)
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+            if self.journal is not None:
+                self.journal.close()
+            self.journal = EditJournal(journal_path)
+            self.save_path = path
+        snapshot = self.world.snapshot(store)
+        level_data = {
+            "seed": self.seed,
+            "endless": self.world.generator is not None,
             "player_x": self.player_x,
             "player_y": self.player_y,
-            "blocks": [(block.x, block.y, block.block_type) for block in self.blocks],
             "health": self.health,
-            "spawn_point": self.spawn_point
+            "spawn_point": self.spawn_point,
+            "journal_seq": self.journal.seq
         }
-        with open(filename, "w") as file:
-            json.dump(save_data, file)
+        self.autosaver.start(store, snapshot, level_data)
+        self.last_autosave = pygame.time.get_ticks()
+        if not background:
+            self.finish_saving()
+
+    def update_autosave(self):
+        """
+        Finish up a background save that is done, and start an autosave when one is due.
+        Modified chunks the streamer unloaded are saved right away, so they don't pile up in memory.
+        """
+        job = self.autosaver.poll()
+        if job is not None:
+            self.handle_saved(job)
+        if not self.autosaver.busy() and (self.world.evicted or
+                                          pygame.time.get_ticks() - self.last_autosave >= self.autosave_interval):
+            self.save_game(background=True)
+
+    def finish_saving(self):
+        """Wait for a background save to be written."""
+        self.autosaver.wait()
+        job = self.autosaver.poll()
+        if job is not None:
+            self.handle_saved(job)
+
+    def handle_saved(self, job):
+        store, snapshot, level_data, error = job
+        if error is not None:
+            print(f"Saving failed: {error}")
+            self.world.mark_unsaved(snapshot)  # Try these chunks again next time, the journal still has the edits
+        else:
+            self.world.saved()
+            self.journal.discard_through(level_data["journal_seq"])
+
+    @profiled("load_game")
+    def load_game(self, path="world", legacy_filename="save.json"):
+        """
+        Load a saved world. Only the chunks around the player are decoded, the rest load when first needed.
+        Edits from the journal that didn't make it into the last save are applied again.
+        :param path: World directory.
+        :param legacy_filename: JSON save to import when there is no world directory.
+        """
+        self.disconnect()
+        self.finish_saving()
+        level_data = read_level(path)
+        if level_data is None:
+            if not self.import_legacy_save(legacy_filename):
+                self.generate_world()  # Nothing saved yet, start a new world
+            self.save_game(path, background=True)  # Set up the world directory, so edits get journaled from now on
+            return
+        self.seed = level_data["seed"]
+        self.player_x = level_data["player_x"]
+        self.player_y = level_data["player_y"]
+        self.health = level_data["health"]
+        self.spawn_point = level_data["spawn_point"]
+        self.invulnerable_ticks = 0
+        self.respawn_ticks = 0
+        if self.health <= 0:
+            self.die()  # Saved while waiting to respawn, count down again
+        if self.world.store is not None:
+            self.world.store.close()
+        generator = None
+        if level_data.get("endless", True):
+            ground_level = (self.screen_height - self.block_size) // self.block_size
+            generator = worldgen.ChunkGenerator(self.seed, self.scale, ground_level)
+        self.world.clear(RegionStore(path), generator)
+        self.streamer = ChunkStreamer(self.world, max_loaded_chunks)
+        self.save_path = path
+
+        # Recover the edits made after the last save
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = EditJournal(os.path.join(path, JOURNAL_FILE), level_data.get("journal_seq", 0))
+        self.journal.replay(self.world, level_data.get("journal_seq", 0))
+
+        # Decode the chunks around the player
+        chunk_pixels = CHUNK_SIZE * self.block_size
+        player_cx = self.player_x // chunk_pixels
+        player_cy = self.player_y // chunk_pixels
+        for cy in range(player_cy - 2, player_cy + 3):
+            for cx in range(player_cx - 2, player_cx + 3):
+                self.world.get_chunk(cx, cy)
+
+    def connect(self, host, port):
+        """
+        Play on a server instead of a local world. The server simulates the world and everything in it,
+        this game sends it the keys held and the tiles clicked, and draws the chunks and entities it sends back.
+        :param host: Server address.
+        :param port: Server port.
+        """
+        self.disconnect()
+        self.finish_saving()
+        if self.world.store is not None:
+            self.world.store.close()
+        self.world.clear()  # Filled with the chunks the server sends
+        self.streamer = ChunkStreamer(self.world, max_loaded_chunks)
+        self.mobs.remove(np.ones(self.mobs.count, dtype=bool))
+        self.client = NetworkClient(host, port)
+        self.sent_keys = None
+        self.player_synced = False
+
+    def disconnect(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        self.remote_players = {}
+
+    @profiled("update_network")
+    def update_network(self):
+        """Send the keys held to the server if they changed, then apply everything it sent since the last tick."""
+        keys = self.input.get_pressed()
+        held = (KEY_LEFT if keys[pygame.K_a] else 0) | (KEY_RIGHT if keys[pygame.K_d] else 0) | \
+               (KEY_JUMP if keys[pygame.K_SPACE] else 0)
+        if held != self.sent_keys:
+            self.client.send_input(held)
+            self.sent_keys = held
+        if keys[pygame.K_a]:
+            self.player_image = self.player_image_left
+        if keys[pygame.K_d]:
+            self.player_image = self.player_image_right
+
+        # Positions from the last tick become the ones interpolated from
+        n = self.mobs.count
+        self.mobs.previous_x[:n] = self.mobs.x[:n]
+        self.mobs.previous_y[:n] = self.mobs.y[:n]
+        for player in self.remote_players.values():
+            player[2], player[3] = player[0], player[1]
+
+        for message in self.client.poll():
+            if message is None:
+                print("Lost the connection to the server.")
+            else:
+                self.apply_message(*message)
+        if self.player_synced:
+            self.drop_far_chunks()
 
-    def load_game(self, filename="save.json"):
+        self.camera_x = self.player_x - self.screen_width // 2
+        self.camera_y = self.player_y - self.screen_height // 2
+
+    def drop_far_chunks(self):
+        """
+        Unload the chunks the server no longer counts as sent. It forgets them a chunk outside the view, see
+        GameServer.kept_chunks. One more chunk of margin covers the player's position of the last tick arriving
+        after its chunks.
+        """
+        chunk_pixels = CHUNK_SIZE * self.block_size
+        center_cx = int(self.player_x) // chunk_pixels
+        center_cy = int(self.player_y) // chunk_pixels
+        radius_x, radius_y = VIEW_RADIUS[0] + 2, VIEW_RADIUS[1] + 2
+        far = [(cx, cy) for cx, cy in self.world.chunks
+               if abs(cx - center_cx) > radius_x or abs(cy - center_cy) > radius_y]
+        if far:
+            self.world.unload(far, discard=True)  # The server saves the world, and sends them again when needed
+
+    def apply_message(self, message_type, payload):
+        """Apply one message from the server, see protocol.py."""
+        if message_type == CHUNK:
+            cx, cy, tiles = decode_chunk(payload)
+            self.world.put_chunk(cx, cy, tiles)
+        elif message_type == TILES:
+            for tile_x, tile_y, tile_id in decode_records(payload, TILE_RECORD).tolist():
+                self.world.set_tile(tile_x, tile_y, tile_id)
+        elif message_type == ENTITY_ADD:
+            records = decode_records(payload, ENTITY_ADD_RECORD)
+            mobs = records[records["kind"] != PLAYER]
+            self.mobs.remove(np.isin(self.mobs.mob_id[:self.mobs.count], mobs["entity_id"]))  # Jumped, not new
+            for type_id, mob_id, x, y in zip(mobs["type_id"].tolist(), mobs["entity_id"].tolist(),
+                                             mobs["x"].tolist(), mobs["y"].tolist()):
+                self.mobs.spawn(MOB_TYPES[type_id], x, y, mob_id)
+            for player_id, x, y in records[records["kind"] == PLAYER][["entity_id", "x", "y"]].tolist():
+                if player_id == self.client.player_id:
+                    self.player_x = self.previous_player_x = x
+                    self.player_y = self.previous_player_y = y
+                    self.player_synced = True
+                else:
+                    self.remote_players[player_id] = [x, y, x, y]
+        elif message_type == ENTITY_MOVE:
+            records = decode_records(payload, ENTITY_MOVE_RECORD)
+            mobs = records[records["kind"] != PLAYER]
+            indices = self.mobs.find(mobs["entity_id"])
+            found = indices >= 0
+            self.mobs.x[indices[found]] += mobs["dx"][found]
+            self.mobs.y[indices[found]] += mobs["dy"][found]
+            for player_id, dx, dy in records[records["kind"] == PLAYER][["entity_id", "dx", "dy"]].tolist():
+                if player_id == self.client.player_id:
+                    self.player_x += dx
+                    self.player_y += dy
+                elif player_id in self.remote_players:
+                    self.remote_players[player_id][0] += dx
+                    self.remote_players[player_id][1] += dy
+        elif message_type == ENTITY_REMOVE:
+            records = decode_records(payload, ENTITY_REMOVE_RECORD)
+            self.mobs.remove(np.isin(self.mobs.mob_id[:self.mobs.count], records["entity_id"][records["kind"] != PLAYER]))
+            for player_id in records["entity_id"][records["kind"] == PLAYER].tolist():
+                self.remote_players.pop(player_id, None)
+
+    def import_legacy_save(self, filename="save.json"):
+        """
+        Load a save from the old JSON format, which lists every block. These worlds keep their fixed size.
+        :return: Whether the save file was found.
+        """
         try:
             with open(filename, "r") as file:
                 save_data = json.load(file)
                 self.player_x = save_data["player_x"]
                 self.player_y = save_data["player_y"]
-                self.blocks = [Block(x, y, block_type, self.block_size, self.block_images) for x, y, block_type in save_data["blocks"]]
+                if self.world.store is not None:
+                    self.world.store.close()
+                self.world.clear()
+                for x, y, block_type in save_data["blocks"]:
+                    self.world.set_tile(x // self.block_size, y // self.block_size, TILE_IDS[block_type])
                 self.health = save_data["health"]
                 self.spawn_point = save_data["spawn_point"]
+            return True
         except FileNotFoundError:
             print("Save file not found.")
+            return False
 
     def get_skin(self, filename, line_number): # Get Config
         if not os.path.exists(filename):
@@ -1,2 +1,9 @@
+import os
+
 version = "v0.1.0"
-default_font = 'fonts/NotoSans.ttf'
\ No newline at end of file
+default_font = 'fonts/NotoSans.ttf'
+if not os.path.exists(default_font):
+    default_font = 'fonts/terraria.ttf'  # NotoSans isn't shipped with the repository
+max_loaded_chunks = 4096  # Chunks kept in memory before the ones far from the player get evicted
+max_fps = 144  # Frame rate cap, 0 for none (the simulation always runs at 60 ticks per second)
+menu_fps = 30  # Frame rate cap of the start and pause menus, they hardly change
@@ -0,0 +1,29 @@
+import os
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"  # No banner on stdout, the tools write JSON there
+import pygame
+
+
+def init_headless(screen_size=(800, 600)):
+    """
+    Start pygame without a display or sound device, using SDL's dummy drivers.
+    :param screen_size: Size of the off-screen surface the game draws on.
+    :return: The screen surface.
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.init()
+    return pygame.display.set_mode(screen_size)
+
+
+def run_frames(game, frames, script=None):
+    """
+    Run the game for a number of frames as fast as possible, without waiting for a frame rate.
+    :param game: Game using a ScriptedInput.
+    :param frames: Number of frames to run.
+    :param script: Optional callable (frame, input) that sets the input before each frame.
+    """
+    for frame in range(frames):
+        if script is not None:
+            script(frame, game.input)
+        game.update(game.input.pop_events())
+        game.draw_game()
@@ -0,0 +1,108 @@
+import numpy as np
+from world import CHUNK_SIZE, SOLID_LOOKUP, SOLID_TILES
+
+NO_SURFACE = np.iinfo(np.int32).max  # Stored for tile columns without any solid tile in range
+
+
+class Heightmap:
+    def __init__(self, world, top, bottom):
+        """
+        Row of the topmost solid tile of every tile column, kept up to date as tiles change.
+        Columns are indexed a chunk column at a time, on first lookup.
+        :param world: The world to index. The heightmap registers itself as one of its observers.
+        :param top: First tile row searched for the surface.
+        :param bottom: Tile row below the last one searched.
+        """
+        self.world = world
+        self.top = top
+        self.bottom = bottom
+        self.columns = {}  # cx -> array of the surface row of each tile column in the chunk column
+        world.observers.append(self)
+
+    def surface_y(self, tx):
+        """
+        Get the topmost solid tile row of a tile column.
+        :param tx: Tile x coordinate.
+        :return: Tile row, or None if the column has no solid tile in range.
+        """
+        cx, lx = divmod(tx, CHUNK_SIZE)
+        column = self.columns.get(cx)
+        if column is None:
+            column = self.build_column(cx)
+        surface = column[lx]
+        return None if surface == NO_SURFACE else int(surface)
+
+    def surface_rows(self, first_tx, last_tx):
+        """
+        Get the surface rows of a range of tile columns.
+        :param first_tx: First tile column.
+        :param last_tx: Tile column after the last one.
+        :return: Array of tile rows, NO_SURFACE where a column has no solid tile in range.
+        """
+        rows = []
+        for cx in range(first_tx // CHUNK_SIZE, (last_tx - 1) // CHUNK_SIZE + 1):
+            column = self.columns.get(cx)
+            if column is None:
+                column = self.build_column(cx)
+            rows.append(column)
+        first = first_tx - (first_tx // CHUNK_SIZE) * CHUNK_SIZE
+        return np.concatenate(rows)[first:first + last_tx - first_tx]
+
+    def build_column(self, cx):
+        """Index one chunk column by scanning its chunks from the top down."""
+        surface = np.full(CHUNK_SIZE, NO_SURFACE, dtype=np.int32)
+        for cy in range(self.top // CHUNK_SIZE, (self.bottom - 1) // CHUNK_SIZE + 1):
+            chunk = self.world.get_chunk(cx, cy)
+            if chunk is None:
+                continue  # All air
+            first_ly = max(0, self.top - cy * CHUNK_SIZE)
+            last_ly = min(CHUNK_SIZE, self.bottom - cy * CHUNK_SIZE)
+            solid = SOLID_LOOKUP[chunk.tiles[first_ly:last_ly]]
+            found = solid.any(axis=0) & (surface == NO_SURFACE)
+            surface[found] = cy * CHUNK_SIZE + first_ly + solid.argmax(axis=0)[found]
+            if surface.max() != NO_SURFACE:
+                break  # Every column has its surface, the chunks below can't change it
+        self.columns[cx] = surface
+        return surface
+
+    def find_surface(self, tx, start):
+        """Scan one tile column downwards from a row for the first solid tile."""
+        cx, lx = divmod(tx, CHUNK_SIZE)
+        cy, ly = divmod(start, CHUNK_SIZE)
+        while cy * CHUNK_SIZE < self.bottom:
+            chunk = self.world.get_chunk(cx, cy)
+            if chunk is not None:
+                last_ly = min(CHUNK_SIZE, self.bottom - cy * CHUNK_SIZE)
+                solid = SOLID_LOOKUP[chunk.tiles[ly:last_ly, lx]]
+                if solid.any():
+                    return cy * CHUNK_SIZE + ly + int(solid.argmax())
+            cy += 1
+            ly = 0
+        return NO_SURFACE
+
+    def tile_changed(self, tx, ty, tile_id):
+        cx, lx = divmod(tx, CHUNK_SIZE)
+        column = self.columns.get(cx)
+        if column is None or not self.top <= ty < self.bottom:
+            return  # Not indexed yet, or out of range
+        if SOLID_TILES[tile_id]:
+            column[lx] = min(column[lx], ty)
+        elif ty == column[lx]:
+            column[lx] = self.find_surface(tx, ty + 1)  # The surface tile was removed
+
+    def region_changed(self, first_tx, first_ty, last_tx, last_ty):
+        if last_ty <= self.top or first_ty >= self.bottom:
+            return  # Out of range
+        for cx in range(first_tx // CHUNK_SIZE, (last_tx - 1) // CHUNK_SIZE + 1):
+            if cx in self.columns:
+                self.build_column(cx)
+
+    def chunk_replaced(self, cx, cy):
+        self.columns.pop(cx, None)
+
+    def world_cleared(self):
+        self.columns = {}
+
+    def chunks_unloaded(self, keys):
+        for cx, cy in keys:
+            self.columns.pop(cx, None)  # Built again from the store when next needed
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+import pygame
+from global_settings import *
+
+
+class TextCache:
+    def __init__(self, font_path=default_font, max_surfaces=256):
+        """
+        Keeps loaded fonts and rendered strings, so drawing the same text again costs a dict lookup.
+        :param font_path: TTF file of every font.
+        :param max_surfaces: How many rendered strings to keep, least recently used ones are dropped first.
+        """
+        self.font_path = font_path
+        self.max_surfaces = max_surfaces
+        self.fonts = {}  # size -> pygame.font.Font
+        self.surfaces = OrderedDict()  # (text, size, color) -> rendered surface
+
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(self.font_path, size)
+        return font
+
+    def render(self, text, size, color):
+        """Get a string rendered with antialiasing, rendering it only the first time."""
+        key = (text, size, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = self.font(size).render(text, True, color)
+            if len(self.surfaces) > self.max_surfaces:
+                self.surfaces.popitem(last=False)
+        self.surfaces.move_to_end(key)
+        return surface
+
+
+text_cache = TextCache()  # Shared by the HUD, the start screen and the menus
+
+
+class HUD:
+    def __init__(self):
+        """
+        Overlay elements that keep their rendered surface until the value they show changes.
+        The world under them is redrawn every frame, so the cached surfaces are blitted every frame,
+        but only the elements whose values changed are rendered again.
+        """
+        self.elements = OrderedDict()  # name -> (value, position, surface), drawn in insertion order
+        self.drawn = {}  # name -> screen rect the element was last drawn at
+        self.changed = set()  # Elements rendered or moved since they were last drawn
+
+    def set(self, name, value, position, render):
+        """
+        Show a value.
+        :param name: Element name.
+        :param value: The value shown, compared with the previous one to decide whether to render again.
+        :param position: Top-left corner on the screen.
+        :param render: Function of the value that returns the element's surface.
+        """
+        element = self.elements.get(name)
+        if element is None or element[0] != value:
+            self.elements[name] = (value, position, render(value))
+            self.changed.add(name)
+        elif element[1] != position:
+            self.elements[name] = (value, position, element[2])
+            self.changed.add(name)
+
+    def remove(self, name):
+        if self.elements.pop(name, None) is not None:
+            self.changed.add(name)
+
+    def draw(self, surface):
+        """Draw every element, over a frame that was drawn from scratch."""
+        surface.blits([(image, position) for value, position, image in self.elements.values()], doreturn=False)
+        self.drawn = {name: image.get_rect(topleft=position) for name, (value, position, image) in self.elements.items()}
+        self.changed.clear()
+
+    def draw_changed(self, surface, background):
+        """
+        Draw only the elements that changed, over a static screen that is still on the surface.
+        :param surface: Surface the screen and the elements were drawn on.
+        :param background: The static screen, to paint over where changed elements used to be.
+        :return: Rects of the surface that changed, for pygame.display.update.
+        """
+        rects = []
+        for name in self.changed:
+            old_rect = self.drawn.pop(name, None)
+            if old_rect is not None:
+                surface.blit(background, old_rect, old_rect)
+                rects.append(old_rect)
+            element = self.elements.get(name)
+            if element is not None:
+                value, position, image = element
+                self.drawn[name] = surface.blit(image, position)
+                rects.append(self.drawn[name])
+        self.changed.clear()
+        return rects
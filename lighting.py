@@ -0,0 +1,151 @@
+from collections import OrderedDict
+import numpy as np
+from world import CHUNK_SIZE, TILE_TYPES, SOLID_TILES
+from heightmap import NO_SURFACE
+
+MAX_LIGHT = 15  # Light level of open sky, light never reaches further than this many tiles
+
+# Light lost when it enters a tile of each type, solid tiles stop it quickly
+LIGHT_ABSORPTION = np.array([3 if SOLID_TILES[tile_id] else 1 for tile_id in range(len(TILE_TYPES))], dtype=np.int16)
+
+# Block light given off by each tile type, none of the current tiles glow
+LIGHT_EMISSION = np.zeros(len(TILE_TYPES), dtype=np.int16)
+
+
+def spread_light(seeds, absorption):
+    """
+    Flood fill light from its sources over a grid of tiles.
+    Every pass lets light move one tile further, each tile keeping the brightest light that reaches it.
+    All costs are at least 1, so after MAX_LIGHT passes the light has gone as far as it can.
+    :param seeds: Light level of the sources, 0 elsewhere.
+    :param absorption: Light lost entering each tile.
+    :return: Light level of every tile.
+    """
+    light = seeds.copy()
+    for _ in range(MAX_LIGHT):
+        neighbours = np.zeros_like(light)
+        np.maximum(neighbours[1:], light[:-1], out=neighbours[1:])
+        np.maximum(neighbours[:-1], light[1:], out=neighbours[:-1])
+        np.maximum(neighbours[:, 1:], light[:, :-1], out=neighbours[:, 1:])
+        np.maximum(neighbours[:, :-1], light[:, 1:], out=neighbours[:, :-1])
+        spread = np.maximum(light, neighbours - absorption)
+        if np.array_equal(spread, light):
+            break
+        light = spread
+    return light
+
+
+class LightMap:
+    def __init__(self, world, heightmap, max_chunks=4096):
+        """
+        Sky and block light of every tile, computed a chunk at a time on first use and updated around edits.
+        Tiles down to the surface get full sky light, which then spreads into caves along with block light.
+        :param world: The world to light. The light map registers itself as one of its observers,
+                      it must come after the heightmap so the surface is up to date when it relights.
+        :param heightmap: Heightmap of the world, for where the open sky ends.
+        :param max_chunks: How many chunks of light to keep, least recently used ones are dropped first.
+        """
+        self.world = world
+        self.heightmap = heightmap
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()  # (cx, cy) -> [sky light, block light, version]
+        self.daylight = MAX_LIGHT  # How bright the sky is, lower at night
+        self.changes = 0  # Light computations so far, chunk versions come from it so they never repeat
+        world.observers.append(self)
+
+    def compute(self, first_tx, first_ty, last_tx, last_ty):
+        """
+        Compute the light of a rect of tiles.
+        Light can't travel further than MAX_LIGHT, so only the tiles that close to the rect are looked at.
+        :return: (sky light, block light) arrays indexed [ty - first_ty, tx - first_tx].
+        """
+        pad = MAX_LIGHT
+        txs = np.arange(first_tx - pad, last_tx + pad)
+        tys = np.arange(first_ty - pad, last_ty + pad)
+        tiles = self.world.get_tiles(*np.meshgrid(txs, tys))
+        absorption = LIGHT_ABSORPTION[tiles]
+        surface = self.heightmap.surface_rows(txs[0], txs[-1] + 1)
+        open_sky = (tys[:, None] <= surface[None, :]) & (tys[:, None] < self.heightmap.bottom)  # Nothing under the world
+        sky_seeds = np.where(open_sky, MAX_LIGHT, 0).astype(np.int16)
+        sky = spread_light(sky_seeds, absorption)
+        block_seeds = LIGHT_EMISSION[tiles]
+        block = spread_light(block_seeds, absorption) if block_seeds.any() else block_seeds
+        inner = (slice(pad, pad + last_ty - first_ty), slice(pad, pad + last_tx - first_tx))
+        return sky[inner].astype(np.uint8), block[inner].astype(np.uint8)
+
+    def get_chunk(self, cx, cy):
+        """Get [sky light, block light, version] of a chunk, computing it the first time."""
+        key = (cx, cy)
+        light = self.chunks.get(key)
+        if light is None:
+            sky, block = self.compute(cx * CHUNK_SIZE, cy * CHUNK_SIZE, (cx + 1) * CHUNK_SIZE, (cy + 1) * CHUNK_SIZE)
+            self.changes += 1
+            light = self.chunks[key] = [sky, block, self.changes]
+            if len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+        self.chunks.move_to_end(key)
+        return light
+
+    def version(self, cx, cy):
+        """Get a value that changes whenever the light levels of a chunk do."""
+        return self.get_chunk(cx, cy)[2], self.daylight
+
+    def levels(self, cx, cy):
+        """
+        Get the light level of every tile in a chunk, the brighter of the sky light (dimmed at night) and block light.
+        :return: Light levels indexed [local_y, local_x].
+        """
+        sky, block, version = self.get_chunk(cx, cy)
+        dimmed_sky = np.maximum(sky.astype(np.int16) - (MAX_LIGHT - self.daylight), 0)
+        return np.maximum(dimmed_sky, block).astype(np.uint8)
+
+    def relight(self, first_tx, first_ty, last_tx, last_ty):
+        """Recompute the light of a rect of tiles in the chunks that have it."""
+        first_cx, first_cy = first_tx // CHUNK_SIZE, first_ty // CHUNK_SIZE
+        last_cx, last_cy = (last_tx - 1) // CHUNK_SIZE, (last_ty - 1) // CHUNK_SIZE
+        if not any((cx, cy) in self.chunks for cx in range(first_cx, last_cx + 1)
+                   for cy in range(first_cy, last_cy + 1)):
+            return  # Not computed yet, it will be when first needed
+        sky, block = self.compute(first_tx, first_ty, last_tx, last_ty)
+        for cx, cy, chunk_area, rect_area in self.world.region_chunks(first_tx, first_ty, last_tx, last_ty):
+            light = self.chunks.get((cx, cy))
+            if light is None:
+                continue
+            light[0][chunk_area] = sky[rect_area]
+            light[1][chunk_area] = block[rect_area]
+            self.changes += 1
+            light[2] = self.changes
+
+    def tile_changed(self, tx, ty, tile_id):
+        # Light within MAX_LIGHT of the tile can change. If the tile is or was the top of its column, the open
+        # sky moved too: placing it covers the column down to the old surface, removing it opens the column
+        # down to the new one.
+        last_ty = ty + 1
+        surface = self.heightmap.surface_y(tx)
+        if SOLID_TILES[tile_id] and surface == ty:
+            below = self.heightmap.find_surface(tx, ty + 1)
+            last_ty = self.heightmap.bottom if below == NO_SURFACE else below + 1
+        elif not SOLID_TILES[tile_id] and (surface is None or surface > ty):
+            last_ty = self.heightmap.bottom if surface is None else surface + 1
+        self.relight(tx - MAX_LIGHT, ty - MAX_LIGHT, tx + MAX_LIGHT + 1, last_ty + MAX_LIGHT)
+
+    def region_changed(self, first_tx, first_ty, last_tx, last_ty):
+        # Like tile_changed, but the rect can be far bigger than what is on screen, so the light of the chunks it
+        # reaches is dropped and computed again when next needed. The surface can move anywhere down to the bottom.
+        last_ty = max(last_ty, self.heightmap.bottom) + MAX_LIGHT
+        first_cx, last_cx = (first_tx - MAX_LIGHT) // CHUNK_SIZE, (last_tx + MAX_LIGHT - 1) // CHUNK_SIZE
+        first_cy, last_cy = (first_ty - MAX_LIGHT) // CHUNK_SIZE, (last_ty - 1) // CHUNK_SIZE
+        for key in [key for key in self.chunks if first_cx <= key[0] <= last_cx and first_cy <= key[1] <= last_cy]:
+            del self.chunks[key]
+
+    def chunk_replaced(self, cx, cy):
+        # The surface of the whole chunk column may have moved, and light reaches into the columns next to it
+        for key in [key for key in self.chunks if cx - 1 <= key[0] <= cx + 1]:
+            del self.chunks[key]
+
+    def world_cleared(self):
+        self.chunks = OrderedDict()
+
+    def chunks_unloaded(self, keys):
+        for key in keys:
+            self.chunks.pop(key, None)
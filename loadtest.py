@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"  # Its banner would go to stdout, in front of the JSON
+from benchmark import summarize
+from server import create_server, TILE_SIZE
+from protocol import (HEADER, PROTOCOL_VERSION, HELLO, INPUT, EDIT, WELCOME, CHUNK, ENTITY_ADD, ENTITY_MOVE,
+                      HELLO_MESSAGE, WELCOME_MESSAGE, INPUT_MESSAGE, EDIT_MESSAGE, KEY_LEFT, KEY_RIGHT, KEY_JUMP,
+                      PLAYER, ENTITY_ADD_RECORD, ENTITY_MOVE_RECORD, encode, read_message, decode_records)
+
+
+class SimulatedClient:
+    def __init__(self, seed):
+        """
+        A bot that plays like a person would over the network: walks, jumps and edits tiles near itself,
+        counting the bytes each way. It doesn't decode chunks, only its own position.
+        :param seed: Seed of the bot's decisions.
+        """
+        self.rng = random.Random(seed)
+        self.player_id = None
+        self.x = self.y = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.join_bytes = None  # Bytes received in the first second, mostly the chunks of the view
+        self.chunks = 0
+
+    async def run(self, host, port, seconds):
+        reader, writer = await asyncio.open_connection(host, port)
+        start = time.perf_counter()
+        self.send(writer, encode(HELLO, HELLO_MESSAGE.pack(PROTOCOL_VERSION)))
+        message_type, payload = await read_message(reader)
+        if message_type != WELCOME:
+            raise RuntimeError(f"Expected a WELCOME, got message type {message_type}")
+        self.bytes_received += HEADER.size + len(payload)
+        self.player_id, tick_rate = WELCOME_MESSAGE.unpack(payload)
+        receiving = asyncio.create_task(self.receive(reader))
+        try:
+            while time.perf_counter() - start < seconds:
+                if self.join_bytes is None and time.perf_counter() - start >= 1:
+                    self.join_bytes = self.bytes_received
+                keys = self.rng.choice([KEY_LEFT, KEY_RIGHT, 0]) | (KEY_JUMP if self.rng.random() < 0.3 else 0)
+                self.send(writer, encode(INPUT, INPUT_MESSAGE.pack(keys)))
+                if self.rng.random() < 0.5:
+                    tile_x = int(self.x) // TILE_SIZE + self.rng.randint(-5, 5)
+                    tile_y = int(self.y) // TILE_SIZE + self.rng.randint(-5, 5)
+                    self.send(writer, encode(EDIT, EDIT_MESSAGE.pack(tile_x, tile_y, self.rng.randint(0, 3))))
+                await asyncio.sleep(self.rng.uniform(0.2, 1.0))  # How long a person holds keys
+        finally:
+            writer.close()
+            receiving.cancel()
+
+    def send(self, writer, data):
+        writer.write(data)
+        self.bytes_sent += len(data)
+
+    async def receive(self, reader):
+        try:
+            while True:
+                message_type, payload = await read_message(reader)
+                self.bytes_received += HEADER.size + len(payload)
+                if message_type == CHUNK:
+                    self.chunks += 1
+                elif message_type == ENTITY_ADD:
+                    for kind, type_id, entity_id, x, y in decode_records(payload, ENTITY_ADD_RECORD).tolist():
+                        if kind == PLAYER and entity_id == self.player_id:
+                            self.x, self.y = x, y
+                elif message_type == ENTITY_MOVE:
+                    for kind, entity_id, dx, dy in decode_records(payload, ENTITY_MOVE_RECORD).tolist():
+                        if kind == PLAYER and entity_id == self.player_id:
+                            self.x += dx
+                            self.y += dy
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+
+async def run_case(clients, seconds, seed):
+    """Run a server on loopback with a number of bots connected and measure it."""
+    server, seed = create_server(seed)
+    listener = await server.start("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    ticking = asyncio.create_task(server.run())
+    start = time.perf_counter()
+    bots = [SimulatedClient(seed * 100003 + i) for i in range(clients)]
+    await asyncio.gather(*(bot.run("127.0.0.1", port, seconds) for bot in bots))
+    server.stop()
+    await ticking
+    elapsed = time.perf_counter() - start  # A bit longer than asked, bots finish their last wait
+    listener.close()
+    await listener.wait_closed()
+
+    tick_times = list(server.tick_times)
+    steady_seconds = max(seconds - 1, 1e-9)
+    return {
+        "clients": clients,
+        "seconds": seconds,
+        "ticks": len(tick_times),
+        "ticks_per_second": len(tick_times) / elapsed,
+        "overrun_ticks": sum(tick_time > server.tick_time for tick_time in tick_times),
+        "tick": summarize(tick_times),
+        "mobs": server.mobs.count,
+        "chunks_per_player": sum(bot.chunks for bot in bots) / clients,
+        "join_bytes_per_player": sum(bot.join_bytes or bot.bytes_received for bot in bots) / clients,
+        "down_bytes_per_second_per_player": sum(bot.bytes_received - (bot.join_bytes or 0) for bot in bots)
+                                            / clients / steady_seconds,
+        "up_bytes_per_second_per_player": sum(bot.bytes_sent for bot in bots) / clients / seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the multiplayer server with simulated clients over loopback.")
+    parser.add_argument("--clients", default="1,10,50,100", help="Comma separated client counts")
+    parser.add_argument("--seconds", type=float, default=10, help="How long each case runs")
+    parser.add_argument("--seed", type=int, default=1, help="World seed")
+    parser.add_argument("--out", default=None, help="JSON file to write, stdout if omitted")
+    args = parser.parse_args()
+
+    results = []
+    for clients in [int(value) for value in args.clients.split(",")]:
+        results.append(asyncio.run(run_case(clients, args.seconds, args.seed)))
+        print(f"clients={clients}: {results[-1]['tick']['mean_ms']:.2f} ms/tick, "
+              f"{results[-1]['down_bytes_per_second_per_player'] / 1024:.1f} KiB/s down per player", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seconds": args.seconds
+        },
+        "results": results
+    }
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
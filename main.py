@@ -1,42 +1,76 @@
+import argparse
 import pygame
 import sys
 from game import Game
 from startscreen import StartScreen
 from global_settings import *
+from assets import asset_manager
+from hud import HUD, text_cache
+from replay import InputRecorder, prepare_session
 import time
 
-# Initialize Pygame
-pygame.init()
-
 # Set screen size
 screen_width = 800
 screen_height = 600
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Terraria")
 
 # Define colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 
+def start_game(game, server, record):
+    """Load the local world, join a server if one was given as host:port, or start a session to record."""
+    if record is not None:
+        if game.recorder is None:  # Going back to the start screen doesn't start over
+            prepare_session(game)
+            game.recorder = InputRecorder(game.rng_seed)
+            print(f"Recording to {record}, the world won't be saved")
+    elif server is None:
+        game.load_game()
+        print("Game loaded!")
+    else:
+        host, port = server.rsplit(":", 1)
+        game.connect(host, int(port))
+        print(f"Connected to {server}!")
+    game.timestep.reset()
+
+
 # Main loop
 def main():
+    parser = argparse.ArgumentParser(description="Play OpenTerraria.")
+    parser.add_argument("--connect", metavar="HOST:PORT", default=None, help="Join a server instead of playing locally")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="Record the session on a fresh world, for replay.py to play back")
+    args = parser.parse_args()
+
+    # Initialize Pygame here rather than on import, so world generation worker processes don't open a window
+    pygame.init()
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Terraria")
+
+    # Load the startup image and show it right away, before the rest is loaded
+    startup_image = asset_manager.image("images/gui/startup.png", (screen_width, screen_height)).copy()  # Faded in place
+    screen.blit(startup_image, (0, 0))
+    pygame.display.flip()
+    startup_alpha = 255  # Start with full opacity
+    fade_speed = 150  # Opacity lost per second
+
     game = Game(screen)
     startscreen = StartScreen(screen)
     show_startscreen = True  # Start with the guide
     pygame.mixer.music.load('sounds/music/title_screen.ogg')
     pygame.mixer.music.play(-1)
-    font = pygame.font.Font(default_font, 36)
+    font = text_cache.font(36)
+    overlay = HUD()  # FPS readout, drawn over every screen
+    fps_interval = 500  # Milliseconds between FPS readout updates, so it can be read and isn't rendered every frame
+    last_fps_update = -fps_interval
 
     # Load the start game button image
-    start_game_button_image = pygame.image.load("images/gui/startgame_button.png")
-    start_game_button_image = pygame.transform.scale(start_game_button_image, (50, 50))
+    start_game_button_image = asset_manager.image("images/gui/startgame_button.png", (50, 50))
     start_game_button_rect = start_game_button_image.get_rect(center=(screen_width // 2, screen_height // 2 + 170))
 
-    # Load the startup image
-    startup_image = pygame.image.load("images/gui/startup.png")
-    startup_image = pygame.transform.scale(startup_image, (screen_width, screen_height))
-    startup_alpha = 255  # Start with full opacity
-    fade_speed = 5  # Speed of the fade effect
+    # The start screen with its button, composited once
+    start_background = startscreen.background.copy()
+    start_background.blit(start_game_button_image, start_game_button_rect)
 
     clock = pygame.time.Clock()  # Create a clock object to control the frame rate
 
@@ -48,21 +82,34 @@ def main():
     save_button_text = font.render("Save and quit game", True, BLACK)
     save_button_rect = save_button_text.get_rect(center=(screen_width // 2, screen_height // 2 + 50))
 
+    # The pause menu, composited once
+    pause_background = pygame.Surface((screen_width, screen_height)).convert()
+    pause_background.fill(WHITE)
+    pause_background.blit(pause_text, pause_text_rect)
+    pause_background.blit(save_button_text, save_button_rect)
+
+    # Static screens are drawn in full once, then only the parts that change are sent to the display
+    shown_screen = None  # Static screen that is on the display, None while the frames are drawn from scratch
+
     # Start with the startup screen
     show_startup = True
 
     while True:
+        static_screen = None  # Static screen shown this frame
         # Handle events for the start screen or the game
         events = pygame.event.get()  # Get all events at once
         for event in events:
             if event.type == pygame.QUIT:
+                game.finish_saving()  # Don't cut off a save that is still being written
+                if game.recorder is not None:
+                    game.recorder.save(args.record, game)
                 pygame.quit()
                 sys.exit()
 
         if show_startup:
             # Fade out the startup image
             if startup_alpha > 0:
-                startup_alpha -= 2.5
+                startup_alpha -= fade_speed * clock.get_time() / 1000
                 if startup_alpha < 0:
                     startup_alpha = 0
                 startup_image.set_alpha(startup_alpha)
@@ -73,42 +120,36 @@ def main():
             for event in events:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_RETURN:  # Press Enter to start the game
-                        game.load_game()
-                        print("Game loaded!")
+                        start_game(game, args.connect, args.record)
                         show_startscreen = False
                         pygame.mixer.music.load('sounds/music/overworld_day.ogg')
                         pygame.mixer.music.play(-1)
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     # Check if the start game button is clicked
                     if start_game_button_rect.collidepoint(event.pos):
-                        game.load_game()
-                        print("Game loaded!")
+                        start_game(game, args.connect, args.record)
                         show_startscreen = False
                         pygame.mixer.music.load('sounds/music/overworld_day.ogg')
                         pygame.mixer.music.play(-1)
 
-            # Display the start screen
-            startscreen.display()
-
-            # Draw the start game button
-            screen.blit(start_game_button_image, start_game_button_rect)
+            # Display the start screen with the start game button
+            static_screen = start_background
         elif paused:
             for event in events:
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:  # Pressed ESC Paused
                         paused = False
+                        game.timestep.reset()  # Don't catch up on the time spent paused
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if save_button_rect.collidepoint(event.pos):
-                        game.save_game()
+                        game.save_game(background=True)  # Written by the autosaver, the menu doesn't wait for it
                         print("Game saved!")
                         show_startscreen = True
                         paused = False
                         pygame.mixer.music.load('sounds/music/title_screen.ogg')
                         pygame.mixer.music.play(-1)
 
-            screen.fill(WHITE)
-            screen.blit(pause_text, pause_text_rect)
-            screen.blit(save_button_text, save_button_rect)
+            static_screen = pause_background
         else:
             for event in events:
                 if event.type == pygame.KEYDOWN:
@@ -118,14 +159,24 @@ def main():
             game.run(events)  # Pass events to the game
 
         # Display FPS on the screen
-        fps = clock.get_fps()
-        fps_text = f"FPS: {fps:.2f}"
-        font = pygame.font.Font(default_font, 20)
-        fps_surface = font.render(fps_text, True, BLACK)
-        screen.blit(fps_surface, (10, 45))
-
-        pygame.display.flip()
-        clock.tick(60)  # Limit the frame rate to 60 FPS
+        if pygame.time.get_ticks() - last_fps_update >= fps_interval:
+            last_fps_update = pygame.time.get_ticks()
+            fps_text = f"FPS: {clock.get_fps():.2f}"
+            overlay.set("fps", fps_text, (10, 45), lambda text: text_cache.font(20).render(text, True, BLACK))  # Not worth caching
+
+        if static_screen is None:
+            overlay.draw(screen)
+            pygame.display.flip()
+        elif static_screen is not shown_screen:
+            screen.blit(static_screen, (0, 0))
+            overlay.draw(screen)
+            pygame.display.flip()
+        else:
+            pygame.display.update(overlay.draw_changed(screen, static_screen))  # Usually nothing at all
+        shown_screen = static_screen
+
+        # The only frame wait, the game simulates at its own fixed rate
+        clock.tick(max_fps if static_screen is None else menu_fps)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import tracemalloc
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"  # Its banner would go to stdout, in front of the JSON
+from block import Block
+from tiles import TILE_REGISTRY
+from world import World, CHUNK_SIZE, TILE_IDS
+
+
+def measure(build):
+    """
+    Bytes allocated by build() and still alive when it returns.
+    :param build: Function making the structure to measure, which it returns to keep it alive.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def block_list(tiles):
+    """The tiles as Blocks in a list, the way the start screen keeps them."""
+    width = math.isqrt(tiles)
+    names = ["grass", "dirt", "stone"]
+    return [Block(i % width * Block.size, i // width * Block.size, names[i % 3]) for i in range(tiles)]
+
+
+def chunk_storage(tiles):
+    """The tiles in a World, as the game keeps them."""
+    width = math.isqrt(tiles)
+    world = World(Block.size)
+    world.fill_rect(0, 0, width - 1, tiles // width - 1, TILE_IDS["stone"])
+    return world
+
+
+def run_case(tiles):
+    block_bytes = measure(lambda: block_list(tiles))
+    world_bytes = measure(lambda: chunk_storage(tiles))
+    return {
+        "tiles": tiles,
+        "block_bytes_per_tile": block_bytes / tiles,
+        "world_bytes_per_tile": world_bytes / tiles
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory each tile takes as a Block and in a World.")
+    parser.add_argument("--tiles", default="100000,1000000", help="Comma separated tile counts")
+    parser.add_argument("--out", default=None, help="JSON file to write, stdout if omitted")
+    args = parser.parse_args()
+
+    results = []
+    for tiles in [int(value) for value in args.tiles.split(",")]:
+        results.append(run_case(tiles))
+        print(f"tiles={tiles}: {results[-1]['block_bytes_per_tile']:.1f} B/Block, "
+              f"{results[-1]['world_bytes_per_tile']:.2f} B/world tile", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "chunk_size": CHUNK_SIZE,
+            "tile_types": len(TILE_REGISTRY)
+        },
+        "results": results
+    }
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import argparse
+import os
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pygame
+import worldgen
+from world import World, CHUNK_SIZE
+from tiles import TILE_REGISTRY
+from assets import asset_manager
+
+SKY_COLOR = (123, 104, 238)  # Same as the game's
+MAP_BACKGROUND = (0, 0, 0, 110)  # Behind the HUD map, so air still reads as the map's area
+MAP_BORDER = (255, 255, 255, 160)
+
+
+def tile_colors():
+    """
+    Get the map colour of every tile type, the average colour of its texture.
+    :return: Float RGBA array indexed by tile ID, air is fully transparent.
+    """
+    colors = np.zeros((len(TILE_REGISTRY), 4), dtype=np.float32)
+    for tile_type in TILE_REGISTRY:
+        if tile_type.texture is None:
+            continue
+        image = asset_manager.image(tile_type.texture)
+        rgb = pygame.surfarray.array3d(image).reshape(-1, 3).astype(np.float32)
+        alpha = pygame.surfarray.array_alpha(image).reshape(-1, 1).astype(np.float32)
+        colors[tile_type.tile_id, :3] = (rgb * alpha).sum(axis=0) / max(float(alpha.sum()), 1.0)
+        colors[tile_type.tile_id, 3] = alpha.mean()
+    return colors
+
+
+def downsample(tiles, colors, tiles_per_pixel):
+    """
+    Shrink a tile array to a map image, each pixel the average colour of the tiles it covers.
+    Colours are weighted by alpha, so a pixel of half air and half dirt is dirt coloured and half transparent.
+    :param tiles: Tile IDs indexed [y, x], both sides multiples of tiles_per_pixel.
+    :param colors: Colours from tile_colors.
+    :param tiles_per_pixel: Tiles per map pixel side.
+    :return: RGBA array indexed [y, x].
+    """
+    height, width = tiles.shape[0] // tiles_per_pixel, tiles.shape[1] // tiles_per_pixel
+    rgba = colors[tiles].reshape(height, tiles_per_pixel, width, tiles_per_pixel, 4)
+    alpha = rgba[..., 3:].mean(axis=(1, 3))
+    rgb = (rgba[..., :3] * rgba[..., 3:]).mean(axis=(1, 3)) / np.maximum(alpha, 1.0)
+    return np.concatenate([rgb, alpha], axis=2).round().astype(np.uint8)
+
+
+class Minimap:
+    def __init__(self, world, tiles_per_pixel=2, max_chunks=4096):
+        """
+        Map of the world, kept as one small image per chunk. A chunk's image is only made again when its tiles
+        change, so the map in the HUD costs a few dict lookups a frame and is only redrawn when it scrolls or a
+        chunk in it changes.
+        :param world: The world to map.
+        :param tiles_per_pixel: Tiles per map pixel side, a divisor of CHUNK_SIZE.
+        :param max_chunks: How many chunk images to keep, least recently used ones are dropped first.
+        """
+        self.world = world
+        self.tiles_per_pixel = tiles_per_pixel
+        self.chunk_size = CHUNK_SIZE // tiles_per_pixel  # Map pixels per chunk side
+        self.max_chunks = max_chunks
+        self.colors = None  # Tile colours, the textures are loaded on first use
+        self.cache = OrderedDict()  # (cx, cy) -> [chunk, version, pixels, surface or None until drawn in the HUD]
+        self.updates = 0  # Chunk images made so far
+
+    def chunk_image(self, chunk):
+        """Get [chunk, version, pixels, surface] of a chunk, making the pixels again if its tiles changed."""
+        key = (chunk.cx, chunk.cy)
+        cached = self.cache.get(key)
+        if cached is None or cached[0] is not chunk or cached[1] != chunk.version:
+            if self.colors is None:
+                self.colors = tile_colors()
+            cached = self.cache[key] = [chunk, chunk.version, downsample(chunk.tiles, self.colors, self.tiles_per_pixel),
+                                        None]
+            self.updates += 1
+            if len(self.cache) > self.max_chunks:
+                self.cache.popitem(last=False)
+        self.cache.move_to_end(key)
+        return cached
+
+    def chunk_surface(self, chunk):
+        cached = self.chunk_image(chunk)
+        if cached[3] is None:
+            image = pygame.image.frombuffer(cached[2].tobytes(), (self.chunk_size, self.chunk_size), "RGBA")
+            cached[3] = asset_manager.convert(image)
+        return cached[3]
+
+    def render(self, first_cx, first_cy, last_cx, last_cy):
+        """
+        Get the map of a rect of chunks (last coordinates exclusive), loading the chunks that aren't in memory.
+        :return: RGBA array indexed [y, x].
+        """
+        size = self.chunk_size
+        pixels = np.zeros(((last_cy - first_cy) * size, (last_cx - first_cx) * size, 4), dtype=np.uint8)
+        for cy in range(first_cy, last_cy):
+            for cx in range(first_cx, last_cx):
+                chunk = self.world.get_chunk(cx, cy)
+                if chunk is not None:
+                    y, x = (cy - first_cy) * size, (cx - first_cx) * size
+                    pixels[y:y + size, x:x + size] = self.chunk_image(chunk)[2]
+        return pixels
+
+    def view(self, center_tx, center_ty, width, height):
+        """
+        Describe the HUD map around a tile: where it starts and the chunks in it, as they are now.
+        It only changes when the map scrolls by a pixel or a chunk in it changes, see HUD.set.
+        Only chunks in memory are shown, the map never loads any.
+        :return: (left, top, width, height, ((chunk, version) or None for every chunk in view)), left and top in
+                 map pixels.
+        """
+        left = center_tx // self.tiles_per_pixel - width // 2
+        top = center_ty // self.tiles_per_pixel - height // 2
+        chunks = []
+        for cy in range(top // self.chunk_size, (top + height - 1) // self.chunk_size + 1):
+            for cx in range(left // self.chunk_size, (left + width - 1) // self.chunk_size + 1):
+                chunk = self.world.chunks.get((cx, cy))
+                chunks.append(None if chunk is None else (chunk, chunk.version))
+        return left, top, width, height, tuple(chunks)
+
+    def render_view(self, view):
+        """Draw the HUD map described by view."""
+        left, top, width, height, chunks = view
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface.fill(MAP_BACKGROUND)
+        size = self.chunk_size
+        blits = []
+        for entry in chunks:
+            if entry is not None:
+                chunk = entry[0]
+                blits.append((self.chunk_surface(chunk), (chunk.cx * size - left, chunk.cy * size - top)))
+        surface.blits(blits, doreturn=False)
+        pygame.draw.rect(surface, MAP_BORDER, surface.get_rect(), 1)
+        return asset_manager.convert(surface)
+
+
+def load_world(path):
+    """
+    Open a saved world the way Game.load_game does, without a game: chunks are read from the region files,
+    or generated from the seed if the world is endless, and the journal's edits are applied on top.
+    Nothing is written to the world directory.
+    :return: (world, level data)
+    """
+    from region import RegionStore, read_level
+    from autosave import EditJournal, JOURNAL_FILE
+
+    level_data = read_level(path)
+    if level_data is None:
+        raise ValueError(f"{path} is not a saved world")
+    block_size = 15
+    ground_level = (600 - block_size) // block_size  # Same as a game on an 800x600 screen
+    world = World(block_size)
+    generator = None
+    if level_data.get("endless", True):
+        generator = worldgen.ChunkGenerator(level_data["seed"], 24.0, ground_level)
+    world.clear(RegionStore(path), generator)
+    journal_path = os.path.join(path, JOURNAL_FILE)
+    if os.path.exists(journal_path):
+        journal = EditJournal(journal_path, level_data.get("journal_seq", 0))
+        journal.replay(world, level_data.get("journal_seq", 0))
+        journal.close()
+    return world, level_data
+
+
+def world_bounds(world, level_data, margin):
+    """
+    Get the rect of chunks an overview shows: every stored or edited chunk and the player, plus `margin` chunk
+    columns each side. Endless worlds also get every chunk row terrain can be generated in.
+    :return: (first_cx, first_cy, last_cx, last_cy), last coordinates exclusive.
+    """
+    keys = set(world.store.chunk_coords()) | set(world.chunks)
+    chunk_pixels = CHUNK_SIZE * world.tile_size
+    for x, y in (level_data["spawn_point"], (level_data["player_x"], level_data["player_y"])):
+        keys.add((int(x) // chunk_pixels, int(y) // chunk_pixels))
+    cxs = [cx for cx, cy in keys]
+    cys = [cy for cx, cy in keys]
+    if world.generator is not None:
+        ground_level = world.generator.ground_level
+        cys += [(ground_level - worldgen.MAX_TERRAIN_HEIGHT) // CHUNK_SIZE, (ground_level - 1) // CHUNK_SIZE]
+    return min(cxs) - margin, min(cys), max(cxs) + margin + 1, max(cys) + 1
+
+
+def export_overview(path, out_path, tiles_per_pixel=2, margin=2):
+    """
+    Write a PNG of a whole saved world, see load_world and world_bounds.
+    :param path: World directory.
+    :param out_path: PNG file to write.
+    :param tiles_per_pixel: Tiles per map pixel side.
+    :param margin: Chunk columns to show beyond the edited ones, endless worlds are generated there.
+    :return: Summary of the export.
+    """
+    start = time.perf_counter()
+    world, level_data = load_world(path)
+    bounds = world_bounds(world, level_data, margin)
+    minimap = Minimap(world, tiles_per_pixel, max_chunks=1)  # Every chunk is drawn once
+    pixels = minimap.render(*bounds).astype(np.float32)
+    alpha = pixels[..., 3:] / 255
+    rgb = pixels[..., :3] * alpha + np.array(SKY_COLOR, dtype=np.float32) * (1 - alpha)
+    height, width = rgb.shape[:2]
+    image = pygame.image.frombuffer(rgb.round().astype(np.uint8).tobytes(), (width, height), "RGB")
+    pygame.image.save(image, out_path)
+    world.store.close()
+    return {"world": path, "out": out_path, "width": width, "height": height, "chunks": minimap.updates,
+            "seconds": time.perf_counter() - start}
+
+
+def try_export(path, out_path, tiles_per_pixel, margin):
+    """Pool task: export one world, reporting a broken one instead of stopping the others."""
+    try:
+        return export_overview(path, out_path, tiles_per_pixel, margin)
+    except (OSError, ValueError, KeyError, zlib.error) as error:
+        return {"world": path, "error": str(error)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export overview images of saved worlds without starting the game.")
+    parser.add_argument("worlds", nargs="+", help="World directories")
+    parser.add_argument("--out-dir", default=".", help="Directory to write <world name>.png to")
+    parser.add_argument("--tiles-per-pixel", type=int, default=2, help="Tiles per image pixel side, a divisor of 32")
+    parser.add_argument("--margin", type=int, default=2, help="Chunk columns to show beyond the edited ones")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    if CHUNK_SIZE % args.tiles_per_pixel:
+        parser.error(f"--tiles-per-pixel must divide {CHUNK_SIZE}")
+
+    worlds = [os.path.abspath(path) for path in args.worlds]
+    out_dir = os.path.abspath(args.out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    outs = [os.path.join(out_dir, os.path.basename(os.path.normpath(path)) + ".png") for path in worlds]
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # Textures are loaded relative to the repository
+    tasks = [(path, out, args.tiles_per_pixel, args.margin) for path, out in zip(worlds, outs)]
+    workers = min(args.workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        results = [try_export(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(try_export, *zip(*tasks)))
+    for result in results:
+        if "error" in result:
+            print(f"{result['world']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['out']}: {result['width']}x{result['height']} from {result['chunks']} chunks "
+                  f"in {result['seconds']:.2f} s")
+    sys.exit(1 if any("error" in result for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
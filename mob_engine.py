@@ -0,0 +1,298 @@
+import numpy as np
+from assets import asset_manager
+
+MOB_TYPES = []  # Registered mob types, indexed by type ID
+MOB_TYPE_IDS = {}  # Mob type name -> type ID
+
+
+class MobType:
+    def __init__(self, name, image_path, size, speed, health, gravity=1, jump_power=10, jump_chance=5 / 101,
+                 contact_damage=6, chase_speed=2):
+        """
+        Stats shared by every mob of one kind. Instances live in the MobEngine arrays, not in objects.
+        :param name: Unique name of the mob type.
+        :param image_path: Path to the mob's texture.
+        :param size: Width and height of the mob in pixels (the texture is scaled to it).
+        :param speed: Horizontal pixels moved per tick, multiplied by the mob's direction.
+        :param health: Health a mob spawns with.
+        :param gravity: Added to the vertical velocity every tick.
+        :param jump_power: Upward velocity of a jump.
+        :param jump_chance: Chance per tick to jump while on the ground.
+        :param contact_damage: Damage dealt to the player per tick of touching it.
+        :param chase_speed: Horizontal pixels moved per tick while following a path, see PathFinder.steer.
+        """
+        self.name = name
+        self.image_path = image_path
+        self.size = size
+        self.speed = speed
+        self.health = health
+        self.gravity = gravity
+        self.jump_power = jump_power
+        self.jump_chance = jump_chance
+        self.contact_damage = contact_damage
+        self.chase_speed = chase_speed
+        self.type_id = None  # Set by register_mob_type
+
+    def get_image(self):
+        return asset_manager.image(self.image_path, (self.size, self.size))  # Loaded once, on first draw
+
+
+def rect_pixels(values):
+    """Round float positions to whole pixels the way pygame.Rect does, half away from zero."""
+    return np.trunc(values + np.copysign(0.5, values)).astype(np.int64)
+
+
+def register_mob_type(mob_type):
+    """
+    Add a mob type to the registry so the engine can spawn it.
+    :return: The mob type, with its type ID set.
+    """
+    if mob_type.name in MOB_TYPE_IDS:
+        raise ValueError(f"Mob type {mob_type.name!r} is already registered")
+    mob_type.type_id = len(MOB_TYPES)
+    MOB_TYPES.append(mob_type)
+    MOB_TYPE_IDS[mob_type.name] = mob_type.type_id
+    return mob_type
+
+
+class MobEngine:
+    # Per-mob arrays and their types
+    FIELDS = {
+        "type_id": np.int16,
+        "mob_id": np.int64,  # Never reused, identifies a mob across ticks and over the network
+        "x": np.float64,
+        "y": np.float64,
+        "previous_x": np.float64,  # Position at the previous tick, for interpolation
+        "previous_y": np.float64,
+        "velocity_y": np.float64,
+        "direction": np.float64,  # 1 for right, -1 for left
+        "health": np.int32,
+        "on_ground": np.bool_,
+        "target_x": np.float64,  # X to walk towards instead of wandering, NaN for none (see PathFinder.steer)
+        "jump": np.bool_  # Jump as soon as it is on the ground, to follow a path up
+    }
+
+    def __init__(self, world, capacity=64, rng=None):
+        """
+        Every mob in the game, stored as one array per field so each tick runs as a few NumPy operations
+        on all of them instead of a Python loop over mob objects. Only the first `count` entries are live.
+        :param world: The game world, queried for the solid tiles around the mobs.
+        :param capacity: Initial array length, doubled whenever it runs out.
+        :param rng: NumPy random generator for the mobs' decisions.
+        """
+        self.world = world
+        self.count = 0
+        self.next_id = 0
+        self.rng = rng if rng is not None else np.random.default_rng()
+        for name, dtype in self.FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.stats = {}
+        self.stats_types = None  # Number of registered types the stat arrays were built for
+
+    def __len__(self):
+        return self.count
+
+    def type_stats(self):
+        """Get the per-type stat arrays, indexable by the type_id array."""
+        if self.stats_types != len(MOB_TYPES):
+            self.stats = {name: np.array([getattr(mob_type, name) for mob_type in MOB_TYPES], dtype=np.float64)
+                          for name in ("size", "speed", "gravity", "jump_power", "jump_chance", "contact_damage",
+                                       "chase_speed")}
+            self.stats_types = len(MOB_TYPES)
+        return self.stats
+
+    def spawn(self, mob_type, x, y, mob_id=None):
+        """
+        Add a mob.
+        :param mob_type: Registered MobType, or its name.
+        :param x: Initial x-coordinate of the mob.
+        :param y: Initial y-coordinate of the mob.
+        :param mob_id: ID of the mob, a new one if None. Clients pass the server's.
+        :return: Index of the new mob, valid until mobs are removed.
+        """
+        if isinstance(mob_type, str):
+            mob_type = MOB_TYPES[MOB_TYPE_IDS[mob_type]]
+        if self.count == len(self.x):
+            for name in self.FIELDS:
+                array = getattr(self, name)
+                grown = np.zeros(len(array) * 2, dtype=array.dtype)
+                grown[:self.count] = array
+                setattr(self, name, grown)
+        index = self.count
+        if mob_id is None:
+            mob_id = self.next_id
+            self.next_id += 1
+        self.type_id[index] = mob_type.type_id
+        self.mob_id[index] = mob_id
+        self.x[index] = self.previous_x[index] = x
+        self.y[index] = self.previous_y[index] = y
+        self.velocity_y[index] = 0
+        self.direction[index] = 1
+        self.health[index] = mob_type.health
+        self.on_ground[index] = False
+        self.target_x[index] = np.nan
+        self.jump[index] = False
+        self.count += 1
+        return index
+
+    def remove(self, mask):
+        """
+        Remove mobs, keeping the order of the others.
+        :param mask: Boolean array over the live mobs, True for the ones to remove.
+        """
+        keep = ~np.asarray(mask, dtype=bool)
+        kept = int(keep.sum())
+        if kept == self.count:
+            return
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[:kept] = array[:self.count][keep]
+        self.count = kept
+
+    def find(self, mob_ids):
+        """
+        Get the indices of mobs by ID.
+        :param mob_ids: Array of mob IDs.
+        :return: Array of mob indices, -1 for IDs of mobs that don't exist.
+        """
+        mob_ids = np.asarray(mob_ids, dtype=np.int64)
+        if self.count == 0:
+            return np.full(len(mob_ids), -1)
+        order = np.argsort(self.mob_id[:self.count], kind="stable")
+        ordered = self.mob_id[:self.count][order]
+        positions = np.minimum(np.searchsorted(ordered, mob_ids), self.count - 1)
+        return np.where(ordered[positions] == mob_ids, order[positions], -1)
+
+    def despawn_outside(self, left, right):
+        """Remove the mobs whose x is not between left and right."""
+        x = self.x[:self.count]
+        self.remove((x <= left) | (x >= right))
+
+    def solid_grid(self, left, top, width, height):
+        """
+        Get the solid tiles under every mob's rect.
+        :return: (first tile x, first tile y, solid) where solid[mob, row, column] covers the tiles from the first
+                 ones on, False past the rect.
+        """
+        size = self.world.tile_size
+        first_tx = left // size
+        first_ty = top // size
+        last_tx = (left + width - 1) // size
+        last_ty = (top + height - 1) // size
+        columns = int((last_tx - first_tx).max()) + 1
+        rows = int((last_ty - first_ty).max()) + 1
+        txs = first_tx[:, None, None] + np.arange(columns)[None, None, :]
+        tys = first_ty[:, None, None] + np.arange(rows)[None, :, None]
+        txs, tys = np.broadcast_arrays(txs, tys)
+        inside = (txs <= last_tx[:, None, None]) & (tys <= last_ty[:, None, None])
+        return first_tx, first_ty, self.world.solid_at(txs, tys) & inside
+
+    def update(self):
+        """Move every mob by one simulation tick."""
+        n = self.count
+        if n == 0:
+            return
+        size = self.world.tile_size
+        stats = self.type_stats()
+        types = self.type_id[:n]
+        mob_size = stats["size"][types].astype(np.int64)
+        x, y = self.x[:n], self.y[:n]
+        velocity_y, direction, on_ground = self.velocity_y[:n], self.direction[:n], self.on_ground[:n]
+        self.previous_x[:n] = x
+        self.previous_y[:n] = y
+
+        # Apply gravity
+        velocity_y += stats["gravity"][types]
+        y += velocity_y
+
+        # Push mobs out of the first tile they fell or jumped into, going column by column like World.solid_rects
+        on_ground[:] = False
+        first_tx, first_ty, solid = self.solid_grid(rect_pixels(x), rect_pixels(y), mob_size, mob_size)
+        solid_columns = solid.any(axis=1)
+        hit = solid_columns.any(axis=1)
+        column = solid_columns.argmax(axis=1)
+        row = solid[np.arange(n), :, column].argmax(axis=1)
+        falling = hit & (velocity_y > 0)  # Colliding from above
+        y[falling] = (first_ty[falling] + row[falling]) * size - mob_size[falling]
+        on_ground[falling] = True
+        rising = hit & (velocity_y < 0)  # Colliding from below
+        y[rising] = (first_ty[rising] + row[rising] + 1) * size
+        velocity_y[falling | rising] = 0
+
+        # Move horizontally, towards the target if there is one
+        chasing = ~np.isnan(self.target_x[:n])
+        step = stats["speed"][types] * direction
+        step[chasing] = np.clip(self.target_x[:n][chasing] - x[chasing], -stats["chase_speed"][types][chasing],
+                                stats["chase_speed"][types][chasing])
+        x += step
+        first_tx, first_ty, solid = self.solid_grid(rect_pixels(x), rect_pixels(y), mob_size, mob_size)
+        solid_columns = solid.any(axis=1)
+        hits = solid.sum(axis=(1, 2))
+        # Every tile hit reverses the direction, so only a single hit while moving right lands left of the tile,
+        # otherwise the mob ends up right of the last tile hit. Chasing mobs just stop at the tile.
+        right = np.where(chasing, (hits > 0) & (step > 0), (hits == 1) & (direction == 1))
+        x[right] = (first_tx[right] + solid_columns[right].argmax(axis=1)) * size - mob_size[right]
+        left = (hits > 0) & ~right
+        last_column = solid_columns.shape[1] - 1 - solid_columns[:, ::-1].argmax(axis=1)
+        x[left] = (first_tx[left] + last_column[left] + 1) * size
+        direction *= np.where(chasing, 1.0, (-0.1) ** hits)  # Reverse direction
+
+        # Jump randomly, or where the path goes up
+        jumping = on_ground & ((self.rng.random(n) < stats["jump_chance"][types]) | self.jump[:n])
+        velocity_y[jumping] = -stats["jump_power"][types][jumping]
+
+    def overlapping(self, rect):
+        """
+        Get the mobs overlapping a rect.
+        :param rect: Pygame rect in pixel coordinates.
+        :return: Array of mob indices.
+        """
+        n = self.count
+        mob_size = self.type_stats()["size"][self.type_id[:n]]
+        left = rect_pixels(self.x[:n])
+        top = rect_pixels(self.y[:n])
+        hits = (left < rect.right) & (left + mob_size > rect.left) & (top < rect.bottom) & (top + mob_size > rect.top)
+        return np.flatnonzero(hits)
+
+    def contact_damages(self, rect):
+        """Get the damage each mob touching a rect deals to it."""
+        indices = self.overlapping(rect)
+        return self.type_stats()["contact_damage"][self.type_id[indices]].astype(int).tolist()
+
+    def damage(self, indices, damage):
+        """
+        Reduce the health of some mobs and remove the ones that die.
+        :param indices: Mob indices, e.g. from overlapping.
+        :param damage: Amount of damage to deal to each.
+        :return: Number of mobs killed.
+        """
+        self.health[indices] -= damage
+        dead = self.health[:self.count] <= 0
+        killed = int(dead.sum())
+        self.remove(dead)
+        return killed
+
+    def draw(self, renderer, surface, origin_x, origin_y, zoom, alpha=1.0):
+        """
+        Draw the mobs inside the view, one batched blit per mob type.
+        :param renderer: TileRenderer that scales the sprites to the zoom.
+        :param surface: Surface to draw on.
+        :param origin_x: X of the view's top-left corner, in zoomed world pixels.
+        :param origin_y: Y of the view's top-left corner, in zoomed world pixels.
+        :param zoom: Camera zoom.
+        :param alpha: Where to draw the mobs between the previous tick (0) and the last one (1).
+        """
+        n = self.count
+        if n == 0:
+            return
+        zoom = renderer.effective_zoom(zoom)
+        x = self.previous_x[:n] + (self.x[:n] - self.previous_x[:n]) * alpha
+        y = self.previous_y[:n] + (self.y[:n] - self.previous_y[:n]) * alpha
+        types = self.type_id[:n]
+        mob_size = self.type_stats()["size"][types]
+        visible = ((x + mob_size) * zoom > origin_x) & (x * zoom < origin_x + surface.get_width()) & \
+                  ((y + mob_size) * zoom > origin_y) & (y * zoom < origin_y + surface.get_height())
+        for type_id in np.unique(types[visible]).tolist():
+            selected = visible & (types == type_id)
+            renderer.draw_sprites(surface, MOB_TYPES[type_id].get_image(), x[selected], y[selected],
+                                  origin_x, origin_y, zoom)
@@ -0,0 +1,548 @@
+import heapq
+import itertools
+from collections import OrderedDict
+import numpy as np
+from world import CHUNK_SIZE, SOLID_LOOKUP
+from profiler import profiled
+
+PENDING = object()  # Returned by PathFinder.find while the search is still running
+SEARCH_STEP = 32  # Abstract nodes a search looks at before it lets update run the next one
+
+
+class NavChunk:
+    def __init__(self, cx, cy, edges, entrances):
+        """
+        Walkable-surface navigation graph of one chunk.
+        Nodes are the (tx, ty) of the tiles a mob can stand in, ty being the row of its feet.
+        :param cx: Chunk x coordinate.
+        :param cy: Chunk y coordinate.
+        :param edges: Node -> list of (node, cost) of the moves out of it, for every node in the chunk.
+                      Moves can end in another chunk.
+        :param entrances: Nodes with a move into or out of another chunk.
+        """
+        self.cx = cx
+        self.cy = cy
+        self.edges = edges
+        self.entrances = entrances
+        self.links = {}  # Entrance -> list of (entrance, cost, path) of the ways to the others inside the chunk
+        self.reverse = None  # Node -> list of (node, cost) of the moves into it from inside the chunk, built on first use
+
+    def contains(self, node):
+        return node[0] // CHUNK_SIZE == self.cx and node[1] // CHUNK_SIZE == self.cy
+
+    def paths_from(self, start, reverse=False):
+        """
+        Dijkstra inside the chunk.
+        :param start: Node to start from.
+        :param reverse: Follow the moves backwards, to find the ways into start instead.
+        :return: Node -> (cost, path) of every node reached. Paths leave out start, reversed paths run towards it.
+        """
+        if reverse and self.reverse is None:
+            self.reverse = {}
+            for node, moves in self.edges.items():
+                for target, cost in moves:
+                    if target in self.edges:
+                        self.reverse.setdefault(target, []).append((node, cost))
+        graph = self.reverse if reverse else self.edges
+        costs = {start: 0}
+        previous = {}
+        heap = [(0, start)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if cost > costs[node]:
+                continue
+            for target, move_cost in graph.get(node, ()):
+                if target in self.edges and cost + move_cost < costs.get(target, float("inf")):
+                    costs[target] = cost + move_cost
+                    previous[target] = node
+                    heapq.heappush(heap, (cost + move_cost, target))
+        paths = {}
+        for node, cost in costs.items():
+            if node == start:
+                continue
+            path = [node]
+            while path[-1] in previous and previous[path[-1]] != start:
+                path.append(previous[path[-1]])
+            if reverse:
+                path = path[1:] + [start]  # From the node towards start, without the node itself
+            else:
+                path.reverse()
+            paths[node] = (cost, path)
+        return paths
+
+    def link_entrances(self):
+        """Find the ways between the entrances inside the chunk, the edges of the abstract graph."""
+        for entrance in self.entrances:
+            paths = self.paths_from(entrance)
+            self.links[entrance] = [(other, cost, path) for other, (cost, path) in paths.items()
+                                    if other in self.entrances]
+
+
+class Route:
+    def __init__(self):
+        """Where one mob is going: the goal it was planned for and the path to it."""
+        self.goal = None  # Goal node the path leads to
+        self.path = None  # Nodes from the mob's node at planning time to the goal
+        self.index = 0  # Position in the path of the last node the mob stood on
+        self.revisions = None  # (cx, cy) -> PathFinder.revisions of the chunks the path crosses when it was planned
+        self.edits = 0  # PathFinder.edits when the revisions were last checked
+        self.stuck = 0  # Ticks since the mob last got further along the path
+        self.retry = 0  # Ticks to wait before searching again after a failed search
+        self.tile = None  # Tile the mob was in when it last followed the path
+        self.chased = None  # Goal node then
+        self.step = None  # (target x, jump) it was steered with then, None to wander
+
+
+class PathFinder:
+    def __init__(self, world, clearance=2, max_jump=3, max_drop=8, budget=1024, max_chunks=1024, max_goals=64,
+                 max_expansions=4096, replan_distance=4, max_stuck=90):
+        """
+        Finds paths for mobs over the tiles they can stand on, with hierarchical A*: each chunk has a graph of its
+        walkable surfaces, linked to its neighbours through the nodes on its borders. A search only looks at the
+        border nodes of the chunks between the start and the goal, then fills in the way across each chunk from
+        the chunk's precomputed links. Chunk graphs are built on first use and dropped when tiles near them change.
+        Searches run in update, within a budget of nodes looked at per tick, so many mobs asking at once spread over
+        several ticks. The budget is counted in nodes rather than seconds, so paths arrive on the same tick on any
+        machine and replays stay exact. Every path found is cached per goal as the next step from each node on it,
+        so mobs chasing the same player reuse each other's paths.
+        :param world: The world to navigate. The path finder registers itself as one of its observers.
+        :param clearance: Free tiles a mob needs above the tile it stands on, its height in tiles.
+        :param max_jump: Highest step up a mob can jump, in tiles.
+        :param max_drop: Deepest drop a mob walks off, in tiles.
+        :param budget: Abstract nodes the searches look at per update, rounded up to whole SEARCH_STEPs.
+        :param max_chunks: How many chunk graphs to keep, least recently used ones are dropped first.
+        :param max_goals: How many goals to keep cached paths for.
+        :param max_expansions: Abstract nodes a search looks at before giving up on an unreachable goal.
+        :param replan_distance: Tiles a mob's goal can move before its path is searched for again.
+        :param max_stuck: Ticks a mob can go without getting further along its path before it is searched again.
+        """
+        self.world = world
+        self.clearance = clearance
+        self.max_jump = max_jump
+        self.max_drop = max_drop
+        self.budget = budget
+        self.max_chunks = max_chunks
+        self.max_goals = max_goals
+        self.max_expansions = max_expansions
+        self.replan_distance = replan_distance
+        self.max_stuck = max_stuck
+        self.chunks = OrderedDict()  # (cx, cy) -> NavChunk
+        self.goals = OrderedDict()  # Goal node -> [node -> next node on a path to the goal, chunks the paths cross]
+        self.searches = OrderedDict()  # (start, goal) -> running search, run in turns
+        self.finished = {}  # (start, goal) -> path, or None if there is none, of the searches finished last update
+        self.routes = {}  # Mob ID -> Route
+        self.revisions = {}  # (cx, cy) -> edits when the tiles its graph reads last changed, unchanged chunks are left out
+        self.edits = 0  # Tile changes so far
+        self.stats = {"chunks_built": 0, "searches": 0, "cache_hits": 0}
+        world.observers.append(self)
+
+    def chunk_of(self, node):
+        return node[0] // CHUNK_SIZE, node[1] // CHUNK_SIZE
+
+    def nav_chunk(self, cx, cy):
+        """Get the navigation graph of a chunk, building it the first time."""
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = self.build_chunk(cx, cy)
+            self.stats["chunks_built"] += 1
+            if len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+        self.chunks.move_to_end(key)
+        return chunk
+
+    def build_chunk(self, cx, cy):
+        """
+        Find the nodes of a chunk and the moves between them.
+        From a node a mob can walk to the next column, falling to the first node below if there is no floor there,
+        or jump up onto a node in the next column. The tiles around the chunk are read too, for the moves that
+        cross its border in either direction.
+        """
+        clearance, max_jump, max_drop = self.clearance, self.max_jump, self.max_drop
+        first_tx, first_ty = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+        last_tx, last_ty = first_tx + CHUNK_SIZE, first_ty + CHUNK_SIZE
+        left, top = first_tx - 1, first_ty - max_drop - max_jump - clearance
+        solid = SOLID_LOOKUP[self.world.copy_region(left, top, last_tx + 1, last_ty + max_jump + max_drop + 2)]
+        # Free tiles in a row up to and including each tile, from the top of the area down
+        free_run = np.zeros(solid.shape, dtype=np.int32)
+        for row in range(solid.shape[0]):
+            free_run[row] = np.where(solid[row], 0, free_run[row - 1] + 1 if row else 1)
+        standable = np.zeros(solid.shape, dtype=bool)
+        standable[clearance:-1] = (free_run[clearance:-1] >= clearance) & solid[clearance + 1:]
+        free_run = free_run.tolist()
+        standable_rows = standable.tolist()
+
+        def move(x, y, dx):
+            # The node a mob standing at (x, y) of the area gets to by going dx, and the cost, or None
+            x2 = x + dx
+            if free_run[y][x2] >= clearance:  # Walk across, falling if there is no floor
+                y2 = y
+                while not standable_rows[y2][x2]:
+                    y2 += 1
+                    if y2 - y > max_drop or free_run[y2][x2] == 0:
+                        return None
+                return (x2, y2), 1 + y2 - y
+            for height in range(1, max_jump + 1):  # Jump onto the lowest ledge within reach
+                if free_run[y][x] < clearance + height:
+                    return None  # Hit the ceiling
+                if standable_rows[y - height][x2]:
+                    return (x2, y - height), 1 + height
+            return None
+
+        # Moves from the nodes in the chunk and from the nodes around it that can reach into it
+        edges = {}
+        entrances = set()
+        first_row, last_row = first_ty - max_drop - top, last_ty + max_jump - top
+        ys, xs = np.nonzero(standable[first_row:last_row])
+        for y, x in zip((ys + first_row).tolist(), xs.tolist()):
+            node = (x + left, y + top)
+            inside = first_tx <= node[0] < last_tx and first_ty <= node[1] < last_ty
+            if inside:
+                edges[node] = []
+            for dx in (-1, 1):
+                if not 0 <= x + dx < solid.shape[1]:
+                    continue
+                found = move(x, y, dx)
+                if found is None:
+                    continue
+                target = (found[0][0] + left, found[0][1] + top)
+                target_inside = first_tx <= target[0] < last_tx and first_ty <= target[1] < last_ty
+                if inside:
+                    edges[node].append((target, found[1]))
+                    if not target_inside:
+                        entrances.add(node)
+                elif target_inside:
+                    entrances.add(target)
+        chunk = NavChunk(cx, cy, edges, entrances)
+        chunk.link_entrances()
+        return chunk
+
+    def ground_node(self, tx, ty, depth=16):
+        """
+        Get the node a mob in the air at a tile lands on, or None if there is none within depth tiles.
+        Mobs and players are wider than a tile: the middle of their feet can be over a drop, or in the ground on a
+        slope. So the search starts two tiles up, and the columns either side are tried too.
+        """
+        chunk = self.chunks.get((tx // CHUNK_SIZE, ty // CHUNK_SIZE))
+        if chunk is not None and (tx, ty) in chunk.edges:
+            return tx, ty  # Standing on the ground, the usual case
+        for x in (tx, tx - 1, tx + 1):
+            for y in range(ty - 2, ty + depth):
+                chunk = self.nav_chunk(x // CHUNK_SIZE, y // CHUNK_SIZE)
+                if (x, y) in chunk.edges:
+                    return x, y
+        return None
+
+    def search(self, start, goal):
+        """
+        Hierarchical A* from node to node, as a generator: it yields every SEARCH_STEP nodes so update can share its
+        budget between searches, and returns the path (a list of nodes from start to goal) or None if there is none.
+        The start joins its chunk's border nodes through a search of that chunk alone, the goal likewise.
+        """
+        start_chunk = self.nav_chunk(*self.chunk_of(start))
+        goal_chunk = self.nav_chunk(*self.chunk_of(goal))
+        if start not in start_chunk.edges or goal not in goal_chunk.edges:
+            return None
+        if start == goal:
+            return [start], False
+        from_start = start_chunk.paths_from(start)
+        to_goal = {node: found for node, found in goal_chunk.paths_from(goal, reverse=True).items()
+                   if node in goal_chunk.entrances}
+        # (cx, cy) -> revision of the chunks looked at, to tell if their tiles changed meanwhile
+        used = {key: self.revisions.get(key, 0) for key in (self.chunk_of(start), self.chunk_of(goal))}
+
+        def heuristic(node):
+            return abs(node[0] - goal[0]) + abs(node[1] - goal[1])  # Every move costs 1 and the rows it climbs or drops
+
+        order = itertools.count()  # Breaks ties between equal costs
+        costs = {start: 0}
+        previous = {}  # Node -> (node before it, path from there, without that node)
+        heap = [(heuristic(start), 0, next(order), start)]
+        expansions = 0
+        while heap:
+            estimate, cost, _, node = heapq.heappop(heap)
+            if node == goal:
+                segments = []
+                while node != start:
+                    node, segment = previous[node]
+                    segments.append(segment)
+                path = [start]
+                for segment in reversed(segments):
+                    path += segment
+                stale = any(self.revisions.get(key, 0) != revision for key, revision in used.items())
+                return path, stale
+            if cost > costs[node]:
+                continue
+            expansions += 1
+            if expansions > self.max_expansions:
+                return None
+            if expansions % SEARCH_STEP == 0:
+                yield
+
+            # Ways out of this node: inside its chunk, across a border, and into the goal
+            key = self.chunk_of(node)
+            used.setdefault(key, self.revisions.get(key, 0))
+            chunk = self.nav_chunk(*key)
+            if node == start:
+                moves = [(other, found[0], found[1]) for other, found in from_start.items()
+                         if other in start_chunk.entrances or other == goal]
+            else:
+                moves = list(chunk.links.get(node, ()))
+            moves += [(target, move_cost, [target]) for target, move_cost in chunk.edges.get(node, ())
+                      if not chunk.contains(target)]
+            if node in to_goal:
+                moves.append((goal, to_goal[node][0], to_goal[node][1]))
+            for target, move_cost, segment in moves:
+                if cost + move_cost < costs.get(target, float("inf")):
+                    costs[target] = cost + move_cost
+                    previous[target] = (node, segment)
+                    heapq.heappush(heap, (cost + move_cost + heuristic(target), cost + move_cost, next(order), target))
+        return None
+
+    def cached_path(self, start, goal):
+        """Get a path from the paths found to the goal before, or None."""
+        cached = self.goals.get(goal)
+        if cached is None or start not in cached[0]:
+            return None
+        steps = cached[0]
+        path = [start]
+        while path[-1] != goal:
+            path.append(steps[path[-1]])
+            if len(path) > len(steps) + 1:
+                return None  # Paths found at different times disagree
+        self.goals.move_to_end(goal)
+        return path
+
+    def cache_path(self, path):
+        goal = path[-1]
+        cached = self.goals.get(goal)
+        if cached is None:
+            cached = self.goals[goal] = [{}, set()]
+            if len(self.goals) > self.max_goals:
+                self.goals.popitem(last=False)
+        steps, chunks = cached
+        for node, next_node in zip(path, path[1:]):
+            steps[node] = next_node
+            chunks.add(self.chunk_of(node))
+        chunks.add(self.chunk_of(goal))
+
+    def find(self, start, goal):
+        """
+        Get a path from the cache, or from a search that finished in the last update, or queue a search.
+        :return: The path, None if there is none, or PENDING.
+        """
+        path = self.cached_path(start, goal)
+        if path is not None:
+            self.stats["cache_hits"] += 1
+            return path
+        key = (start, goal)
+        if key in self.finished:
+            return self.finished[key]
+        if key not in self.searches:
+            self.searches[key] = self.search(start, goal)
+            self.stats["searches"] += 1
+        return PENDING
+
+    @profiled("pathfinding")
+    def update(self):
+        """Run the queued searches in turns until the budget is spent."""
+        self.finished = {}
+        spent = 0
+        while self.searches and spent < self.budget:
+            spent += SEARCH_STEP  # The last step of a search may look at fewer, it is counted whole
+            key, search = next(iter(self.searches.items()))
+            try:
+                next(search)
+                self.searches.move_to_end(key)
+            except StopIteration as done:
+                del self.searches[key]
+                path = None
+                if done.value is not None:
+                    path, stale = done.value
+                    if not stale:  # The tiles changed under a search that was still running
+                        self.cache_path(path)
+                self.finished[key] = path
+
+    def steer(self, mobs, goal_xs, goal_ys, chase_range=300):
+        """
+        Set the target_x and jump of the mobs near a goal, so MobEngine.update takes them along a path to it.
+        The ones still waiting for their path stay where they are, the others wander. Call it before update, which
+        runs the searches the mobs queue, and before the mobs move.
+        :param mobs: The MobEngine.
+        :param goal_xs: Pixel x of the goals, e.g. the middle of each player.
+        :param goal_ys: Pixel y of the goals' feet.
+        :param chase_range: Pixels from a goal within which mobs chase it.
+        """
+        n = mobs.count
+        mobs.target_x[:n] = np.nan
+        mobs.jump[:n] = False
+        goal_xs = np.asarray(goal_xs, dtype=np.float64)
+        goal_ys = np.asarray(goal_ys, dtype=np.float64)
+        if n == 0 or goal_xs.size == 0:
+            self.routes = {}
+            return
+        size = self.world.tile_size
+        mob_size = mobs.type_stats()["size"][mobs.type_id[:n]]
+        middle_x = mobs.x[:n] + mob_size / 2
+        feet_y = mobs.y[:n] + mob_size - 1
+        distances = np.abs(middle_x[:, None] - goal_xs[None, :]) + np.abs(feet_y[:, None] - goal_ys[None, :])
+        nearest = distances.argmin(axis=1)
+        chasing = np.flatnonzero(distances[np.arange(n), nearest] <= chase_range)
+        txs = (middle_x // size).astype(np.int64).tolist()
+        tys = (feet_y // size).astype(np.int64).tolist()
+        on_ground = mobs.on_ground[:n].tolist()
+        goal_nodes = {}
+        routes = {}
+        steered, target_xs, jumps = [], [], []
+        for index in chasing.tolist():
+            goal_index = int(nearest[index])
+            if goal_index not in goal_nodes:
+                goal_nodes[goal_index] = self.ground_node(int(goal_xs[goal_index] // size),
+                                                          int(goal_ys[goal_index] // size))
+            goal = goal_nodes[goal_index]
+            if goal is None:
+                continue
+            mob_id = int(mobs.mob_id[index])
+            route = routes[mob_id] = self.routes.get(mob_id) or Route()
+            tile = (txs[index], tys[index])
+            if not on_ground[index]:
+                pass  # Jumping or falling, it keeps going the way it was until it lands
+            elif tile == route.tile and goal == route.chased and route.path is not None and route.edits == self.edits:
+                route.stuck += 1  # Still on the same tile, heading for the same node
+            else:
+                node = self.ground_node(*tile)
+                if node is None:
+                    continue
+                next_node = self.follow(route, node, goal)
+                route.tile, route.chased = tile, goal
+                route.step = None if next_node is None else (next_node[0] * size + size / 2, next_node[1] < node[1])
+            if route.step is not None:
+                steered.append(index)
+                target_xs.append(route.step[0])
+                jumps.append(route.step[1])
+            elif route.retry == 0:  # Waiting for its path, it stays put rather than wander out of range
+                steered.append(index)
+                target_xs.append(middle_x[index])
+                jumps.append(False)
+        if steered:
+            mobs.target_x[steered] = np.array(target_xs) - mob_size[steered] / 2
+            mobs.jump[steered] = jumps
+        self.routes = routes  # Routes of mobs that stopped chasing or are gone are dropped
+
+    def follow(self, route, node, goal):
+        """
+        Move a route along as its mob gets to the nodes on it, planning it again when needed.
+        :return: The node the mob should head for, or None while there is no path.
+        """
+        if route.path is not None:
+            if abs(route.goal[0] - goal[0]) + abs(route.goal[1] - goal[1]) > self.replan_distance \
+                    or route.stuck > self.max_stuck:
+                route.path = None
+            elif route.edits != self.edits:  # Tiles changed somewhere since it last looked
+                route.edits = self.edits
+                if any(self.revisions.get(key, 0) != revision for key, revision in route.revisions.items()):
+                    route.path = None
+        if route.path is None:
+            if route.retry > 0:
+                route.retry -= 1
+                return None
+            path = self.find(node, goal)
+            if path is PENDING:
+                return None
+            if path is None:
+                route.retry = self.max_stuck  # Unreachable for now, don't search every tick
+                return None
+            route.goal, route.path, route.index, route.stuck = goal, path, 0, 0
+            route.revisions = {key: self.revisions.get(key, 0) for key in set(map(self.chunk_of, path))}
+            route.edits = self.edits
+
+        # Catch up with the mob if it got a few nodes further, e.g. by falling
+        path = route.path
+        for index in range(route.index, min(route.index + 4, len(path))):
+            if path[index] == node:
+                route.stuck = 0 if index > route.index else route.stuck + 1
+                route.index = index
+                break
+        else:
+            route.stuck += 1  # Off the path, it was pushed or fell somewhere else
+        if route.index + 1 >= len(path):
+            return path[-1]
+        return path[route.index + 1]
+
+    def invalidate(self, first_tx, first_ty, last_tx, last_ty):
+        """
+        Drop the chunk graphs that read the tiles of a rect (last coordinates exclusive) and the cached paths through
+        them. Routes through them are planned again when their mobs next follow them, see revisions.
+        """
+        margin_top = self.max_drop + self.max_jump + self.clearance  # See build_chunk
+        margin_bottom = self.max_jump + self.max_drop + 2
+        first_cx, last_cx = (first_tx - 1) // CHUNK_SIZE, last_tx // CHUNK_SIZE
+        first_cy, last_cy = (first_ty - margin_bottom) // CHUNK_SIZE, (last_ty - 1 + margin_top) // CHUNK_SIZE
+        self.edits += 1
+        keys = [(cx, cy) for cx in range(first_cx, last_cx + 1) for cy in range(first_cy, last_cy + 1)]
+        for key in keys:
+            self.revisions[key] = self.edits  # Never repeats, even after an unload forgot the chunk
+            self.chunks.pop(key, None)
+        keys = set(keys)
+        for goal in [goal for goal, (steps, chunks) in self.goals.items() if not chunks.isdisjoint(keys)]:
+            del self.goals[goal]
+
+    def tile_changed(self, tx, ty, tile_id):
+        self.invalidate(tx, ty, tx + 1, ty + 1)
+
+    def region_changed(self, first_tx, first_ty, last_tx, last_ty):
+        self.invalidate(first_tx, first_ty, last_tx, last_ty)
+
+    def chunk_replaced(self, cx, cy):
+        self.invalidate(cx * CHUNK_SIZE, cy * CHUNK_SIZE, (cx + 1) * CHUNK_SIZE, (cy + 1) * CHUNK_SIZE)
+
+    def world_cleared(self):
+        self.chunks = OrderedDict()
+        self.goals = OrderedDict()
+        self.searches = OrderedDict()
+        self.finished = {}
+        self.routes = {}
+
+    def chunks_unloaded(self, keys):
+        # Paths planned with a forgotten revision count as stale, so they are planned again rather than trusted
+        for key in keys:
+            self.chunks.pop(key, None)
+            self.revisions.pop(key, None)
+
+
+def chase_check(distances=(-22, -16, -10, 10, 13, 16, 19, 22), ticks=600):
+    """
+    Put a slime at each distance (in tiles) from a goal on flat ground with a few steps and walls, and let them
+    chase it. Every one of them should end up next to the goal.
+    :return: Tile distance of each slime from the goal at the end.
+    """
+    from world import World, TILE_IDS
+    from mob_engine import MobEngine
+    from mobs import SLIME
+
+    size = 15
+    world = World(size)
+    ground = 20
+    world.fill_rect(-64, ground, 64, ground + 4, TILE_IDS["stone"])
+    world.fill_rect(-14, ground - 2, -12, ground, TILE_IDS["dirt"])  # A step up, and a wall to jump over
+    world.fill_rect(6, ground - 1, 9, ground, TILE_IDS["dirt"])
+    world.fill_rect(15, ground - 3, 16, ground, TILE_IDS["dirt"])
+    pathfinder = PathFinder(world)
+    mobs = MobEngine(world, rng=np.random.default_rng(1))
+    for distance in distances:
+        mobs.spawn(SLIME, distance * size, (ground - 4) * size)
+    goal_x, goal_y = size / 2, ground * size - 1
+    for _ in range(ticks):
+        pathfinder.steer(mobs, [goal_x], [goal_y], chase_range=30 * size)
+        pathfinder.update()
+        mobs.update()
+    middle_x = mobs.x[:mobs.count] + SLIME.size / 2
+    return (np.abs(middle_x - goal_x) / size).round(1).tolist()
+
+
+if __name__ == "__main__":
+    import sys
+
+    result = chase_check()
+    print("tiles from the goal:", result)
+    sys.exit(0 if all(distance <= 2 for distance in result) else 1)
@@ -1,13 +1,14 @@
 import random
 import math
+import numpy as np
 
 class PerlinNoise1D:
     def __init__(self, seed=None):
-        if seed is not None:
-            random.seed(seed)
+        rng = random.Random(seed)  # Own generator, so making one doesn't reseed the global one
         self.permutation = list(range(256))
-        random.shuffle(self.permutation)
+        rng.shuffle(self.permutation)
         self.permutation += self.permutation  # Double the list for easy wrapping
+        self.permutation_array = np.array(self.permutation, dtype=np.int64)
 
     def fade(self, t):
         """Smooth interpolation function."""
@@ -28,8 +29,9 @@ class PerlinNoise1D:
     def noise(self, x):
         """Generate Perlin noise at coordinate x."""
         # Find unit interval that contains x
-        xi = int(x) & 255
-        xf = x - int(x)
+        x0 = math.floor(x)  # Same as int(x) for positive x, and keeps xf in [0, 1) for negative x
+        xi = x0 & 255
+        xf = x - x0
 
         # Fade curve for x
         u = self.fade(xf)
@@ -39,4 +41,162 @@ class PerlinNoise1D:
         b = self.permutation[xi + 1]
 
         # Interpolate between the gradients
-        return self.lerp(self.grad(a, xf), self.grad(b, xf - 1), u)
\ No newline at end of file
+        return self.lerp(self.grad(a, xf), self.grad(b, xf - 1), u)
+
+    def noise_array(self, xs):
+        """
+        Generate Perlin noise for a whole array of coordinates in one call.
+        Gives exactly the same values as calling noise() on each coordinate.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        x0 = np.floor(xs)
+        xi = x0.astype(np.int64) & 255
+        xf = xs - x0
+        u = self.fade(xf)
+        a = self.permutation_array[xi]
+        b = self.permutation_array[xi + 1]
+        return self.lerp(grad_array(a, xf), grad_array(b, xf - 1), u)
+
+    def fractal(self, x, octaves=4, persistence=0.5, lacunarity=2.0):
+        """
+        Sum several octaves of noise at coordinate x, each at a higher frequency and lower amplitude.
+        :param octaves: Number of noise layers.
+        :param persistence: Amplitude multiplier between octaves.
+        :param lacunarity: Frequency multiplier between octaves.
+        """
+        total = 0.0
+        frequency = 1.0
+        amplitude = 1.0
+        max_amplitude = 0.0
+        for _ in range(octaves):
+            total += amplitude * self.noise(x * frequency)
+            max_amplitude += amplitude
+            frequency *= lacunarity
+            amplitude *= persistence
+        return total / max_amplitude
+
+    def fractal_array(self, xs, octaves=4, persistence=0.5, lacunarity=2.0):
+        """Multi-octave noise for a whole array of coordinates, matching fractal() exactly."""
+        xs = np.asarray(xs, dtype=np.float64)
+        total = np.zeros_like(xs)
+        frequency = 1.0
+        amplitude = 1.0
+        max_amplitude = 0.0
+        for _ in range(octaves):
+            total += amplitude * self.noise_array(xs * frequency)
+            max_amplitude += amplitude
+            frequency *= lacunarity
+            amplitude *= persistence
+        return total / max_amplitude
+
+
+def grad_array(hash, x):
+    """Vectorized PerlinNoise1D.grad."""
+    h = hash & 15
+    grad = 1 + (h & 7)  # Gradient value between 1 and 8
+    grad = np.where(h & 8, -grad, grad)  # Randomly flip the sign
+    return grad * x
+
+
+class PerlinNoise2D:
+    def __init__(self, seed=None):
+        rng = random.Random(seed)  # Own generator, so making one doesn't reseed the global one
+        self.permutation = list(range(256))
+        rng.shuffle(self.permutation)
+        self.permutation += self.permutation  # Double the list for easy wrapping
+        self.permutation_array = np.array(self.permutation, dtype=np.int64)
+
+    def fade(self, t):
+        """Smooth interpolation function."""
+        return t * t * t * (t * (t * 6 - 15) + 10)
+
+    def lerp(self, a, b, t):
+        """Linear interpolation between a and b."""
+        return a + t * (b - a)
+
+    def grad(self, hash, x, y):
+        """Dot product of (x, y) with one of 8 gradients picked by the hash value."""
+        h = hash & 7
+        u = x if h < 4 else y
+        v = y if h < 4 else x
+        return (-u if h & 1 else u) + (-2.0 * v if h & 2 else 2.0 * v)
+
+    def grad_array(self, hash, x, y):
+        """Vectorized grad."""
+        h = hash & 7
+        u = np.where(h < 4, x, y)
+        v = np.where(h < 4, y, x)
+        return np.where(h & 1, -u, u) + np.where(h & 2, -2.0 * v, 2.0 * v)
+
+    def noise(self, x, y):
+        """Generate Perlin noise at coordinate (x, y)."""
+        # Find unit square that contains the point
+        x0 = math.floor(x)
+        y0 = math.floor(y)
+        xi = x0 & 255
+        yi = y0 & 255
+        xf = x - x0
+        yf = y - y0
+
+        # Fade curves
+        u = self.fade(xf)
+        v = self.fade(yf)
+
+        # Hash coordinates of the square corners
+        p = self.permutation
+        aa = p[p[xi] + yi]
+        ab = p[p[xi] + yi + 1]
+        ba = p[p[xi + 1] + yi]
+        bb = p[p[xi + 1] + yi + 1]
+
+        # Interpolate between the gradients
+        x1 = self.lerp(self.grad(aa, xf, yf), self.grad(ba, xf - 1, yf), u)
+        x2 = self.lerp(self.grad(ab, xf, yf - 1), self.grad(bb, xf - 1, yf - 1), u)
+        return self.lerp(x1, x2, v)
+
+    def noise_array(self, xs, ys):
+        """Generate Perlin noise for arrays of coordinates in one call, matching noise() exactly."""
+        xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+        x0 = np.floor(xs)
+        y0 = np.floor(ys)
+        xi = x0.astype(np.int64) & 255
+        yi = y0.astype(np.int64) & 255
+        xf = xs - x0
+        yf = ys - y0
+        u = self.fade(xf)
+        v = self.fade(yf)
+        p = self.permutation_array
+        aa = p[p[xi] + yi]
+        ab = p[p[xi] + yi + 1]
+        ba = p[p[xi + 1] + yi]
+        bb = p[p[xi + 1] + yi + 1]
+        x1 = self.lerp(self.grad_array(aa, xf, yf), self.grad_array(ba, xf - 1, yf), u)
+        x2 = self.lerp(self.grad_array(ab, xf, yf - 1), self.grad_array(bb, xf - 1, yf - 1), u)
+        return self.lerp(x1, x2, v)
+
+    def fractal(self, x, y, octaves=4, persistence=0.5, lacunarity=2.0):
+        """Sum several octaves of noise at (x, y), see PerlinNoise1D.fractal."""
+        total = 0.0
+        frequency = 1.0
+        amplitude = 1.0
+        max_amplitude = 0.0
+        for _ in range(octaves):
+            total += amplitude * self.noise(x * frequency, y * frequency)
+            max_amplitude += amplitude
+            frequency *= lacunarity
+            amplitude *= persistence
+        return total / max_amplitude
+
+    def fractal_array(self, xs, ys, octaves=4, persistence=0.5, lacunarity=2.0):
+        """Multi-octave noise for arrays of coordinates, matching fractal() exactly."""
+        xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))
+        total = np.zeros_like(xs)
+        frequency = 1.0
+        amplitude = 1.0
+        max_amplitude = 0.0
+        for _ in range(octaves):
+            total += amplitude * self.noise_array(xs * frequency, ys * frequency)
+            max_amplitude += amplitude
+            frequency *= lacunarity
+            amplitude *= persistence
+        return total / max_amplitude
@@ -0,0 +1,143 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import pygame
+from hud import text_cache
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Profiler:
+    def __init__(self, history=240, max_trace_events=200000):
+        """
+        Named timing scopes around the hot paths, kept as recent samples for percentiles and as a trace.
+        :param history: Samples kept per scope for the statistics.
+        :param max_trace_events: Trace events kept, the oldest ones are dropped first.
+        """
+        self.enabled = True
+        self.history = history
+        self.samples = {}  # Scope name -> deque of the latest durations in milliseconds
+        self.trace = deque(maxlen=max_trace_events)  # (name, thread ID, start, duration) in seconds
+        self.start_time = time.perf_counter()
+
+    @contextmanager
+    def scope(self, name):
+        """Time the code inside a with block."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name, start, end):
+        """Add one timing, from perf_counter values. Safe to call from any thread."""
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, deque(maxlen=self.history))
+        samples.append((end - start) * 1000)
+        self.trace.append((name, threading.get_ident(), start - self.start_time, end - start))
+
+    def stats(self):
+        """
+        Summarize the recent samples of every scope.
+        :return: Dict of scope name -> dict with mean, p50, p95, p99 and max in milliseconds.
+        """
+        summary = {}
+        for name, samples in list(self.samples.items()):
+            samples = list(samples)
+            if samples:
+                summary[name] = {
+                    "mean": sum(samples) / len(samples),
+                    "p50": percentile(samples, 0.5),
+                    "p95": percentile(samples, 0.95),
+                    "p99": percentile(samples, 0.99),
+                    "max": max(samples)
+                }
+        return summary
+
+    def export_chrome_trace(self, path):
+        """
+        Write the trace in the Chrome trace event format, which chrome://tracing and Perfetto open.
+        :param path: JSON file to write.
+        """
+        thread_ids = {threading.main_thread().ident: 0}
+        events = []
+        for name, thread_id, start, duration in list(self.trace):
+            tid = thread_ids.setdefault(thread_id, len(thread_ids))
+            events.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": tid,
+                           "ts": start * 1e6, "dur": duration * 1e6})
+        for thread_id, tid in thread_ids.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                           "args": {"name": "main" if tid == 0 else f"worker {tid}"}})
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def clear(self):
+        self.samples = {}
+        self.trace.clear()
+
+
+profiler = Profiler()  # Shared by everything that is timed
+
+
+def profiled(name):
+    """Decorator timing every call of a function as a profiler scope."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profiler.scope(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ProfilerOverlay:
+    def __init__(self, profiler=profiler, refresh_interval=500):
+        """
+        In-game table of the per-scope timings.
+        :param profiler: Profiler to show.
+        :param refresh_interval: Milliseconds between table updates, it is rendered again only then.
+        """
+        self.profiler = profiler
+        self.refresh_interval = refresh_interval
+        self.last_refresh = None
+        self.generation = 0  # Bumped whenever the table should be rendered again
+
+    def update(self, now):
+        """Get the table's generation, moving on to a new one every refresh_interval."""
+        if self.last_refresh is None or now - self.last_refresh >= self.refresh_interval:
+            self.last_refresh = now
+            self.generation += 1
+        return self.generation
+
+    def render(self, generation=None):
+        """Render the table of mean and percentile times in milliseconds."""
+        columns = ["mean", "p50", "p95", "p99", "max"]
+        stats = self.profiler.stats()
+        line_height = 16
+        name_width = 120
+        column_width = 50
+        surface = pygame.Surface((name_width + column_width * len(columns) + 10, line_height * (len(stats) + 1) + 10),
+                                 pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 160))
+        white = (255, 255, 255)
+        surface.blit(text_cache.render("ms", 14, white), (5, 5))
+        for i, column in enumerate(columns):
+            surface.blit(text_cache.render(column, 14, white), (5 + name_width + i * column_width, 5))
+        for row, name in enumerate(sorted(stats), 1):
+            y = 5 + row * line_height
+            surface.blit(text_cache.render(name, 14, white), (5, y))
+            for i, column in enumerate(columns):
+                text = text_cache.font(14).render(f"{stats[name][column]:.2f}", True, white)  # Changes every refresh
+                surface.blit(text, (5 + name_width + i * column_width, y))
+        return surface
@@ -0,0 +1,94 @@
+import struct
+import zlib
+import numpy as np
+from world import CHUNK_SIZE
+
+# Every message is a header followed by its payload
+HEADER = struct.Struct("<IB")  # payload length, message type
+MAX_PAYLOAD = 1 << 20  # Anything longer is a broken or hostile peer
+PROTOCOL_VERSION = 1
+
+# Client to server
+HELLO = 1  # Protocol version, the first message of a connection
+INPUT = 2  # Keys held, applied from the next tick on
+EDIT = 3  # Tile to change, checked against the player's reach
+
+# Server to client
+WELCOME = 10  # Player ID and tick rate, the answer to HELLO
+CHUNK = 11  # Chunk coordinates and its zlib-compressed tiles
+TILES = 12  # Tiles changed in the last tick, in chunks the client has
+ENTITY_ADD = 13  # Entities that came into view, with their full positions
+ENTITY_MOVE = 14  # Position changes of entities in view since the last tick
+ENTITY_REMOVE = 15  # Entities that left the view or are gone
+
+HELLO_MESSAGE = struct.Struct("<H")  # protocol version
+WELCOME_MESSAGE = struct.Struct("<IH")  # player ID, tick rate
+INPUT_MESSAGE = struct.Struct("<B")  # key bits
+EDIT_MESSAGE = struct.Struct("<iiB")  # tile x, tile y, tile ID
+CHUNK_COORDS = struct.Struct("<ii")  # cx, cy, followed by the compressed tiles
+
+# Chunks around its player's chunk a client is sent, horizontally and vertically. The server forgets which ones
+# a client has once they are more than a chunk outside this, and sends them again if they come back into view.
+VIEW_RADIUS = (3, 2)
+
+# Input key bits
+KEY_LEFT = 1
+KEY_RIGHT = 2
+KEY_JUMP = 4
+
+# Entity kinds, entity IDs are only unique within a kind
+PLAYER = 0
+MOB = 1
+
+# Records of the array messages
+TILE_RECORD = np.dtype([("tile_x", "<i4"), ("tile_y", "<i4"), ("tile_id", "u1")])
+ENTITY_ADD_RECORD = np.dtype([("kind", "u1"), ("type_id", "u1"), ("entity_id", "<u4"), ("x", "<i4"), ("y", "<i4")])
+ENTITY_MOVE_RECORD = np.dtype([("kind", "u1"), ("entity_id", "<u4"), ("dx", "<i2"), ("dy", "<i2")])
+ENTITY_REMOVE_RECORD = np.dtype([("kind", "u1"), ("entity_id", "<u4")])
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode(message_type, payload=b""):
+    """Frame a message for the stream."""
+    return HEADER.pack(len(payload), message_type) + payload
+
+
+async def read_message(reader):
+    """
+    Read the next message from an asyncio stream.
+    :return: (message type, payload bytes).
+    """
+    length, message_type = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Message of {length} bytes is too long")
+    return message_type, await reader.readexactly(length)
+
+
+def encode_records(message_type, records):
+    """Frame a record array, see TILE_RECORD and the ENTITY records."""
+    return encode(message_type, records.tobytes())
+
+
+def decode_records(payload, dtype):
+    if len(payload) % dtype.itemsize:
+        raise ProtocolError(f"Payload of {len(payload)} bytes doesn't hold whole records")
+    return np.frombuffer(payload, dtype=dtype)
+
+
+def encode_chunk(cx, cy, tiles):
+    return encode(CHUNK, CHUNK_COORDS.pack(cx, cy) + zlib.compress(tiles.tobytes()))
+
+
+def decode_chunk(payload):
+    """:return: (cx, cy, tiles)"""
+    cx, cy = CHUNK_COORDS.unpack_from(payload)
+    try:
+        data = zlib.decompress(payload[CHUNK_COORDS.size:])
+    except zlib.error as error:
+        raise ProtocolError(f"Chunk data is corrupt: {error}")
+    if len(data) != CHUNK_SIZE * CHUNK_SIZE:
+        raise ProtocolError(f"Chunk of {len(data)} tiles")
+    return cx, cy, np.frombuffer(data, dtype=np.uint8).reshape((CHUNK_SIZE, CHUNK_SIZE)).copy()
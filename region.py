@@ -0,0 +1,216 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from world import CHUNK_SIZE
+
+# Region files group REGION_SIZE x REGION_SIZE chunks. Each file starts with a header and an index
+# of (offset, length) entries, one per chunk, followed by the zlib-compressed chunk tiles.
+REGION_SIZE = 16
+REGION_MAGIC = b"OTRG"
+REGION_VERSION = 1
+HEADER = struct.Struct("<4sHHH")  # magic, version, chunk size, region size
+INDEX_ENTRY = struct.Struct("<II")  # offset, length (0 when the chunk isn't stored)
+INDEX_OFFSET = HEADER.size
+DATA_OFFSET = INDEX_OFFSET + REGION_SIZE * REGION_SIZE * INDEX_ENTRY.size
+
+# Player and world settings are kept next to the region files
+LEVEL_FILE = "level.json"
+LEVEL_VERSION = 1
+
+
+def sync_directory(directory):
+    """Flush a directory entry change like a rename to disk. Directories can't be opened on Windows, so it's skipped there."""
+    if os.name == "nt":
+        return
+    descriptor = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def read_level(directory):
+    """Read the level file of a world, or return None if there is none."""
+    level_path = os.path.join(directory, LEVEL_FILE)
+    if not os.path.exists(level_path):
+        return None
+    with open(level_path, "r") as file:
+        level_data = json.load(file)
+    if level_data["format_version"] > LEVEL_VERSION:
+        raise ValueError(f"World format {level_data['format_version']} is newer than this game")
+    return level_data
+
+
+def write_level(directory, level_data):
+    """Replace the level file of a world in one step, so a crash never leaves half of it."""
+    os.makedirs(directory, exist_ok=True)
+    level_path = os.path.join(directory, LEVEL_FILE)
+    with open(level_path + ".tmp", "w") as file:
+        json.dump(dict(level_data, format_version=LEVEL_VERSION), file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(level_path + ".tmp", level_path)
+    sync_directory(directory)
+
+
+class RegionFile:
+    def __init__(self, path):
+        """
+        One region file, read through a memory map so only the chunks asked for get decoded.
+        :param path: Path of the region file (created on first write).
+        """
+        self.path = path
+        self.index = [(0, 0)] * (REGION_SIZE * REGION_SIZE)
+        self.data = None
+        self.file = None
+        if os.path.exists(path):
+            self.open()
+
+    def open(self):
+        self.file = open(self.path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, chunk_size, region_size = HEADER.unpack_from(self.data, 0)
+        if magic != REGION_MAGIC:
+            raise ValueError(f"{self.path} is not a region file")
+        if version != REGION_VERSION or chunk_size != CHUNK_SIZE or region_size != REGION_SIZE:
+            raise ValueError(f"{self.path} has an unsupported format (version {version})")
+        self.index = [INDEX_ENTRY.unpack_from(self.data, INDEX_OFFSET + i * INDEX_ENTRY.size)
+                      for i in range(REGION_SIZE * REGION_SIZE)]
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.file.close()
+            self.data = None
+            self.file = None
+
+    def chunk_coords(self):
+        """Yield the local (x, y) of every chunk stored in this region."""
+        for i, (offset, length) in enumerate(self.index):
+            if length:
+                yield i % REGION_SIZE, i // REGION_SIZE
+
+    def read_chunk(self, lx, ly):
+        """
+        Decode one chunk.
+        :param lx: Chunk x inside the region.
+        :param ly: Chunk y inside the region.
+        :return: The chunk tiles, or None if the chunk isn't stored.
+        """
+        offset, length = self.index[ly * REGION_SIZE + lx]
+        if not length:
+            return None
+        tiles = np.frombuffer(zlib.decompress(self.data[offset:offset + length]), dtype=np.uint8)
+        return tiles.reshape((CHUNK_SIZE, CHUNK_SIZE)).copy()
+
+    def write_payloads(self, payloads):
+        """
+        Store chunk payloads. The file is rebuilt next to the old one and swapped in with os.replace,
+        so an interrupted write leaves the previous file whole. Every call rewrites the whole region,
+        all its stored chunks and not just the changed ones, so saving costs up to a region's worth of
+        compressed chunks per region touched.
+        :param payloads: Dict of local (x, y) -> compressed chunk tiles, or None to remove the chunk.
+        """
+        stored = [self.data[offset:offset + length] if length else b"" for offset, length in self.index]
+        for (lx, ly), payload in payloads.items():
+            stored[ly * REGION_SIZE + lx] = payload or b""
+        self.rewrite(stored)
+
+    def rewrite(self, payloads):
+        """
+        Write a new file holding only the given chunks, so overwritten ones don't pile up, and replace this one with it.
+        :param payloads: Compressed chunk tiles in index order, empty for chunks that aren't stored.
+        """
+        self.close()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(HEADER.pack(REGION_MAGIC, REGION_VERSION, CHUNK_SIZE, REGION_SIZE))
+            file.seek(DATA_OFFSET)
+            for i, payload in enumerate(payloads):
+                self.index[i] = (file.tell(), len(payload)) if payload else (0, 0)
+                file.write(payload)
+            file.seek(INDEX_OFFSET)
+            file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in self.index))
+            file.flush()
+            os.fsync(file.fileno())  # On disk before the rename, or a crash could leave an empty region
+        os.replace(temp_path, self.path)
+        sync_directory(os.path.dirname(self.path))
+        self.open()
+
+
+class RegionStore:
+    def __init__(self, directory):
+        """
+        Chunk storage for one world, split into region files.
+        Safe to write from a background saver while the game reads chunks.
+        :param directory: World directory holding the region files.
+        """
+        self.directory = directory
+        self.regions = {}  # (rx, ry) -> RegionFile
+        self.lock = threading.Lock()
+
+    def region_path(self, rx, ry):
+        return os.path.join(self.directory, f"r.{rx}.{ry}.otr")
+
+    def get_region(self, rx, ry):
+        region = self.regions.get((rx, ry))
+        if region is None:
+            region = RegionFile(self.region_path(rx, ry))
+            self.regions[(rx, ry)] = region
+        return region
+
+    def read_chunk(self, cx, cy):
+        """Decode the chunk at a chunk coordinate, or return None if it isn't stored."""
+        rx, lx = divmod(cx, REGION_SIZE)
+        ry, ly = divmod(cy, REGION_SIZE)
+        with self.lock:
+            region = self.get_region(rx, ry)
+            if region.data is None:
+                return None
+            return region.read_chunk(lx, ly)
+
+    def write_chunks(self, chunks):
+        """
+        Store chunks, one append per region file.
+        :param chunks: Dict of (cx, cy) -> chunk tiles, or None to remove the chunk.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        by_region = {}
+        for (cx, cy), tiles in chunks.items():
+            rx, lx = divmod(cx, REGION_SIZE)
+            ry, ly = divmod(cy, REGION_SIZE)
+            payload = None if tiles is None else zlib.compress(tiles.tobytes())
+            by_region.setdefault((rx, ry), {})[(lx, ly)] = payload
+        with self.lock:
+            for (rx, ry), payloads in by_region.items():
+                self.get_region(rx, ry).write_payloads(payloads)
+
+    def region_coords(self):
+        """Get the (rx, ry) of every region file in the directory."""
+        if not os.path.isdir(self.directory):
+            return []
+        return [tuple(int(part) for part in name[2:-4].split("."))
+                for name in os.listdir(self.directory) if name.startswith("r.") and name.endswith(".otr")]
+
+    def chunk_coords(self):
+        """Get the (cx, cy) of every stored chunk."""
+        with self.lock:
+            return [(rx * REGION_SIZE + lx, ry * REGION_SIZE + ly)
+                    for rx, ry in self.region_coords() for lx, ly in self.get_region(rx, ry).chunk_coords()]
+
+    def clear(self):
+        """Delete every region file."""
+        self.close()
+        with self.lock:
+            for rx, ry in self.region_coords():
+                os.remove(self.region_path(rx, ry))
+
+    def close(self):
+        with self.lock:
+            for region in self.regions.values():
+                region.close()
+            self.regions = {}
@@ -0,0 +1,222 @@
+from collections import OrderedDict
+import numpy as np
+import pygame
+from world import CHUNK_SIZE, TILE_TYPES
+from assets import asset_manager, BLOCK_TEXTURES
+from profiler import profiled
+from lighting import MAX_LIGHT
+
+# Camera zooms the game steps through. A fixed, capped set keeps the number of baked tile sizes
+# and the size of each baked chunk surface bounded.
+ZOOM_LEVELS = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 2.5, 3.0, 4.0)
+
+
+class TileRenderer:
+    def __init__(self, world, block_textures=BLOCK_TEXTURES, max_cached_pixels=24 * (CHUNK_SIZE * 15) ** 2, max_zoom_levels=4,
+                 max_cached_sprites=32, light_map=None):
+        """
+        Draws the world from pre-baked chunk surfaces, at the size of the current zoom.
+        :param world: The world to draw. The renderer registers itself as one of its observers, to drop the surfaces
+                      of chunks that are unloaded.
+        :param block_textures: Block texture paths by block type.
+        :param max_cached_pixels: Pixel budget for baked chunk surfaces (chunks on screen are always kept).
+        :param max_zoom_levels: How many zoom levels of block texture atlases to keep.
+        :param max_cached_sprites: How many scaled sprite images to keep.
+        :param light_map: LightMap to darken the chunks with, if any.
+        """
+        self.world = world
+        self.block_textures = block_textures
+        self.max_cached_pixels = max_cached_pixels
+        self.max_zoom_levels = max_zoom_levels
+        self.max_cached_sprites = max_cached_sprites
+        self.cache = OrderedDict()  # (cx, cy, tile_size) -> (chunk, version, surface), least recently drawn first
+        self.cached_pixels = 0
+        self.atlases = OrderedDict()  # tile_size -> (block texture atlas, atlas area of each tile ID)
+        self.zoomed_sprites = OrderedDict()  # (id(image), width, height) -> (image, scaled image)
+        self.light_map = light_map
+        self.light_cache = OrderedDict()  # (cx, cy, tile_size) -> (light version, darkness overlay or None if fully lit)
+        self.light_pixels = 0
+        world.observers.append(self)
+
+    def tile_size_at(self, zoom):
+        """Get the on-screen tile size for a camera zoom."""
+        return max(1, round(self.world.tile_size * zoom))
+
+    def effective_zoom(self, zoom):
+        """Get the zoom the world is actually drawn at, snapped so tiles are a whole number of pixels."""
+        return self.tile_size_at(zoom) / self.world.tile_size
+
+    def atlas_at(self, tile_size):
+        """Get the block texture atlas for a tile size and the area of each tile ID in it."""
+        cached = self.atlases.get(tile_size)
+        if cached is None:
+            atlas = asset_manager.atlas(self.block_textures, tile_size)
+            cached = (atlas, [atlas.rects.get(tile_type) for tile_type in TILE_TYPES])
+            self.atlases[tile_size] = cached
+            if len(self.atlases) > self.max_zoom_levels:
+                self.atlases.popitem(last=False)
+        self.atlases.move_to_end(tile_size)
+        return cached
+
+    def bake_chunk(self, chunk, tile_size):
+        """
+        Draw every tile of a chunk onto its own transparent surface.
+        :param chunk: The chunk to bake.
+        :param tile_size: On-screen tile size to bake at.
+        """
+        atlas, areas = self.atlas_at(tile_size)
+        chunk_pixels = CHUNK_SIZE * tile_size
+        surface = pygame.Surface((chunk_pixels, chunk_pixels), pygame.SRCALPHA)
+        ys, xs = np.nonzero(chunk.tiles)
+        surface.blits([(atlas.surface, (lx * tile_size, ly * tile_size), areas[tile_id])
+                       for lx, ly, tile_id in zip(xs.tolist(), ys.tolist(), chunk.tiles[ys, xs].tolist())],
+                      doreturn=False)
+        return surface
+
+    def chunk_surface(self, chunk, tile_size):
+        """Get the baked surface of a chunk, re-baking it if its tiles changed."""
+        key = (chunk.cx, chunk.cy, tile_size)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] is chunk and cached[1] == chunk.version:
+            self.cache.move_to_end(key)
+            return cached[2]
+        if cached is not None:
+            self.cached_pixels -= cached[2].get_width() * cached[2].get_height()
+        surface = self.bake_chunk(chunk, tile_size)
+        self.cache[key] = (chunk, chunk.version, surface)
+        self.cache.move_to_end(key)
+        self.cached_pixels += surface.get_width() * surface.get_height()
+        return surface
+
+    def light_surface(self, cx, cy, tile_size):
+        """Get the darkness overlay of a chunk, rebuilding it if its light changed. None if the chunk is fully lit."""
+        key = (cx, cy, tile_size)
+        version = self.light_map.version(cx, cy)
+        cached = self.light_cache.get(key)
+        if cached is not None and cached[0] == version:
+            self.light_cache.move_to_end(key)
+            return cached[1]
+        if cached is not None and cached[1] is not None:
+            self.light_pixels -= cached[1].get_width() * cached[1].get_height()
+        darkness = (MAX_LIGHT - self.light_map.levels(cx, cy).astype(np.int32)) * 255 // MAX_LIGHT
+        surface = None
+        if darkness.any():
+            pixels = np.zeros((CHUNK_SIZE, CHUNK_SIZE, 4), dtype=np.uint8)  # Black, as transparent as the tile is lit
+            pixels[:, :, 3] = darkness
+            small = pygame.image.frombuffer(pixels.tobytes(), (CHUNK_SIZE, CHUNK_SIZE), "RGBA")
+            surface = asset_manager.convert(pygame.transform.scale(small, (CHUNK_SIZE * tile_size, CHUNK_SIZE * tile_size)))
+            self.light_pixels += surface.get_width() * surface.get_height()
+        self.light_cache[key] = (version, surface)
+        self.light_cache.move_to_end(key)
+        return surface
+
+    def trim_cache(self, keep):
+        """Drop the least recently drawn chunk surfaces and overlays until the caches fit their budget."""
+        while self.cached_pixels > self.max_cached_pixels:
+            key = next(iter(self.cache))
+            if key in keep:
+                break  # Everything older is on screen right now
+            chunk, version, surface = self.cache.pop(key)
+            self.cached_pixels -= surface.get_width() * surface.get_height()
+        while self.light_pixels > self.max_cached_pixels:
+            key = next(iter(self.light_cache))
+            if key in keep:
+                break
+            version, surface = self.light_cache.pop(key)
+            if surface is not None:
+                self.light_pixels -= surface.get_width() * surface.get_height()
+
+    @profiled("draw_tiles")
+    def draw(self, surface, origin_x, origin_y, zoom):
+        """
+        Blit the chunks that intersect the view.
+        :param surface: Surface to draw on, the size of the view.
+        :param origin_x: X of the view's top-left corner, in zoomed world pixels.
+        :param origin_y: Y of the view's top-left corner, in zoomed world pixels.
+        :param zoom: Camera zoom.
+        """
+        tile_size = self.tile_size_at(zoom)
+        chunk_pixels = CHUNK_SIZE * tile_size
+        width, height = surface.get_size()
+        drawn = set()
+        for cy in range(origin_y // chunk_pixels, (origin_y + height - 1) // chunk_pixels + 1):
+            for cx in range(origin_x // chunk_pixels, (origin_x + width - 1) // chunk_pixels + 1):
+                chunk = self.world.get_chunk(cx, cy)
+                if chunk is None:
+                    continue  # Nothing but air here
+                position = (cx * chunk_pixels - origin_x, cy * chunk_pixels - origin_y)
+                surface.blit(self.chunk_surface(chunk, tile_size), position)
+                if self.light_map is not None:
+                    overlay = self.light_surface(cx, cy, tile_size)
+                    if overlay is not None:
+                        surface.blit(overlay, position)
+                drawn.add((cx, cy, tile_size))
+        self.trim_cache(drawn)
+
+    def drop_chunks(self, keys):
+        """Drop the surfaces and overlays of some chunks, at every tile size."""
+        for key in [key for key in self.cache if key[:2] in keys]:
+            chunk, version, surface = self.cache.pop(key)
+            self.cached_pixels -= surface.get_width() * surface.get_height()
+        for key in [key for key in self.light_cache if key[:2] in keys]:
+            version, surface = self.light_cache.pop(key)
+            if surface is not None:
+                self.light_pixels -= surface.get_width() * surface.get_height()
+
+    def tile_changed(self, tx, ty, tile_id):
+        pass  # The chunk versions tell the cache what to bake again
+
+    def region_changed(self, first_tx, first_ty, last_tx, last_ty):
+        pass
+
+    def chunk_replaced(self, cx, cy):
+        pass  # A new chunk object, baked again when drawn
+
+    def world_cleared(self):
+        self.drop_chunks({key[:2] for key in list(self.cache) + list(self.light_cache)})
+
+    def chunks_unloaded(self, keys):
+        self.drop_chunks(set(keys))
+
+    def zoomed_sprite(self, image, zoom):
+        """Get an entity image scaled to an effective zoom, cached."""
+        if zoom == 1:
+            return image
+        width = max(1, round(image.get_width() * zoom))
+        height = max(1, round(image.get_height() * zoom))
+        key = (id(image), width, height)
+        cached = self.zoomed_sprites.get(key)
+        if cached is None or cached[0] is not image:
+            cached = (image, pygame.transform.scale(image, (width, height)))
+            self.zoomed_sprites[key] = cached
+            if len(self.zoomed_sprites) > self.max_cached_sprites:
+                self.zoomed_sprites.popitem(last=False)
+        self.zoomed_sprites.move_to_end(key)
+        return cached[1]
+
+    def draw_sprite(self, surface, image, x, y, origin_x, origin_y, zoom):
+        """
+        Blit an entity image scaled to the view's zoom.
+        :param surface: Surface to draw on.
+        :param image: Unscaled entity image.
+        :param x: Entity x in world pixels.
+        :param y: Entity y in world pixels.
+        :param origin_x: X of the view's top-left corner, in zoomed world pixels.
+        :param origin_y: Y of the view's top-left corner, in zoomed world pixels.
+        :param zoom: Camera zoom.
+        """
+        zoom = self.effective_zoom(zoom)
+        image = self.zoomed_sprite(image, zoom)
+        surface.blit(image, (round(x * zoom) - origin_x, round(y * zoom) - origin_y))
+
+    def draw_sprites(self, surface, image, xs, ys, origin_x, origin_y, zoom):
+        """
+        Blit the same entity image at many positions with one call, see draw_sprite.
+        :param xs: NumPy array of entity x in world pixels.
+        :param ys: NumPy array of entity y in world pixels.
+        """
+        zoom = self.effective_zoom(zoom)
+        image = self.zoomed_sprite(image, zoom)
+        screen_xs = (np.round(xs * zoom) - origin_x).astype(int).tolist()
+        screen_ys = (np.round(ys * zoom) - origin_y).astype(int).tolist()
+        surface.blits([(image, position) for position in zip(screen_xs, screen_ys)], doreturn=False)
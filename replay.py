@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+import numpy as np
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"  # Its banner would go to stdout, in front of the JSON
+import pygame
+from controls import ScriptedInput
+
+# A recording is a header followed by the zlib-compressed input of every tick
+RECORDING_MAGIC = b"OTRP"
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct("<4sHQI32s")  # magic, version, RNG seed, tick count, state hash after the last tick
+TICK_RECORD = struct.Struct("<IhhH")  # held key bits, mouse x, mouse y, event count
+EVENT_RECORD = struct.Struct("<Biii")  # event kind, then up to three values
+
+# Keys the game reads the held state of, bit i of a tick record is TRACKED_KEYS[i]
+TRACKED_KEYS = [pygame.K_a, pygame.K_d, pygame.K_SPACE, pygame.K_g, pygame.K_h, pygame.K_k, pygame.K_l,
+                pygame.K_LCTRL, pygame.K_EQUALS, pygame.K_MINUS]
+
+# Kinds of the events the game handles, other events don't change the game and aren't recorded
+MOUSE_BUTTON_DOWN = 0  # x, y, button
+MOUSE_WHEEL = 1  # y
+KEY_DOWN = 2  # key
+
+
+def encode_event(event):
+    """Get the record of an event, or None if the game ignores it."""
+    if event.type == pygame.MOUSEBUTTONDOWN:
+        return EVENT_RECORD.pack(MOUSE_BUTTON_DOWN, event.pos[0], event.pos[1], event.button)
+    if event.type == pygame.MOUSEWHEEL:
+        return EVENT_RECORD.pack(MOUSE_WHEEL, event.y, 0, 0)
+    if event.type == pygame.KEYDOWN:
+        return EVENT_RECORD.pack(KEY_DOWN, event.key, 0, 0)
+    return None
+
+
+def decode_event(kind, a, b, c):
+    if kind == MOUSE_BUTTON_DOWN:
+        return pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(a, b), button=c)
+    if kind == MOUSE_WHEEL:
+        return pygame.event.Event(pygame.MOUSEWHEEL, x=0, y=a)
+    return pygame.event.Event(pygame.KEYDOWN, key=a)
+
+
+def state_hash(game):
+    """
+    Hash everything the simulation changes: the player, the mobs and the chunks whose tiles differ from the
+    generated ones. Which other chunks happen to be in memory depends on drawing and streaming, not on
+    the simulation, so they are left out. Two runs that end with the same hash ended in the same state.
+    :return: SHA-256 digest, 32 bytes.
+    """
+    digest = hashlib.sha256()
+    player = [game.ticks, game.player_x, game.player_y, game.player_velocity_y, game.player_jumping,
+              game.player_jumpback, game.health, list(game.spawn_point), game.current_block_type_index,
+              game.camera_zoom, game.attack_cooldown, game.touch_mode, game.respawn_ticks, game.invulnerable_ticks]
+    digest.update(json.dumps(player).encode())
+    for name in game.mobs.FIELDS:
+        digest.update(getattr(game.mobs, name)[:game.mobs.count].tobytes())
+    for key, tiles in changed_chunks(game.world):
+        digest.update(struct.pack("<ii", *key))
+        digest.update(tiles.tobytes())
+    return digest.digest()
+
+
+def changed_chunks(world):
+    """
+    Get the chunks whose tiles differ from what the world's generator makes, loaded or unloaded but unsaved.
+    :return: Sorted list of ((cx, cy), tiles).
+    """
+    chunks = dict(world.saving)
+    chunks.update(world.evicted)
+    chunks.update((key, chunk.tiles) for key, chunk in world.chunks.items())
+    changed = []
+    for key in sorted(chunks):
+        generated = world.generator(*key) if world.generator is not None else None
+        if generated is None:
+            generated = np.zeros_like(chunks[key])  # All air
+        if not np.array_equal(chunks[key], generated):
+            changed.append((key, chunks[key]))
+    return changed
+
+
+def prepare_session(game):
+    """Start a game the way every recorded session starts: on a fresh world from its seed, never saved."""
+    game.save_path = None
+    game.generate_world()
+
+
+class InputRecorder:
+    def __init__(self, rng_seed):
+        """
+        Logs the input of every tick, compact enough to keep whole play sessions.
+        :param rng_seed: RNG seed of the game being recorded.
+        """
+        self.rng_seed = rng_seed
+        self.data = bytearray()
+        self.ticks = 0
+
+    def record(self, events, input):
+        """Add one tick, called by Game.update with the tick's events and input."""
+        pressed = input.get_pressed()
+        keys = 0
+        for bit, key in enumerate(TRACKED_KEYS):
+            if pressed[key]:
+                keys |= 1 << bit
+        mouse_x, mouse_y = input.get_mouse_pos()
+        records = [record for record in map(encode_event, events) if record is not None]
+        self.data += TICK_RECORD.pack(keys, mouse_x, mouse_y, len(records))
+        self.data += b"".join(records)
+        self.ticks += 1
+
+    def save(self, path, game):
+        """Write the recording, with the game's state hash to check replays against."""
+        with open(path, "wb") as file:
+            file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, self.rng_seed, self.ticks,
+                                             state_hash(game)))
+            file.write(zlib.compress(bytes(self.data), 9))
+
+
+class Recording:
+    def __init__(self, path):
+        """
+        A recorded session, read from a file.
+        :param path: File written by InputRecorder.save.
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, self.rng_seed, tick_count, self.state_hash = RECORDING_HEADER.unpack_from(data)
+        if magic != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not a recording")
+        if version > RECORDING_VERSION:
+            raise ValueError(f"Recording format {version} is newer than this game")
+        body = zlib.decompress(data[RECORDING_HEADER.size:])
+        self.ticks = []  # (held keys, mouse position, events) of every tick
+        offset = 0
+        for _ in range(tick_count):
+            keys, mouse_x, mouse_y, event_count = TICK_RECORD.unpack_from(body, offset)
+            offset += TICK_RECORD.size
+            events = []
+            for _ in range(event_count):
+                events.append(decode_event(*EVENT_RECORD.unpack_from(body, offset)))
+                offset += EVENT_RECORD.size
+            held = {key for bit, key in enumerate(TRACKED_KEYS) if keys & 1 << bit}
+            self.ticks.append((held, (mouse_x, mouse_y), events))
+
+
+def replay(recording, screen, draw=False):
+    """
+    Run a recorded session again as fast as possible.
+    :param recording: The Recording.
+    :param screen: Surface to draw on.
+    :param draw: Draw a frame after every tick, to time the drawing too.
+    :return: (game at the end, seconds taken by each tick)
+    """
+    from game import Game
+
+    input = ScriptedInput()
+    game = Game(screen, input, recording.rng_seed)
+    prepare_session(game)
+    tick_times = []
+    for held, mouse_pos, events in recording.ticks:
+        input.keys = set(held)
+        input.mouse_pos = mouse_pos
+        start = time.perf_counter()
+        game.update(events)
+        if draw:
+            game.draw_game()
+        tick_times.append(time.perf_counter() - start)
+    return game, tick_times
+
+
+def main():
+    from benchmark import summarize
+    from headless import init_headless
+
+    parser = argparse.ArgumentParser(description="Replay a recorded session without a display, timing every tick.")
+    parser.add_argument("recording", help="File recorded with main.py --record")
+    parser.add_argument("--repeat", type=int, default=1, help="Times to replay it, the timings of all runs are kept")
+    parser.add_argument("--draw", action="store_true", help="Draw a frame after every tick")
+    parser.add_argument("--out", default=None, help="JSON file to write, stdout if omitted")
+    args = parser.parse_args()
+
+    recording_path = os.path.abspath(args.recording)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))  # Assets are loaded relative to the repository
+    screen = init_headless()
+    recording = Recording(recording_path)
+    tick_times = []
+    matches = True
+    for run in range(args.repeat):
+        game, times = replay(recording, screen, args.draw)
+        tick_times += times
+        if state_hash(game) != recording.state_hash:
+            matches = False
+            print(f"Run {run + 1}: the state differs from the recorded one", file=sys.stderr)
+
+    report = {
+        "recording": args.recording,
+        "ticks": len(recording.ticks),
+        "runs": args.repeat,
+        "draw": args.draw,
+        "state_matches": matches,
+        "tick": summarize(tick_times)
+    }
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    pygame.quit()
+    sys.exit(0 if matches else 1)
+
+
+if __name__ == "__main__":
+    main()
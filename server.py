@@ -0,0 +1,535 @@
+import argparse
+import asyncio
+import os
+import random
+import struct
+import time
+from collections import deque
+import numpy as np
+import pygame
+import worldgen
+from world import World, CHUNK_SIZE, TILE_TYPES
+from heightmap import Heightmap
+from streaming import ChunkStreamer
+from automaton import TileAutomaton
+from navigation import PathFinder
+from mob_engine import MobEngine, rect_pixels
+from mobs import SLIME
+from region import RegionStore, read_level, write_level
+from autosave import AutoSaver, EditJournal, JOURNAL_FILE
+from timestep import TICK_RATE
+from global_settings import max_loaded_chunks
+from protocol import (HEADER, PROTOCOL_VERSION, HELLO, INPUT, EDIT, WELCOME, TILES, ENTITY_ADD, ENTITY_MOVE,
+                      ENTITY_REMOVE, HELLO_MESSAGE, WELCOME_MESSAGE, INPUT_MESSAGE, EDIT_MESSAGE, KEY_LEFT, KEY_RIGHT,
+                      KEY_JUMP, PLAYER, MOB, TILE_RECORD, ENTITY_ADD_RECORD, ENTITY_MOVE_RECORD, ENTITY_REMOVE_RECORD,
+                      VIEW_RADIUS, ProtocolError, encode, read_message, encode_records, encode_chunk)
+
+DEFAULT_PORT = 5000
+
+# The single player game's world and player settings
+TILE_SIZE = 15
+GROUND_LEVEL = (600 - TILE_SIZE) // TILE_SIZE  # Bottom of the game's screen, in tiles
+WORLD_SCALE = 24.0
+PLAYER_WIDTH = 30
+PLAYER_HEIGHT = 46
+PLAYER_SPEED = 5
+PLAYER_JUMP_POWER = 15
+PLAYER_GRAVITY = 1
+PLAYER_REACH = 10 * TILE_SIZE  # How far from the player tiles can be edited
+MAX_REGION_TILES = CHUNK_SIZE * CHUNK_SIZE // 4  # Bulk edits up to this many tiles are sent as tiles, not chunks
+
+
+class RemotePlayer:
+    def __init__(self, player_id, writer, x, y):
+        """
+        A connected player, moved by the server from the keys its client holds.
+        :param player_id: ID of the player, unique for the lifetime of the server.
+        :param writer: asyncio stream to the client.
+        :param x: Spawn x in pixels.
+        :param y: Spawn y in pixels.
+        """
+        self.player_id = player_id
+        self.writer = writer
+        self.x = x
+        self.y = y
+        self.velocity_y = 0
+        self.jumping = False
+        self.keys = 0  # KEY_ bits of the last INPUT
+        self.edits = []  # Requested (tile x, tile y, tile ID), applied on the next tick
+        self.chunks = set()  # Chunks the client was sent and gets tile edits for
+        self.synced_view = None  # View whose chunks the client all has, None when it needs checking
+        # Entities the client knows about, as sorted keys (see entity_keys) and the positions it last got
+        self.seen_keys = np.zeros(0, dtype=np.int64)
+        self.seen_x = np.zeros(0, dtype=np.int64)
+        self.seen_y = np.zeros(0, dtype=np.int64)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def send(self, data):
+        self.writer.write(data)
+        self.bytes_sent += len(data)
+
+    def move(self, world, floor):
+        """Move by one tick, with the movement rules of Game.update_player."""
+        if self.keys & KEY_LEFT:
+            self.x -= PLAYER_SPEED
+        if self.keys & KEY_RIGHT:
+            self.x += PLAYER_SPEED
+        if self.keys & KEY_JUMP and self.velocity_y == 0 and not self.jumping:
+            self.velocity_y = -PLAYER_JUMP_POWER
+            self.jumping = True
+        if self.velocity_y < 10:
+            self.velocity_y += PLAYER_GRAVITY
+        self.y += self.velocity_y
+
+        player_rect = pygame.Rect(self.x, self.y, PLAYER_WIDTH, PLAYER_HEIGHT)
+        for block_rect in world.solid_rects(player_rect):
+            if player_rect.colliderect(block_rect):
+                if self.velocity_y > 0:  # Colliding from above
+                    self.y = block_rect.top - PLAYER_HEIGHT
+                    self.velocity_y = 0
+                elif self.velocity_y < 0:  # Colliding from below
+                    self.y = block_rect.bottom
+                    self.velocity_y = 0
+        if self.y + PLAYER_HEIGHT > floor:
+            self.y = floor - PLAYER_HEIGHT
+            self.velocity_y = 0
+        if self.velocity_y == 0:
+            self.jumping = False  # Landed
+
+
+def sorted_lookup(sorted_keys, keys):
+    """
+    Find keys in a sorted array.
+    :return: (positions, found), positions are only meaningful where found is True.
+    """
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return positions, sorted_keys[positions] == keys
+
+
+def entity_keys(kind, entity_ids):
+    """Combine entity kinds and IDs into one sortable key."""
+    return (np.int64(kind) << 40) | np.asarray(entity_ids, dtype=np.int64)
+
+
+class GameServer:
+    def __init__(self, world, heightmap, floor, tick_rate=TICK_RATE, view_radius=VIEW_RADIUS, chunks_per_tick=4,
+                 max_mobs=50, spawn_interval=5 * TICK_RATE, max_buffered=1 << 20, max_loaded_chunks=max_loaded_chunks):
+        """
+        The authoritative game for any number of clients, ticked at a fixed rate on an asyncio loop.
+        Clients send the keys they hold and the tiles they want to change. Every tick the server moves the
+        players and mobs, then sends each client only what changed around its player: chunks that came into
+        view, tile edits and entity position deltas.
+        :param world: The world the server owns. The server registers itself as one of its observers.
+        :param heightmap: Heightmap of the world, for putting players and mobs on the ground.
+        :param floor: Pixel row players can't fall below.
+        :param tick_rate: Simulation ticks per second.
+        :param view_radius: Chunks around its player's chunk a client is sent, horizontally and vertically.
+                            Clients assume VIEW_RADIUS when they drop the chunks they no longer need.
+        :param chunks_per_tick: Chunks sent to a client per tick after the view it joined with.
+        :param max_mobs: Mob count above which no more are spawned.
+        :param spawn_interval: Ticks between mob spawns.
+        :param max_buffered: Bytes a client can fall behind on before it is disconnected.
+        :param max_loaded_chunks: Memory cap, in chunks. Chunks outside every player's view are evicted first.
+        """
+        self.world = world
+        self.heightmap = heightmap
+        self.floor = floor
+        self.tick_rate = tick_rate
+        self.tick_time = 1.0 / tick_rate
+        self.view_radius = view_radius
+        self.chunks_per_tick = chunks_per_tick
+        self.max_mobs = max_mobs
+        self.spawn_interval = spawn_interval
+        self.max_buffered = max_buffered
+        self.mobs = MobEngine(world)
+        self.pathfinder = PathFinder(world)
+        self.tile_automaton = TileAutomaton(world, heightmap.bottom)  # Its moves reach the clients as chunk updates
+        self.streamer = ChunkStreamer(world, max_loaded_chunks)
+        self.autosaver = AutoSaver()  # Writes the modified chunks the streamer unloads
+        self.players = {}  # Player ID -> RemotePlayer
+        self.next_player_id = 1
+        self.ticks = 0
+        self.edits = []  # (tile x, tile y, tile ID) of the tiles changed this tick
+        self.region_edits = []  # TILE_RECORD arrays of the small bulk edits this tick, see region_changed
+        self.tick_times = deque(maxlen=600 * tick_rate)  # Seconds spent in each of the latest ticks
+        self.running = False
+        world.observers.append(self)
+
+    def spawn_position(self):
+        """Get where new players appear, on the ground at the single player game's start."""
+        x = 800 // 2 - PLAYER_WIDTH // 2
+        surface_y = self.heightmap.surface_y((x + PLAYER_WIDTH // 2) // TILE_SIZE)
+        y = 0 if surface_y is None else surface_y * TILE_SIZE - PLAYER_HEIGHT
+        return x, y
+
+    async def handle_client(self, reader, writer):
+        """Serve one connection, from its HELLO until it closes."""
+        player = None
+        try:
+            message_type, payload = await read_message(reader)
+            if message_type != HELLO or HELLO_MESSAGE.unpack(payload)[0] != PROTOCOL_VERSION:
+                raise ProtocolError("Expected a HELLO of this protocol version")
+            player = RemotePlayer(self.next_player_id, writer, *self.spawn_position())
+            self.next_player_id += 1
+            self.players[player.player_id] = player
+            player.send(encode(WELCOME, WELCOME_MESSAGE.pack(player.player_id, self.tick_rate)))
+            self.send_chunks(player, limit=None)  # The whole view right away
+            while True:
+                message_type, payload = await read_message(reader)
+                player.bytes_received += HEADER.size + len(payload)
+                if message_type == INPUT:
+                    player.keys = INPUT_MESSAGE.unpack(payload)[0]
+                elif message_type == EDIT:
+                    player.edits.append(EDIT_MESSAGE.unpack(payload))
+                else:
+                    raise ProtocolError(f"Unexpected message type {message_type}")
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError, struct.error):
+            pass  # Disconnected, or sent something this server doesn't understand
+        finally:
+            if player is not None:
+                self.players.pop(player.player_id, None)
+            writer.close()
+
+    async def start(self, host, port):
+        """
+        Start accepting clients.
+        :return: The asyncio server, its sockets have the address actually bound.
+        """
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def run(self):
+        """Tick at the tick rate until stop is called, skipping ticks rather than falling further behind."""
+        loop = asyncio.get_running_loop()
+        self.running = True
+        next_tick = loop.time()
+        while self.running:
+            start = time.perf_counter()
+            self.tick()
+            self.tick_times.append(time.perf_counter() - start)
+            next_tick += self.tick_time
+            delay = next_tick - loop.time()
+            if delay < -5 * self.tick_time:
+                next_tick = loop.time()  # Too far behind to catch up
+            await asyncio.sleep(max(0.0, delay))
+
+    def stop(self):
+        self.running = False
+
+    def tick(self):
+        """Advance the game by one tick and send every client its updates."""
+        self.ticks += 1
+        self.edits = []
+        self.region_edits = []
+        self.apply_edits()
+        self.tile_automaton.step()
+        for player in self.players.values():
+            player.move(self.world, self.floor)
+        self.update_mobs()
+
+        keys, type_ids, xs, ys = self.entities()
+        tiles = None
+        if self.edits or self.region_edits:
+            tiles = np.concatenate([np.array(self.edits, dtype=TILE_RECORD)] + self.region_edits)
+        for player in list(self.players.values()):
+            self.send_chunks(player, self.chunks_per_tick)
+            if tiles is not None:
+                self.send_tiles(player, tiles)
+            self.send_entities(player, keys, type_ids, xs, ys)
+            if player.writer.transport.get_write_buffer_size() > self.max_buffered:
+                player.writer.close()  # Can't keep up, handle_client drops it
+                del self.players[player.player_id]
+        self.streamer.keep([self.kept_chunks(player) for player in self.players.values()])
+        self.save_evicted()
+
+    def save_evicted(self):
+        """Write the modified chunks that were unloaded to the store, on the autosaver's thread."""
+        job = self.autosaver.poll()
+        if job is not None:
+            self.handle_saved(job)
+        if self.world.evicted and self.world.store is not None and not self.autosaver.busy():
+            self.autosaver.start(self.world.store, self.world.take_evicted(), None)
+
+    def finish_saving(self):
+        """Wait for the unloaded chunks being written, before the world is saved as a whole."""
+        self.autosaver.wait()
+        job = self.autosaver.poll()
+        if job is not None:
+            self.handle_saved(job)
+
+    def handle_saved(self, job):
+        store, snapshot, level_data, error = job
+        if error is not None:
+            print(f"Writing unloaded chunks failed: {error}")
+            self.world.mark_unsaved(snapshot)  # Tried again with the next ones
+        else:
+            self.world.saved()
+
+    def apply_edits(self):
+        """Apply the tile edits clients asked for, within their player's reach."""
+        for player in self.players.values():
+            for tile_x, tile_y, tile_id in player.edits:
+                center_x = (tile_x + 0.5) * TILE_SIZE
+                center_y = (tile_y + 0.5) * TILE_SIZE
+                if tile_id < len(TILE_TYPES) and abs(center_x - player.x) <= PLAYER_REACH \
+                        and abs(center_y - player.y) <= PLAYER_REACH:
+                    self.world.set_tile(tile_x, tile_y, tile_id)  # Reported back through tile_changed
+            player.edits = []
+
+    def update_mobs(self):
+        """Move the mobs, chasing the players near them, drop the ones far from every player and spawn new ones."""
+        if not self.players:
+            self.mobs.remove(np.ones(self.mobs.count, dtype=bool))
+            return
+        player_x = np.array([player.x for player in self.players.values()], dtype=np.float64)
+        player_y = np.array([player.y for player in self.players.values()], dtype=np.float64)
+        self.pathfinder.steer(self.mobs, player_x + PLAYER_WIDTH / 2, player_y + PLAYER_HEIGHT - 1)
+        self.pathfinder.update()
+        self.mobs.update()
+        reach = (self.view_radius[0] + 1) * CHUNK_SIZE * TILE_SIZE
+        distance = np.abs(self.mobs.x[:self.mobs.count, None] - player_x[None, :]).min(axis=1)
+        self.mobs.remove(distance > reach)
+
+        if self.ticks % self.spawn_interval == 0 and self.mobs.count < self.max_mobs:
+            players = list(self.players.values())
+            player = players[self.ticks // self.spawn_interval % len(players)]
+            spawn_x = int(player.x) + int(self.mobs.rng.integers(-200, 201))
+            surface_y = self.heightmap.surface_y((spawn_x + SLIME.size // 2) // TILE_SIZE)
+            if surface_y is not None:
+                self.mobs.spawn(SLIME, spawn_x, surface_y * TILE_SIZE - SLIME.size)
+
+    def entities(self):
+        """
+        Get every player and mob, sorted by key.
+        :return: (keys, type IDs, x, y), positions in whole pixels.
+        """
+        n = self.mobs.count
+        players = list(self.players.values())
+        keys = np.concatenate([entity_keys(PLAYER, [player.player_id for player in players]),
+                               entity_keys(MOB, self.mobs.mob_id[:n])])
+        type_ids = np.concatenate([np.zeros(len(players), dtype=np.int64), self.mobs.type_id[:n]])
+        xs = np.concatenate([rect_pixels(np.array([player.x for player in players], dtype=np.float64)),
+                             rect_pixels(self.mobs.x[:n])])
+        ys = np.concatenate([rect_pixels(np.array([player.y for player in players], dtype=np.float64)),
+                             rect_pixels(self.mobs.y[:n])])
+        order = np.argsort(keys)
+        return keys[order], type_ids[order], xs[order], ys[order]
+
+    def view_chunks(self, player):
+        """Get the first and last chunk x and y of a player's view."""
+        cx = int(player.x) // (CHUNK_SIZE * TILE_SIZE)
+        cy = int(player.y) // (CHUNK_SIZE * TILE_SIZE)
+        radius_x, radius_y = self.view_radius
+        return cx - radius_x, cy - radius_y, cx + radius_x, cy + radius_y
+
+    def kept_chunks(self, player):
+        """Get the first and last chunk x and y of the chunks a player's client may have, its view plus one."""
+        first_cx, first_cy, last_cx, last_cy = self.view_chunks(player)
+        return first_cx - 1, first_cy - 1, last_cx + 1, last_cy + 1
+
+    def send_chunks(self, player, limit):
+        """
+        Send the chunks of a player's view its client doesn't have yet, nearest first.
+        Chunks well outside the view are forgotten, and sent again in full if they come back into view.
+        :param limit: Most chunks to send, None for all of them.
+        """
+        view = self.view_chunks(player)
+        if view == player.synced_view:
+            return
+        first_cx, first_cy, last_cx, last_cy = self.kept_chunks(player)
+        player.chunks = {(cx, cy) for cx, cy in player.chunks
+                         if first_cx <= cx <= last_cx and first_cy <= cy <= last_cy}
+        first_cx, first_cy, last_cx, last_cy = view
+        center_cx, center_cy = (first_cx + last_cx) // 2, (first_cy + last_cy) // 2
+        missing = sorted(((cx, cy) for cx in range(first_cx, last_cx + 1) for cy in range(first_cy, last_cy + 1)
+                          if (cx, cy) not in player.chunks),
+                         key=lambda key: abs(key[0] - center_cx) + abs(key[1] - center_cy))
+        for cx, cy in missing[:limit]:
+            chunk = self.world.get_chunk(cx, cy)
+            tiles = chunk.tiles if chunk is not None else np.zeros((CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint8)
+            player.send(encode_chunk(cx, cy, tiles))
+            player.chunks.add((cx, cy))
+        if limit is None or len(missing) <= limit:
+            player.synced_view = view
+
+    def send_tiles(self, player, tiles):
+        """Send the tiles changed this tick in the chunks a client has."""
+        chunk_keys = zip((tiles["tile_x"] // CHUNK_SIZE).tolist(), (tiles["tile_y"] // CHUNK_SIZE).tolist())
+        known = np.array([key in player.chunks for key in chunk_keys])
+        if known.any():
+            player.send(encode_records(TILES, tiles[known]))
+
+    def send_entities(self, player, keys, type_ids, xs, ys):
+        """
+        Send the entity changes in a player's view since its last update: entities that came into view
+        with their full position, moves as small deltas, and the ones that left the view.
+        """
+        first_cx, first_cy, last_cx, last_cy = self.view_chunks(player)
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        visible = (xs >= first_cx * chunk_pixels) & (xs < (last_cx + 1) * chunk_pixels) & \
+                  (ys >= first_cy * chunk_pixels) & (ys < (last_cy + 1) * chunk_pixels)
+        keys, type_ids, xs, ys = keys[visible], type_ids[visible], xs[visible], ys[visible]
+
+        if len(keys) == 0 and len(player.seen_keys) == 0:
+            return
+
+        # Match the visible entities with the ones the client has, both sorted by key
+        positions, known = sorted_lookup(player.seen_keys, keys)
+        if len(player.seen_keys):
+            dx = xs - player.seen_x[positions]
+            dy = ys - player.seen_y[positions]
+        else:
+            dx = dy = np.zeros(len(keys), dtype=np.int64)
+        fits = (np.abs(dx) < 1 << 15) & (np.abs(dy) < 1 << 15)
+        added = ~known | ~fits  # A jump too big for a delta is sent as a new position
+        moved = known & fits & ((dx != 0) | (dy != 0))
+        removed = ~sorted_lookup(keys, player.seen_keys)[1]
+
+        if removed.any():
+            gone = player.seen_keys[removed]
+            records = np.zeros(len(gone), dtype=ENTITY_REMOVE_RECORD)
+            records["kind"] = gone >> 40
+            records["entity_id"] = gone & ((1 << 40) - 1)
+            player.send(encode_records(ENTITY_REMOVE, records))
+        if added.any():
+            records = np.zeros(int(added.sum()), dtype=ENTITY_ADD_RECORD)
+            records["kind"] = keys[added] >> 40
+            records["type_id"] = type_ids[added]
+            records["entity_id"] = keys[added] & ((1 << 40) - 1)
+            records["x"] = xs[added]
+            records["y"] = ys[added]
+            player.send(encode_records(ENTITY_ADD, records))
+        if moved.any():
+            records = np.zeros(int(moved.sum()), dtype=ENTITY_MOVE_RECORD)
+            records["kind"] = keys[moved] >> 40
+            records["entity_id"] = keys[moved] & ((1 << 40) - 1)
+            records["dx"] = dx[moved]
+            records["dy"] = dy[moved]
+            player.send(encode_records(ENTITY_MOVE, records))
+        player.seen_keys, player.seen_x, player.seen_y = keys, xs, ys
+
+    def tile_changed(self, tx, ty, tile_id):
+        self.edits.append((tx, ty, tile_id))
+
+    def region_changed(self, first_tx, first_ty, last_tx, last_ty):
+        # A few tiles, e.g. sand and water the automaton moved, go out with this tick's edits
+        if (last_tx - first_tx) * (last_ty - first_ty) <= MAX_REGION_TILES:
+            tys, txs = np.mgrid[first_ty:last_ty, first_tx:last_tx]
+            records = np.zeros(txs.size, dtype=TILE_RECORD)
+            records["tile_x"] = txs.ravel()
+            records["tile_y"] = tys.ravel()
+            records["tile_id"] = self.world.copy_region(first_tx, first_ty, last_tx, last_ty).ravel()
+            self.region_edits.append(records)
+            return
+        # Too many tiles for an edit list, the clients get the chunks again instead
+        first_cx, first_cy = first_tx // CHUNK_SIZE, first_ty // CHUNK_SIZE
+        last_cx, last_cy = (last_tx - 1) // CHUNK_SIZE, (last_ty - 1) // CHUNK_SIZE
+        for player in self.players.values():
+            player.chunks = {(cx, cy) for cx, cy in player.chunks
+                             if not (first_cx <= cx <= last_cx and first_cy <= cy <= last_cy)}
+            player.synced_view = None
+
+    def chunk_replaced(self, cx, cy):
+        for player in self.players.values():
+            player.chunks.discard((cx, cy))
+            player.synced_view = None
+
+    def world_cleared(self):
+        for player in self.players.values():
+            player.chunks = set()
+            player.synced_view = None
+
+    def chunks_unloaded(self, keys):
+        pass  # Only chunks outside every client's kept area are unloaded, see kept_chunks
+
+
+def create_server(seed=None, path=None, **options):
+    """
+    Build a server on a new endless world, or on a saved one.
+    :param seed: World seed of a new world, random if None.
+    :param path: World directory to load from if it has a save.
+    :param options: GameServer settings.
+    :return: (server, seed)
+    """
+    world = World(TILE_SIZE)
+    level_data = read_level(path) if path is not None else None
+    if level_data is not None:
+        seed = level_data["seed"]
+    elif seed is None:
+        seed = random.randint(0, 1000)
+    generator = None
+    if level_data is None or level_data.get("endless", True):
+        generator = worldgen.ChunkGenerator(seed, WORLD_SCALE, GROUND_LEVEL)
+    store = RegionStore(path) if path is not None else None
+    if store is not None and level_data is None:
+        store.clear()  # Region files without a level file are from a first save that never finished
+    world.clear(store, generator)  # Modified chunks are written to the store as they are unloaded
+    journal_path = os.path.join(path, JOURNAL_FILE) if level_data is not None else None
+    if journal_path is not None and os.path.exists(journal_path):
+        # Edits the single player game journaled but hadn't saved yet, like Game.load_game
+        journal = EditJournal(journal_path, level_data.get("journal_seq", 0))
+        journal.replay(world, level_data.get("journal_seq", 0))
+        journal.close()
+    heightmap = Heightmap(world, GROUND_LEVEL - 2 * worldgen.MAX_TERRAIN_HEIGHT, GROUND_LEVEL)
+    return GameServer(world, heightmap, (GROUND_LEVEL + 1) * TILE_SIZE, **options), seed
+
+
+def save_world(server, path, seed):
+    """
+    Save the server's world so the single player game can load it too.
+    The single player journal's edits are in the saved tiles now, so the level records its last edit number and the
+    journal is emptied. Otherwise loading would apply the old edits again over the server's changes.
+    """
+    server.finish_saving()
+    store = server.world.store if server.world.store is not None else RegionStore(path)
+    server.world.save(store)
+    spawn_x, spawn_y = server.spawn_position()
+    journal_seq = 0
+    journal_path = os.path.join(path, JOURNAL_FILE)
+    journal = EditJournal(journal_path) if os.path.exists(journal_path) else None
+    if journal is not None:
+        journal_seq = journal.seq
+    write_level(path, {
+        "seed": seed,
+        "endless": server.world.generator is not None,
+        "player_x": spawn_x,
+        "player_y": spawn_y,
+        "health": 100,
+        "spawn_point": (spawn_x, spawn_y),
+        "journal_seq": journal_seq
+    })
+    if journal is not None:
+        journal.discard_through(journal_seq)
+        journal.close()
+
+
+async def serve(server, host, port):
+    listener = await server.start(host, port)
+    print(f"Serving on {host}:{listener.sockets[0].getsockname()[1]}")
+    async with listener:
+        await server.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a multiplayer server without a display.")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of a new world, random if omitted")
+    parser.add_argument("--world", default=None, help="World directory to load and to save to on exit")
+    args = parser.parse_args()
+
+    server, seed = create_server(args.seed, args.world)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.world is not None:
+            save_world(server, args.world, seed)
+            print(f"World saved to {args.world}")
+
+
+if __name__ == "__main__":
+    main()
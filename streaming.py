@@ -0,0 +1,83 @@
+from world import CHUNK_SIZE
+from profiler import profiled
+
+
+class ChunkStreamer:
+    def __init__(self, world, max_loaded_chunks, keep_radius=(3, 2), prefetch_distance=3, loads_per_update=2):
+        """
+        Keeps the chunks around the player in memory and evicts the ones that haven't been near it for longest.
+        :param world: The world to stream.
+        :param max_loaded_chunks: Memory cap, in chunks (known all-air chunks count too).
+        :param keep_radius: Chunks kept loaded around the player horizontally and vertically.
+        :param prefetch_distance: How many chunks past the kept area to load in the direction of movement.
+        :param loads_per_update: Most chunks loaded or generated ahead of time per update.
+        """
+        self.world = world
+        self.max_loaded_chunks = max_loaded_chunks
+        self.keep_radius = keep_radius
+        self.prefetch_distance = prefetch_distance
+        self.loads_per_update = loads_per_update
+        self.last_used = {}  # (cx, cy) -> update count when the chunk was last near the player
+        self.updates = 0
+
+    @profiled("stream_chunks")
+    def update(self, x, y, velocity_x, velocity_y):
+        """
+        Load the chunks around and ahead of the player and evict far ones if over the memory cap.
+        :param x: Player x in pixels.
+        :param y: Player y in pixels.
+        :param velocity_x: Player horizontal movement, only its sign is used.
+        :param velocity_y: Player vertical movement, only its sign is used.
+        """
+        self.updates += 1
+        chunk_pixels = CHUNK_SIZE * self.world.tile_size
+        center_cx = int(x) // chunk_pixels
+        center_cy = int(y) // chunk_pixels
+        radius_x, radius_y = self.keep_radius
+
+        # The area around the player, then the area ahead of it
+        wanted = [(cx, cy) for cy in range(center_cy - radius_y, center_cy + radius_y + 1)
+                  for cx in range(center_cx - radius_x, center_cx + radius_x + 1)]
+        step_x = (velocity_x > 0) - (velocity_x < 0)
+        step_y = (velocity_y > 0) - (velocity_y < 0)
+        for distance in range(1, self.prefetch_distance + 1):
+            if step_x:
+                edge_cx = center_cx + step_x * (radius_x + distance)
+                wanted.extend((edge_cx, cy) for cy in range(center_cy - radius_y, center_cy + radius_y + 1))
+            if step_y:
+                edge_cy = center_cy + step_y * (radius_y + distance)
+                wanted.extend((cx, edge_cy) for cx in range(center_cx - radius_x, center_cx + radius_x + 1))
+
+        loads = 0
+        for key in wanted:
+            self.last_used[key] = self.updates
+            if loads < self.loads_per_update and key not in self.world.chunks and key not in self.world.absent:
+                self.world.get_chunk(*key)
+                loads += 1
+
+        if len(self.world.chunks) + len(self.world.absent) > self.max_loaded_chunks:
+            self.evict()
+
+    def keep(self, areas):
+        """
+        Mark the chunks of some areas as in use and evict the others if over the memory cap.
+        For a server, where each player's area loads its own chunks, see GameServer.send_chunks.
+        :param areas: (first cx, first cy, last cx, last cy) of each area, last coordinates included.
+        """
+        self.updates += 1
+        for first_cx, first_cy, last_cx, last_cy in areas:
+            for cy in range(first_cy, last_cy + 1):
+                for cx in range(first_cx, last_cx + 1):
+                    self.last_used[(cx, cy)] = self.updates
+        if len(self.world.chunks) + len(self.world.absent) > self.max_loaded_chunks:
+            self.evict()
+
+    def evict(self):
+        """Unload the least recently used chunks, down to 90% of the cap so this doesn't run every frame."""
+        loaded = list(self.world.chunks) + list(self.world.absent)
+        loaded.sort(key=lambda key: self.last_used.get(key, 0))
+        excess = len(loaded) - int(self.max_loaded_chunks * 0.9)
+        evicted = [key for key in loaded[:excess] if self.last_used.get(key, 0) < self.updates]
+        self.world.unload(evicted)
+        self.last_used = {key: used for key, used in self.last_used.items()
+                          if key in self.world.chunks or key in self.world.absent}
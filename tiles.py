@@ -0,0 +1,53 @@
+TILE_REGISTRY = []  # Registered tile types, indexed by tile ID
+
+
+class TileType:
+    __slots__ = ("name", "texture", "solid", "hardness", "falls", "flows", "tile_id")
+
+    def __init__(self, name, texture=None, solid=True, hardness=1.0, falls=False, flows=False):
+        """
+        Everything tiles of one kind share, kept once however many tiles there are.
+        Tiles themselves are just a type ID, in a chunk array or in a Block.
+        :param name: Unique name of the tile type.
+        :param texture: Path to the tile's texture, None if it isn't drawn.
+        :param solid: Whether it blocks the player and mobs.
+        :param hardness: How hard the tile is to break, relative to dirt.
+        :param falls: Whether it falls when there is room below, see TileAutomaton.
+        :param flows: Whether it is a liquid, spreading sideways and letting falling tiles sink through it.
+        """
+        self.name = name
+        self.texture = texture
+        self.solid = solid
+        self.hardness = hardness
+        self.falls = falls
+        self.flows = flows
+        self.tile_id = None  # Set by register_tile_type
+
+    def __repr__(self):
+        return f"TileType({self.name!r})"
+
+
+def register_tile_type(tile_type):
+    """
+    Add a tile type to the registry, giving it the next tile ID.
+    Tile IDs are stored in saved worlds, so types are only ever added at the end.
+    The lookup tables in world.py are built from the registry on import, so register types before that.
+    :return: The tile type, with its tile ID set.
+    """
+    if any(registered.name == tile_type.name for registered in TILE_REGISTRY):
+        raise ValueError(f"Tile type {tile_type.name!r} is already registered")
+    if len(TILE_REGISTRY) > 255:
+        raise ValueError("Tile IDs are stored as bytes, there is no room for more tile types")
+    tile_type.tile_id = len(TILE_REGISTRY)
+    TILE_REGISTRY.append(tile_type)
+    return tile_type
+
+
+AIR_TILE = register_tile_type(TileType("air", solid=False, hardness=0))
+GRASS = register_tile_type(TileType("grass", "images/blocks/grass.png"))
+DIRT = register_tile_type(TileType("dirt", "images/blocks/dirt.png"))
+STONE = register_tile_type(TileType("stone", "images/blocks/stone.png", hardness=3.0))
+WOOD_WALL = register_tile_type(TileType("wood_wall", "images/blocks/wood_wall.png", solid=False, hardness=1.5))
+SAND = register_tile_type(TileType("sand", "images/blocks/sand.png", hardness=0.5, falls=True))
+GRAVEL = register_tile_type(TileType("gravel", "images/blocks/gravel.png", hardness=0.6, falls=True))
+WATER = register_tile_type(TileType("water", "images/blocks/water.png", solid=False, hardness=0, falls=True, flows=True))
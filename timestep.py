@@ -0,0 +1,44 @@
+import time
+
+TICK_RATE = 60  # Simulation ticks per second, all physics constants are per tick
+
+
+class FixedTimestep:
+    def __init__(self, tick_rate=TICK_RATE, max_ticks_per_frame=5):
+        """
+        Runs the simulation at a fixed rate whatever the frame rate is.
+        Real time goes into an accumulator that is spent in whole ticks; the leftover is used to
+        interpolate the drawn positions between the last two ticks.
+        :param tick_rate: Simulation ticks per second.
+        :param max_ticks_per_frame: Catch-up limit, so a very slow frame can't snowball into slower ones.
+        """
+        self.tick_time = 1.0 / tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.accumulator = 0.0
+        self.last_time = None
+
+    def reset(self):
+        """Forget the time that passed, e.g. while the game was paused."""
+        self.accumulator = 0.0
+        self.last_time = None
+
+    def advance(self, now=None):
+        """
+        Add the time since the last call to the accumulator.
+        :param now: Current time in seconds, time.perf_counter() by default.
+        :return: Number of ticks to simulate this frame.
+        """
+        if now is None:
+            now = time.perf_counter()
+        if self.last_time is None:
+            self.last_time = now - self.tick_time  # The first frame runs one tick
+        elapsed = min(now - self.last_time, self.max_ticks_per_frame * self.tick_time)
+        self.last_time = now
+        self.accumulator += elapsed
+        ticks = int(self.accumulator / self.tick_time)
+        self.accumulator -= ticks * self.tick_time
+        return ticks
+
+    def alpha(self):
+        """How far the current time is between the last tick and the next one, from 0 to 1."""
+        return self.accumulator / self.tick_time
@@ -0,0 +1,407 @@
+import numpy as np
+import pygame
+from tiles import TILE_REGISTRY
+
+CHUNK_SIZE = 32  # Tiles per chunk side
+
+# Tile IDs stored in the chunk arrays, see tiles.py
+TILE_TYPES = [tile_type.name for tile_type in TILE_REGISTRY]
+TILE_IDS = {name: tile_id for tile_id, name in enumerate(TILE_TYPES)}
+AIR = TILE_IDS["air"]
+
+# Whether each tile ID blocks the player and mobs
+SOLID_TILES = [tile_type.solid for tile_type in TILE_REGISTRY]
+SOLID_LOOKUP = np.array(SOLID_TILES)  # Same, indexable by an array of tile IDs
+
+
+def is_solid(tile_id):
+    return SOLID_TILES[tile_id]
+
+
+class Chunk:
+    def __init__(self, cx, cy):
+        """
+        A fixed-size square of tiles.
+        :param cx: Chunk x coordinate (in chunks).
+        :param cy: Chunk y coordinate (in chunks).
+        """
+        self.cx = cx
+        self.cy = cy
+        self.tiles = np.zeros((CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint8)  # Indexed [local_y, local_x]
+        self.version = 0  # Bumped on every tile change, used by caches built from this chunk
+        self.saved_version = None  # Version last written to the world's store, None if never written
+        self.shared = False  # The tiles array is also held by a save snapshot and must be copied before writing
+
+    def is_empty(self):
+        return not self.tiles.any()
+
+    def writable_tiles(self):
+        """Get the tiles array for writing, copying it first if a save snapshot still holds it."""
+        if self.shared:
+            self.tiles = self.tiles.copy()
+            self.shared = False
+        return self.tiles
+
+
+class World:
+    def __init__(self, tile_size):
+        """
+        Chunked tile storage. Tile lookups only touch one chunk, so they cost the same on any world size.
+        :param tile_size: Size of a tile in pixels.
+        """
+        self.tile_size = tile_size
+        self.chunks = {}  # (cx, cy) -> Chunk
+        self.store = None  # RegionStore that chunks not in memory are loaded from
+        self.generator = None  # Callable (cx, cy) -> tiles or None, for chunks the store doesn't have
+        self.absent = set()  # Chunks known to be all air, neither stored nor generated
+        self.evicted = {}  # (cx, cy) -> tiles of modified chunks unloaded but not in the store yet, see unload
+        self.saving = {}  # Same, for the ones the last snapshot took, which may still be being written
+        self.observers = []  # Indexes built from the tiles, see notify
+
+    def notify(self, event, *args):
+        """
+        Tell the observers about a change to the tiles. Observers implement these methods:
+        tile_changed(tx, ty, tile_id) after one tile is set, region_changed(first_tx, first_ty, last_tx, last_ty)
+        after a bulk edit of a rect of tiles (last coordinates exclusive), chunk_replaced(cx, cy) after a whole
+        chunk is put in place, world_cleared() after every chunk is dropped, and chunks_unloaded(keys) after
+        chunks are dropped from memory. Unloading doesn't change any tiles, it is reported so observers can let
+        go of what they keep per chunk. Loading isn't reported.
+        """
+        for observer in self.observers:
+            getattr(observer, event)(*args)
+
+    def clear(self, store=None, generator=None):
+        """
+        Drop every chunk.
+        :param store: RegionStore to load chunks from on demand, if any.
+        :param generator: Generator for chunks that aren't stored, if the world is endless.
+        """
+        self.chunks = {}
+        self.store = store
+        self.generator = generator
+        self.absent = set()
+        self.evicted = {}
+        self.saving = {}
+        self.notify("world_cleared")
+
+    def get_chunk(self, cx, cy, create=False):
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None and (cx, cy) not in self.absent and (self.store is not None or self.generator is not None
+                                                              or (cx, cy) in self.evicted):
+            chunk = self.load_chunk(cx, cy)
+        if chunk is None and create:
+            chunk = Chunk(cx, cy)
+            self.chunks[(cx, cy)] = chunk
+        return chunk
+
+    def load_chunk(self, cx, cy):
+        """
+        Decode a chunk from the store, or generate it if it was never stored.
+        Generated chunks count as saved, since generating them again gives the same tiles.
+        :return: The chunk, or None if it is all air.
+        """
+        tiles = self.evicted.pop((cx, cy), None)
+        if tiles is not None:
+            chunk = self.insert_chunk(cx, cy, tiles)  # Still unsaved, so it goes into the next snapshot
+            chunk.shared = True
+            return chunk
+        tiles = self.saving.pop((cx, cy), None)
+        if tiles is not None:
+            chunk = self.insert_chunk(cx, cy, tiles)  # The store may not have it yet
+            chunk.shared = True
+            chunk.saved_version = chunk.version
+            return chunk
+        tiles = self.store.read_chunk(cx, cy) if self.store is not None else None
+        if tiles is None and self.generator is not None:
+            tiles = self.generator(cx, cy)
+        if tiles is None:
+            self.absent.add((cx, cy))
+            return None
+        chunk = self.insert_chunk(cx, cy, tiles)
+        chunk.saved_version = chunk.version
+        return chunk
+
+    def unload(self, keys, discard=False):
+        """
+        Drop chunks from memory. The modified ones are kept aside for the next snapshot to write,
+        so unloading never writes to the store on the calling thread. Without a store they stay there
+        until the world is first saved.
+        :param keys: (cx, cy) of the chunks to drop. Keys of all-air chunks are forgotten too.
+        :param discard: Drop the modified ones too, for a copy of a world that is saved elsewhere, e.g. a server's.
+        """
+        unloaded = []
+        for key in keys:
+            chunk = self.chunks.pop(key, None)
+            if chunk is None:
+                if key in self.absent:
+                    self.absent.discard(key)
+                    unloaded.append(key)
+                continue
+            if chunk.version != chunk.saved_version and not discard:
+                self.evicted[key] = chunk.tiles
+            unloaded.append(key)
+        if unloaded:
+            self.notify("chunks_unloaded", unloaded)
+
+    def insert_chunk(self, cx, cy, tiles):
+        chunk = Chunk(cx, cy)
+        chunk.tiles = tiles
+        self.chunks[(cx, cy)] = chunk
+        self.absent.discard((cx, cy))
+        return chunk
+
+    def put_chunk(self, cx, cy, tiles):
+        """
+        Replace a whole chunk, e.g. with generated tiles.
+        :param tiles: Tile array of shape (CHUNK_SIZE, CHUNK_SIZE), indexed [local_y, local_x].
+        """
+        chunk = self.insert_chunk(cx, cy, tiles)
+        self.notify("chunk_replaced", cx, cy)
+        return chunk
+
+    def load_all(self):
+        """Decode every chunk that is still only in the store."""
+        if self.store is not None:
+            for cx, cy in self.store.chunk_coords():
+                self.get_chunk(cx, cy)
+
+    def snapshot(self, store):
+        """
+        Take a copy-on-write view of the chunks changed since they were last saved, and mark them saved.
+        The snapshot shares the chunk arrays until the next edit copies them, so it is cheap to take
+        and can be written from another thread.
+        :param store: RegionStore the snapshot is for. Switching to another store than the one loaded from snapshots every chunk.
+        :return: Dict of (cx, cy) -> chunk tiles.
+        """
+        if store is not self.store:
+            for key in list(self.evicted) + list(self.saving):
+                self.get_chunk(*key)
+            self.load_all()
+            for chunk in self.chunks.values():
+                chunk.saved_version = None
+            if self.store is not None:
+                self.store.close()
+            store.clear()  # Don't leave chunks of an older world behind
+            self.store = store
+            self.absent = set()
+        snapshot = self.take_evicted()
+        for key, chunk in self.chunks.items():
+            if chunk.version != chunk.saved_version:
+                snapshot[key] = chunk.tiles  # Empty chunks are kept too, or they would be generated again
+                chunk.shared = True
+                chunk.saved_version = chunk.version
+        return snapshot
+
+    def take_evicted(self):
+        """
+        Take the modified chunks unloaded since the last snapshot, to write them without taking a whole snapshot.
+        Until the next one they are still read back from memory, the write may not be done yet.
+        :return: Dict of (cx, cy) -> chunk tiles.
+        """
+        self.saving = self.evicted
+        self.evicted = {}
+        return dict(self.saving)
+
+    def saved(self):
+        """Forget the chunks of the last snapshot or take_evicted once they are written."""
+        self.saving = {}
+
+    def mark_unsaved(self, snapshot):
+        """
+        Put chunks from a snapshot that failed to write back into the next snapshot.
+        :param snapshot: Dict of (cx, cy) -> chunk tiles from snapshot.
+        """
+        for key, tiles in snapshot.items():
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                chunk.saved_version = None
+            else:
+                self.evicted.setdefault(key, tiles)  # Unloaded since, unless a newer eviction is waiting
+
+    def save(self, store):
+        """
+        Write the chunks changed since they were last saved.
+        :param store: RegionStore to write to.
+        """
+        store.write_chunks(self.snapshot(store))
+
+    def get_tile(self, tx, ty):
+        """
+        Get the tile ID at a tile coordinate.
+        :param tx: Tile x coordinate.
+        :param ty: Tile y coordinate.
+        """
+        cx, lx = divmod(tx, CHUNK_SIZE)
+        cy, ly = divmod(ty, CHUNK_SIZE)
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            chunk = self.get_chunk(cx, cy)
+            if chunk is None:
+                return AIR
+        return int(chunk.tiles[ly, lx])
+
+    def set_tile(self, tx, ty, tile_id):
+        """
+        Set the tile ID at a tile coordinate.
+        :param tx: Tile x coordinate.
+        :param ty: Tile y coordinate.
+        :param tile_id: New tile ID (AIR removes the tile).
+        """
+        cx, lx = divmod(tx, CHUNK_SIZE)
+        cy, ly = divmod(ty, CHUNK_SIZE)
+        chunk = self.get_chunk(cx, cy, create=tile_id != AIR)
+        if chunk is None:
+            return  # Clearing a tile in a chunk that doesn't exist
+        if chunk.tiles[ly, lx] != tile_id:
+            chunk.writable_tiles()[ly, lx] = tile_id
+            chunk.version += 1
+            self.notify("tile_changed", tx, ty, tile_id)
+
+    def get_tiles(self, txs, tys):
+        """
+        Get the tile IDs at many tile coordinates at once.
+        Coordinates are grouped by chunk, so each chunk is looked up once and read with one fancy index.
+        :param txs: Array of tile x coordinates.
+        :param tys: Array of tile y coordinates, same shape as txs.
+        :return: Array of tile IDs shaped like txs.
+        """
+        txs = np.asarray(txs, dtype=np.int64)
+        tys = np.asarray(tys, dtype=np.int64)
+        tile_ids = np.zeros(txs.size, dtype=np.uint8)
+        if txs.size == 0:
+            return tile_ids.reshape(txs.shape)
+        cxs, lxs = np.divmod(txs.ravel(), CHUNK_SIZE)
+        cys, lys = np.divmod(tys.ravel(), CHUNK_SIZE)
+        min_cx, min_cy = int(cxs.min()), int(cys.min())
+        rows = int(cys.max()) - min_cy + 1
+        keys, inverse = np.unique((cxs - min_cx) * rows + (cys - min_cy), return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        splits = np.cumsum(np.bincount(inverse))[:-1]
+        for key, indices in zip(keys.tolist(), np.split(order, splits)):
+            cx, cy = min_cx + key // rows, min_cy + key % rows
+            chunk = self.chunks.get((cx, cy))
+            if chunk is None:
+                chunk = self.get_chunk(cx, cy)
+                if chunk is None:
+                    continue  # All air
+            tile_ids[indices] = chunk.tiles[lys[indices], lxs[indices]]
+        return tile_ids.reshape(txs.shape)
+
+    def region_chunks(self, first_tx, first_ty, last_tx, last_ty):
+        """
+        Split a rect of tiles into its overlap with each chunk.
+        :return: List of (cx, cy, area in the chunk, area in the rect), the areas as (row slice, column slice).
+        """
+        areas = []
+        for cx in range(first_tx // CHUNK_SIZE, (last_tx - 1) // CHUNK_SIZE + 1):
+            x0, x1 = max(first_tx, cx * CHUNK_SIZE), min(last_tx, (cx + 1) * CHUNK_SIZE)
+            for cy in range(first_ty // CHUNK_SIZE, (last_ty - 1) // CHUNK_SIZE + 1):
+                y0, y1 = max(first_ty, cy * CHUNK_SIZE), min(last_ty, (cy + 1) * CHUNK_SIZE)
+                chunk_area = (slice(y0 - cy * CHUNK_SIZE, y1 - cy * CHUNK_SIZE),
+                              slice(x0 - cx * CHUNK_SIZE, x1 - cx * CHUNK_SIZE))
+                rect_area = (slice(y0 - first_ty, y1 - first_ty), slice(x0 - first_tx, x1 - first_tx))
+                areas.append((cx, cy, chunk_area, rect_area))
+        return areas
+
+    def copy_region(self, first_tx, first_ty, last_tx, last_ty):
+        """
+        Copy a rect of tiles, one slice per chunk.
+        :return: Tile array indexed [ty - first_ty, tx - first_tx].
+        """
+        tiles = np.zeros((max(0, last_ty - first_ty), max(0, last_tx - first_tx)), dtype=np.uint8)
+        if tiles.size == 0:
+            return tiles
+        for cx, cy, chunk_area, rect_area in self.region_chunks(first_tx, first_ty, last_tx, last_ty):
+            chunk = self.get_chunk(cx, cy)
+            if chunk is not None:
+                tiles[rect_area] = chunk.tiles[chunk_area]
+        return tiles
+
+    def paste_region(self, first_tx, first_ty, tiles, mask=None):
+        """
+        Write a rect of tiles, one slice per chunk.
+        Only the chunks with tiles that actually change get a new version, so the caches of the others stay valid.
+        :param first_tx: Tile x coordinate of the rect's left column.
+        :param first_ty: Tile y coordinate of the rect's top row.
+        :param tiles: Tile array indexed [ty - first_ty, tx - first_tx], e.g. from copy_region.
+        :param mask: Bool array shaped like tiles of the tiles to write, all of them if None.
+        :return: (txs, tys, tile_ids) arrays of the tiles that changed, for the edit journal.
+        """
+        tiles = np.asarray(tiles, dtype=np.uint8)
+        last_tx, last_ty = first_tx + tiles.shape[1], first_ty + tiles.shape[0]
+        # Start from empty arrays, so nothing changing still concatenates
+        changed_txs, changed_tys = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        changed_ids = [np.zeros(0, dtype=np.uint8)]
+        for cx, cy, chunk_area, rect_area in self.region_chunks(first_tx, first_ty, last_tx, last_ty):
+            new = tiles[rect_area]
+            chunk = self.get_chunk(cx, cy)
+            old = chunk.tiles[chunk_area] if chunk is not None else np.zeros_like(new)
+            changed = new != old
+            if mask is not None:
+                changed &= mask[rect_area]
+            if not changed.any():
+                continue
+            if chunk is None:
+                chunk = self.get_chunk(cx, cy, create=True)
+            area = chunk.writable_tiles()[chunk_area]
+            area[changed] = new[changed]
+            chunk.version += 1
+            lys, lxs = np.nonzero(changed)
+            changed_txs.append(lxs + rect_area[1].start + first_tx)
+            changed_tys.append(lys + rect_area[0].start + first_ty)
+            changed_ids.append(new[changed])
+        if len(changed_ids) > 1:
+            self.notify("region_changed", first_tx, first_ty, last_tx, last_ty)
+        return np.concatenate(changed_txs), np.concatenate(changed_tys), np.concatenate(changed_ids)
+
+    def fill_rect(self, first_tx, first_ty, last_tx, last_ty, tile_id):
+        """
+        Set every tile of a rect (last coordinates exclusive) to one tile ID, AIR clears it.
+        :return: The changed tiles, see paste_region.
+        """
+        shape = (max(0, last_ty - first_ty), max(0, last_tx - first_tx))
+        return self.paste_region(first_tx, first_ty, np.full(shape, tile_id, dtype=np.uint8))
+
+    def replace_tiles(self, first_tx, first_ty, last_tx, last_ty, old_id, new_id):
+        """
+        Change every tile of one type in a rect (last coordinates exclusive) to another.
+        :return: The changed tiles, see paste_region.
+        """
+        tiles = self.copy_region(first_tx, first_ty, last_tx, last_ty)
+        mask = tiles == old_id
+        tiles[mask] = new_id
+        return self.paste_region(first_tx, first_ty, tiles, mask)
+
+    def solid_at(self, txs, tys):
+        """Get whether the tiles at many tile coordinates are solid, see get_tiles."""
+        return SOLID_LOOKUP[self.get_tiles(txs, tys)]
+
+    def get_tile_at(self, x, y):
+        """Get the tile ID at a pixel coordinate."""
+        return self.get_tile(int(x) // self.tile_size, int(y) // self.tile_size)
+
+    def solid_rects(self, rect):
+        """
+        Get the rects of the solid tiles overlapping an AABB, column by column.
+        Only the tiles under the rect are visited, so the cost doesn't depend on the world size.
+        :param rect: Pygame rect in pixel coordinates.
+        """
+        size = self.tile_size
+        rects = []
+        if rect.width <= 0 or rect.height <= 0:
+            return rects
+        first_y = rect.top // size
+        last_y = (rect.bottom - 1) // size
+        for tx in range(rect.left // size, (rect.right - 1) // size + 1):
+            for ty in range(first_y, last_y + 1):
+                if SOLID_TILES[self.get_tile(tx, ty)]:
+                    rects.append(pygame.Rect(tx * size, ty * size, size, size))
+        return rects
+
+    def iter_tiles(self):
+        """Yield (tx, ty, tile_id) for every non-air tile, column by column within each chunk."""
+        for (cx, cy) in sorted(self.chunks):
+            chunk = self.chunks[(cx, cy)]
+            xs, ys = np.nonzero(chunk.tiles.T)
+            for lx, ly in zip(xs.tolist(), ys.tolist()):
+                yield cx * CHUNK_SIZE + lx, cy * CHUNK_SIZE + ly, int(chunk.tiles[ly, lx])
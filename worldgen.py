@@ -0,0 +1,153 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from perlin_noise import PerlinNoise1D
+from world import World, CHUNK_SIZE, TILE_IDS
+
+COLUMNS_PER_TASK = 64  # Chunk columns generated by one pool task
+STONE_POCKET_CHANCE = 0.02  # Chance for a dirt tile to be stone instead
+MAX_TERRAIN_HEIGHT = 100  # Gradients are at most 8, so noise stays within -8 to 8
+
+_noise_cache = {}  # seed -> PerlinNoise1D, so a worker builds the permutation once per world
+
+
+def chunk_seed(seed, cx, cy):
+    """
+    Derive the seed of one chunk from the world seed and the chunk coordinates.
+    Chunks never share random state, so the world comes out the same however it is split up.
+    """
+    value = (seed * 0x9E3779B97F4A7C15 + cx * 0xBF58476D1CE4E5B9 + cy * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+def generate_chunk(seed, cx, cy, scale, ground_level):
+    """
+    Generate one chunk.
+    :param seed: World seed.
+    :param cx: Chunk x coordinate.
+    :param cy: Chunk y coordinate.
+    :param scale: Scale of the terrain noise.
+    :param ground_level: Tile row below the bottom layer of the world.
+    :return: The chunk tiles, or None if the chunk is all air.
+    """
+    if cy * CHUNK_SIZE >= ground_level or (cy + 1) * CHUNK_SIZE <= ground_level - MAX_TERRAIN_HEIGHT:
+        return None  # Above or below any terrain
+    perlin = _noise_cache.get(seed)
+    if perlin is None:
+        perlin = _noise_cache[seed] = PerlinNoise1D(seed)
+
+    # Map noise values to terrain heights (range: 10 to 30 blocks)
+    xs = np.arange(cx * CHUNK_SIZE, (cx + 1) * CHUNK_SIZE)
+    terrain_heights = ((perlin.noise_array(xs / scale) + 1) * 10 + 10).astype(np.int64)
+
+    ys = np.arange(cy * CHUNK_SIZE, (cy + 1) * CHUNK_SIZE)[:, None]
+    solid = (ys >= ground_level - terrain_heights[None, :]) & (ys < ground_level)
+    if not solid.any():
+        return None
+    tiles = np.where(ys == ground_level - 1, TILE_IDS["stone"],  # Top layer is grass
+                     np.where(ys >= ground_level - 10, TILE_IDS["dirt"],  # Next few layers are dirt
+                              TILE_IDS["grass"]))  # Everything below is stone
+    tiles = np.where(solid, tiles, 0).astype(np.uint8)
+
+    # Scatter stone pockets through the dirt with the chunk's own random generator
+    rng = np.random.default_rng(chunk_seed(seed, cx, cy))
+    pockets = rng.random((CHUNK_SIZE, CHUNK_SIZE)) < STONE_POCKET_CHANCE
+    tiles[pockets & (tiles == TILE_IDS["dirt"])] = TILE_IDS["stone"]
+    return tiles
+
+
+def generate_chunk_column(seed, cx, scale, ground_level):
+    """
+    Generate every chunk of one chunk column.
+    :return: List of (cx, cy, tiles) for the non-empty chunks.
+    """
+    chunks = []
+    for cy in range((ground_level - MAX_TERRAIN_HEIGHT) // CHUNK_SIZE, (ground_level - 1) // CHUNK_SIZE + 1):
+        tiles = generate_chunk(seed, cx, cy, scale, ground_level)
+        if tiles is not None:
+            chunks.append((cx, cy, tiles))
+    return chunks
+
+
+class ChunkGenerator:
+    def __init__(self, seed, scale, ground_level):
+        """
+        Generates chunks of an endless world on demand, see World.generator.
+        :param seed: World seed.
+        :param scale: Scale of the terrain noise.
+        :param ground_level: Tile row below the bottom layer of the world.
+        """
+        self.seed = seed
+        self.scale = scale
+        self.ground_level = ground_level
+
+    def __call__(self, cx, cy):
+        return generate_chunk(self.seed, cx, cy, self.scale, self.ground_level)
+
+
+def generate_columns(seed, first_cx, last_cx, scale, ground_level):
+    """Pool task: generate the chunk columns first_cx up to (not including) last_cx."""
+    chunks = []
+    for cx in range(first_cx, last_cx):
+        chunks.extend(generate_chunk_column(seed, cx, scale, ground_level))
+    return chunks
+
+
+def generate_world(world, seed, width, scale, ground_level, workers=None):
+    """
+    Generate a world of `width` tile columns, starting at column 0. The width is rounded up to whole chunk columns,
+    so the world edge is a chunk edge and never cuts through the terrain.
+    Column ranges are generated in a process pool. Every chunk only depends on the seed and its
+    coordinates, so the result is the same for any number of workers.
+    :param world: World to put the chunks in.
+    :param seed: World seed.
+    :param width: Number of tile columns.
+    :param scale: Scale of the terrain noise.
+    :param ground_level: Tile row below the bottom layer of the world.
+    :param workers: Number of worker processes, defaults to one per CPU.
+    """
+    chunk_columns = -(-width // CHUNK_SIZE)
+    tasks = [(seed, first_cx, min(first_cx + COLUMNS_PER_TASK, chunk_columns), scale, ground_level)
+             for first_cx in range(0, chunk_columns, COLUMNS_PER_TASK)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        results = [generate_columns(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(generate_columns, *zip(*tasks)))
+
+    for chunks in results:
+        for cx, cy, tiles in chunks:
+            world.put_chunk(cx, cy, tiles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pregenerate an OpenTerraria world.")
+    parser.add_argument("--seed", type=int, required=True)
+    parser.add_argument("--width", type=int, default=256, help="World width in tiles, rounded up to whole chunks")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--out", default="world", help="World directory to write")
+    args = parser.parse_args()
+
+    from region import RegionStore, write_level
+    block_size = 15
+    ground_level = (600 - block_size) // block_size  # Same as a game on an 800x600 screen
+    world = World(block_size)
+    generate_world(world, args.seed, args.width, 24.0, ground_level, args.workers)
+    world.save(RegionStore(args.out))
+
+    # Put the player on the surface of the column the game spawns on
+    player_x = 800 // 2 - 15
+    tile_x = (player_x + 15) // block_size
+    surface_y = next(ty for ty in range(-CHUNK_SIZE, ground_level + 1) if world.get_tile(tile_x, ty))
+    player_y = surface_y * block_size - 46
+    write_level(args.out, {"seed": args.seed, "endless": False, "player_x": player_x, "player_y": player_y,
+                           "health": 100, "spawn_point": [player_x, player_y], "journal_seq": 0})
+    print(f"Generated {len(world.chunks)} chunks into {args.out}")
+
+
+if __name__ == "__main__":
+    main()